@@ -2,16 +2,56 @@
 
 import os
 import sys
-import types
-import importlib.util
+import _thread
 
-import argparse
+# argparse, logging and the other heavier modules are imported where they are used, so that importing
+# ConfigMaster (or loading a cached configuration) stays cheap for short-lived tools.
 
 '''
-Version 1.6
+Version 2.18
 
 
 ChangeLog
+2.18 - Added ConfigRegistry: ConfigMasters for many configurations (defaults, config files, overrides) built on
+       first use, evicted least recently used first by count or estimated size, with concurrent builds of the
+       same configuration coalesced, hit rate and per-entry memory (getStats(), getEntryReport()).
+2.17 - Config files (-c, handleConfigFile(), _config_include()) can be http:// or https:// URLs.  Fetched copies are
+       kept in the cache directory and revalidated with conditional requests over pooled keep-alive connections;
+       the cached copy is used when the server is down or slow (http_timeout, http_max_age, getHTTPStats()).
+2.16 - Added initAsync() and reloadConfigAsync() for asyncio programs: config files are loaded concurrently in
+       executor threads, and initAsync() only parses a command line that is passed in.
+2.15 - Added _config_schema: per parameter types, ranges, choices, typed lists and dicts, paths and datetime
+       formats, checked at the end of init() and reloadConfig() (validateParams()).
+2.14 - Top-level `name = literal` assignments of the defaults and config files are set straight from the cached
+       parse instead of being run (literal_fast_path), and pure literal layers come out of the layer cache through
+       marshal.  __file__ is a variable instead of a text replace, and load errors give the line of the file.
+2.13 - Config files no longer add their directory to sys.path.  Modules next to a config file are imported through
+       a scoped importer, and changes to them are noticed by the layer cache and reloadConfig().
+2.12 - Added _config_deferred(): defaults that are only computed when nothing overrides them, after the other
+       parameters are resolved.
+2.11 - Added trackAccess(), countAccess(), fingerprint() and memoize(): find the parameters a piece of code reads
+       and cache its results by just those.
+2.10 - Added publishSnapshot() and attachSnapshot(): versioned, read-only parameter snapshots in shared memory
+       for worker processes.
+2.9 - Added _config_external("file.npy") for parameters stored in array files, memory mapped on first use.
+2.8 - Added async_logging (log records are written from a background thread), log_buffer_records, log_max_bytes and
+      flushLogs().  logging.verbose() checks the level before building a record.
+2.7 - Added dumpParams() (python, json or one line per param) and --dump_resolved.
+      getParamsString() no longer returns an empty string when allow_config_override is False.
+2.6 - The parser only gets the param options that are on the cmd line, the full parser is built for -h (lazy_param_args)
+2.5 - Added init() phase timings (init_timings, timing_hook and --cm-timings)
+2.4 - Added --cm-profile-config to time each top-level statement of the defaults and config files.
+      _config_override is now set up without prepending source, so line numbers in tracebacks match the files.
+2.3 - Added freeze(), which returns an immutable __slots__ based parameter object with attribute access
+2.2 - _config_override rules are compiled into an index, added compound conditions, conflict warnings and a trace
+2.1 - Added reloadConfig() and watchConfigFiles() to pick up edited config files without a restart
+2.0 - opt, args, parser and the other per-configuration state are now instance attributes, so several
+      ConfigMasters can live in one process and be built from different threads.  Added init(argv=...)
+1.11 - Added sweep() for resolving many sets of overrides (optionally in parallel)
+1.10 - Added repeatable -c and _config_include() for layered config files
+1.9 - Added opt-in resolved configuration cache
+1.8 - Import argparse and logging lazily, added startup benchmark (benchmarks/bench_startup.py)
+1.7 - Added on-disk bytecode cache for defaultParams and config files
 1.6 - Added handling for __file__
 1.5 - Added _config_override support
 1.4 - Fixed type being set incorrectly when using cmd line options, added simple init. 
@@ -24,6 +64,8 @@ ChangeLog
 # default params for us without having to force the user to query the argparse
 # print_params by hand
 def make_PrintParamsAction(paramString):
+    import argparse
+
     class CMPPAction(argparse.Action):
         def __call__(self, parser, args, values, option_string=None):
             print(paramString)
@@ -34,6 +76,8 @@ def make_PrintParamsAction(paramString):
 
 
 def make_ConfigAction(cm):
+    import argparse
+
     class CMCAction(argparse.Action):
         def __call__(self, parser, args, values, option_string=None):
             cm.handleConfigFile(values)
@@ -41,22 +85,1407 @@ def make_ConfigAction(cm):
     return CMCAction
 
 
+def make_ArgumentParser(program_description):
+    import argparse
+
+    class CMArgumentParser(argparse.ArgumentParser):
+        """
+        Records the dest of each option string it gets (see ConfigMaster.getParamArgsInArgv()), and calls
+        on_error(message) before reporting an error (see ConfigMaster._completeParserError()).
+        """
+        def __init__(self, *args, **kwargs):
+            self.option_dests = {}
+            self.on_error = None
+            super().__init__(*args, **kwargs)
+
+        def add_argument(self, *args, **kwargs):
+            action = super().add_argument(*args, **kwargs)
+            for option_string in action.option_strings:
+                self.option_dests[option_string] = action.dest
+            return action
+
+        def error(self, message):
+            on_error, self.on_error = self.on_error, None
+            if on_error is not None:
+                on_error(message)
+            super().error(message)
+
+    return CMArgumentParser(description=program_description, formatter_class=argparse.RawDescriptionHelpFormatter)
+
+
+_ModuleType = type(sys)
+
+# (class name, function names) of calls that make a configuration depend on the current time
+_TIME_FUNCTIONS = {
+    "datetime": {"now", "utcnow", "today"},
+    "date": {"today"},
+    "time": {"time", "time_ns", "localtime", "gmtime", "ctime", "asctime", "strftime"},
+}
+
+
+class _TrackingEnviron(type(os.environ)):
+    """
+    Stand-in for os.environ that records which keys were looked up.  Used while resolving a configuration
+    for the resolved config cache, and while evaluating a config file for the layer cache.  Reads are recorded
+    per thread (see _track_environ()), reading the whole environment is recorded as the key "*".
+
+    It is an os._Environ sharing the data of the real os.environ, so everything os.environ can do works the same
+    (for every thread) while it is in place, and changes made through either object are seen by both.  All the
+    mapping methods (get, in, setdefault, pop, copy, |, ...) read through __getitem__ or __iter__.
+    """
+    def __init__(self, environ):
+        super().__init__(environ._data, environ.encodekey, environ.decodekey, environ.encodevalue,
+                         environ.decodevalue)
+        self._environ = environ
+
+    def _record(self, key, value):
+        _note_environ_reads({key: value})
+
+    def __getitem__(self, key):
+        try:
+            value = super().__getitem__(key)
+        except KeyError:
+            self._record(key, None)
+            raise
+        self._record(key, value)
+        return value
+
+    def __iter__(self):
+        self._record("*", None)
+        return super().__iter__()
+
+
+# os.environ is swapped for one shared _TrackingEnviron while any thread is recording
+_environ_lock = _thread.allocate_lock()
+_environ_local = _thread._local()
+_environ_tracker = None
+_environ_tracker_users = 0
+
+
+def _track_environ(reads):
+    """
+    Record the environment variables the current thread reads into the dict reads, until _untrack_environ().
+    Tracking can be nested (a config file including another one, while the resolved configuration is recorded),
+    every read goes to all the dicts being recorded into.
+    """
+    global _environ_tracker, _environ_tracker_users
+    with _environ_lock:
+        if _environ_tracker_users == 0:
+            _environ_tracker = _TrackingEnviron(os.environ)
+            os.environ = _environ_tracker
+        _environ_tracker_users += 1
+    _environ_local.__dict__.setdefault("reads", []).append(reads)
+
+
+def _note_environ_reads(reads):
+    # add reads (name -> value read, None if it was not set) to what the current thread records
+    for recording in getattr(_environ_local, "reads", ()):
+        for key, value in reads.items():
+            if key not in recording:
+                recording[key] = value
+
+
+def _environ_inputs(reads):
+    """
+    The environment a result built with these reads depends on, for _environ_unchanged(): reading the whole
+    environment makes all of it an input.
+    """
+    return {"*": _environ_signature()} if "*" in reads else dict(reads)
+
+
+def _environ_unchanged(inputs):
+    for var, value in inputs.items():
+        if var == "*":
+            if _environ_signature() != value:
+                return False
+        elif os.environ.get(var) != value:
+            return False
+    return True
+
+
+def _untrack_environ():
+    global _environ_tracker, _environ_tracker_users
+    _environ_local.reads.pop()
+    with _environ_lock:
+        _environ_tracker_users -= 1
+        if _environ_tracker_users == 0:
+            os.environ = _environ_tracker._environ
+            _environ_tracker = None
+
+
+def _usesTimeFunctions(code):
+    """
+    True if a code object (or any function defined in it) refers to one of the _TIME_FUNCTIONS by name.
+    """
+    names = set().union(*_TIME_FUNCTIONS.values())
+    if names.intersection(code.co_names):
+        return True
+    return any(_usesTimeFunctions(c) for c in code.co_consts if type(c) == type(code))
+
+
+def _code_names(code):
+    """
+    The global names a code object (or any function defined in it) refers to.
+    """
+    names = set(code.co_names)
+    for c in code.co_consts:
+        if type(c) == type(code):
+            names |= _code_names(c)
+    return names
+
+
+def _literal_plan(source, filename):
+    """
+    Split defaultParams or config file source into the steps that run it: a (names, value) tuple for each
+    top-level `name = literal` assignment (the value is built by ast.literal_eval, nothing is executed), and a code
+    object for each run of other statements.  The code objects are compiled from the same tree, so tracebacks and
+    errors point at the lines of the file.  The plan only holds literals and code objects, so it can be marshalled.
+    :return: (steps, {name: line of its last top-level assignment})
+    """
+    import ast
+
+    tree = ast.parse(source, filename)
+    steps = []
+    lines = {}
+    pending = []
+
+    def flush():
+        if pending:
+            steps.append(compile(ast.Module(body=pending[:], type_ignores=[]), filename, "exec"))
+            del pending[:]
+
+    for stmt in tree.body:
+        targets = ()
+        if type(stmt) == ast.Assign:
+            targets = stmt.targets
+        elif type(stmt) in (ast.AnnAssign, ast.AugAssign):
+            targets = (stmt.target,)
+        elif type(stmt) in (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef):
+            lines[stmt.name] = stmt.lineno
+        for target in targets:
+            if type(target) == ast.Name:
+                lines[target.id] = stmt.lineno
+
+        value = _MISSING
+        if type(stmt) == ast.Assign and all(type(t) == ast.Name for t in stmt.targets):
+            try:
+                value = ast.literal_eval(stmt.value)
+            except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+                pass
+        if value is _MISSING:
+            pending.append(stmt)
+        else:
+            flush()
+            steps.append((tuple(t.id for t in stmt.targets), value))
+    flush()
+    return steps, lines
+
+
+class _ScopedImporter:
+    """
+    __import__ for a config file: modules (and packages) next to the config file can be imported without adding
+    its directory to sys.path.  Like a directory at the end of sys.path, they are only used when the normal
+    import doesn't find the module.  They are kept out of sys.modules and sys.path_importer_cache, so loading
+    configs from many directories leaves nothing behind.
+    """
+    def __init__(self, directory):
+        import builtins
+        self.directory = directory
+        # fully qualified name -> module, of the modules loaded from directory
+        self.modules = {}
+        # source files of those modules, so the layer cache notices when they change
+        self.files = []
+        self.builtins = dict(vars(builtins))
+        self.builtins["__import__"] = self.importModule
+        # directory -> FileFinder, private instead of sys.path_importer_cache
+        self._finders = {}
+
+    def _find(self, fullname, path):
+        if path is None:
+            # a config file fetched over http has no directory
+            return None
+        finder = self._finders.get(path)
+        if finder is None:
+            import importlib.machinery
+            finder = self._finders[path] = importlib.machinery.FileFinder(
+                path, (importlib.machinery.SourceFileLoader, importlib.machinery.SOURCE_SUFFIXES),
+                (importlib.machinery.SourcelessFileLoader, importlib.machinery.BYTECODE_SUFFIXES))
+        return finder.find_spec(fullname)
+
+    def _load(self, fullname):
+        module = self.modules.get(fullname)
+        if module is not None:
+            return module
+        parent, _, child = fullname.rpartition(".")
+        if parent:
+            parent_module = self._load(parent)
+            paths = getattr(parent_module, "__path__", None)
+            if paths is None:
+                raise ModuleNotFoundError(f"No module named {fullname!r}; {parent!r} is not a package", name=fullname)
+            spec = next(filter(None, (self._find(fullname, path) for path in paths)), None)
+        else:
+            spec = self._find(fullname, self.directory)
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named {fullname!r}", name=fullname)
+
+        import importlib.util
+        module = importlib.util.module_from_spec(spec)
+        # the helper's own imports go through here too
+        module.__builtins__ = self.builtins
+        self.modules[fullname] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del self.modules[fullname]
+            raise
+        if spec.origin and os.path.isfile(spec.origin):
+            self.files.append(spec.origin)
+        if parent:
+            setattr(self.modules[parent], child, module)
+        return module
+
+    def importModule(self, name, globals=None, locals=None, fromlist=(), level=0):
+        import builtins
+        if level:
+            import importlib.util
+            fullname = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__"))
+            if fullname.partition(".")[0] not in self.modules:
+                return builtins.__import__(name, globals, locals, fromlist, level)
+        else:
+            fullname = name
+            top = name.partition(".")[0]
+            if top not in self.modules:
+                try:
+                    return builtins.__import__(name, globals, locals, fromlist, level)
+                except ModuleNotFoundError as e:
+                    if e.name != top or self._find(top, self.directory) is None:
+                        raise
+
+        module = self._load(fullname)
+        if not fromlist:
+            return self.modules[fullname.partition(".")[0]] if not level else module
+        if hasattr(module, "__path__"):
+            for child in fromlist:
+                if child != "*" and not hasattr(module, child):
+                    try:
+                        self._load(f"{fullname}.{child}")
+                    except ModuleNotFoundError:
+                        pass
+        return module
+
+
+class _Deferred:
+    """
+    A default that is only computed if the config files, command line and _config_override leave it alone:
+
+        @_config_deferred
+        def outFile():
+            return os.path.join(dataDir, "output", datetime.datetime.now().strftime("%Y%m%d") + ".out")
+
+    or outFile = _config_deferred(lambda: ..., type=str).  The function runs after everything else is resolved,
+    so the parameters it uses (dataDir) have their final values.  Deferred parameters that use each other are
+    computed in dependency order.  With a type the parameter gets a --name command line option.
+    """
+    __slots__ = ("func", "type", "modules")
+
+    def __init__(self, func, type=None):
+        self.func = func
+        self.type = type
+        # the modules imported by the defaults or config file, which are removed from opt
+        self.modules = None
+
+    def __repr__(self):
+        return f"_config_deferred({getattr(self.func, '__name__', self.func)})"
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        # pickled (for the resolved cache) as the marshalled code of the function and the names of the modules,
+        # see _restore_deferred()
+        import marshal
+        func = self.func
+        if type(func) is not type(_restore_deferred) or func.__closure__ is not None:
+            raise TypeError(f"{self!r} is not a plain function")
+        modules = {}
+        for name, module in (self.modules or {}).items():
+            if sys.modules.get(module.__name__) is not module:
+                raise TypeError(f"{self!r}: module {module.__name__} is not importable by name")
+            modules[name] = module.__name__
+        return _restore_deferred, (marshal.dumps(func.__code__), func.__name__, func.__defaults__, self.type,
+                                   modules)
+
+
+def _restore_deferred(code, name, defaults, type, modules):
+    import importlib
+    import marshal
+    import types
+    # the function gets its globals when it is evaluated, see _evaluate_deferred()
+    deferred = _Deferred(types.FunctionType(marshal.loads(code), {}, name, defaults), type)
+    deferred.modules = {k: importlib.import_module(module) for k, module in modules.items()}
+    return deferred
+
+
+def _config_deferred(func=None, type=None):
+    if func is None:
+        return lambda f: _Deferred(f, type)
+    return _Deferred(func, type)
+
+
+def _bind_deferred(namespace):
+    """
+    Give the deferred parameters of a namespace that was just run the modules it imported.
+    """
+    modules = None
+    for value in namespace.values():
+        if type(value) is _Deferred and value.modules is None:
+            if modules is None:
+                modules = {k: v for k, v in namespace.items() if type(v) == _ModuleType}
+            value.modules = modules
+
+
+def _evaluate_deferred(opt):
+    """
+    Replace the deferred parameters that are still in opt by their values, in dependency order.
+    """
+    deferred = {key: value for key, value in opt.items() if type(value) is _Deferred}
+    if not deferred:
+        return
+
+    order = []
+    visiting = set()
+
+    def visit(key, path):
+        if key in visiting:
+            raise RecursionError(f"deferred parameters depend on each other: {' -> '.join(path + (key,))}")
+        if key in order:
+            return
+        visiting.add(key)
+        for name in sorted(_code_names(deferred[key].func.__code__)):
+            if name in deferred and name != key:
+                visit(name, path + (key,))
+        visiting.discard(key)
+        order.append(key)
+
+    for key in deferred:
+        visit(key, ())
+
+    import builtins
+    import types
+    namespaces = {}
+    for key in order:
+        func = deferred[key].func
+        modules = deferred[key].modules or {}
+        namespace = namespaces.get(id(modules))
+        if namespace is None:
+            namespace = namespaces[id(modules)] = dict(modules, __builtins__=builtins)
+            namespace.update(opt)
+        value = types.FunctionType(func.__code__, namespace, func.__name__, func.__defaults__, func.__closure__)()
+        opt[key] = value
+        for namespace in namespaces.values():
+            namespace[key] = value
+
+
+def _arg_type(value):
+    """
+    The type of the command line option of a parameter with this value, None if it gets no option.
+    """
+    if isinstance(value, (int, float, str)):
+        return type(value)
+    if type(value) is _Deferred:
+        return value.type
+    return None
+
+
+def _compile_overrides(table):
+    """
+    Compile a _config_override table into an index: trigger parameter -> trigger value -> list of rules.
+
+    A rule is (order, conditions, assignments), where conditions is a tuple of (parameter, value) pairs that must
+    all match.  Besides the usual _config_override["model"]["GFS4"]["x"] = 1, a compound rule is written with
+    tuples: _config_override["model", "site"]["GFS4", "boulder"]["x"] = 2.  A compound rule is indexed under its
+    first condition.
+    """
+    index = {}
+    order = 0
+    for params, targets in table.items():
+        for values, assignments in targets.items():
+            if isinstance(params, tuple):
+                if not isinstance(values, tuple) or len(values) != len(params):
+                    raise ValueError(f"_config_override{[params]}{[values]}: expected one value for each of {params}")
+                conditions = tuple(zip(params, values))
+            else:
+                conditions = ((params, values),)
+            param, value = conditions[0]
+            index.setdefault(param, {}).setdefault(value, []).append((order, conditions, dict(assignments)))
+            order += 1
+    return index
+
+
+def _apply_overrides(index, values, opt):
+    """
+    Apply the rules of a compiled _config_override index (see _compile_overrides()) triggered by values to opt.
+
+    Rules are applied from least to most specific (number of conditions), and in the order they were defined
+    within the same specificity, so a compound rule wins over a single condition rule.  When two rules of the same
+    specificity set one parameter to different values, the later rule wins and the pair is reported as a conflict
+    (unless a more specific rule sets that parameter too).
+
+    :return: (list of the rules that fired, in the order they were applied, list of (parameter, rule, rule) conflicts)
+    """
+    fired = []
+    for param, by_value in index.items():
+        if param not in values:
+            continue
+        try:
+            rules = by_value.get(values[param])
+        except TypeError:
+            # unhashable cmd line value (e.g. nargs="+"), it can't match a rule
+            continue
+        if rules:
+            for rule in rules:
+                if all(p in values and values[p] == v for p, v in rule[1][1:]):
+                    fired.append(rule)
+
+    fired.sort(key=lambda rule: (len(rule[1]), rule[0]))
+    set_by = {}
+    conflicts = []
+    for rule in fired:
+        for target, value in rule[2].items():
+            previous = set_by.get(target)
+            if previous is not None and len(previous[1]) == len(rule[1]) and previous[2][target] != value:
+                conflicts.append((target, previous, rule))
+            set_by[target] = rule
+            opt[target] = value
+    # a more specific rule that fired later settles the conflict
+    conflicts = [c for c in conflicts if len(set_by[c[0]][1]) == len(c[2][1])]
+    return fired, conflicts
+
+
+def _resolve_overrides(base, override_index, cmd_values, allow_extra_parameters, overrides):
+    """
+    Resolve one set of overrides the same way init() resolves the command line: start from the defaults and
+    config file values (base), apply the _config_override rules triggered by the command line values, then
+    apply the command line values themselves.  overrides are treated as extra command line values.
+    """
+    opt = dict(base)
+    values = dict(cmd_values)
+    for key, value in overrides.items():
+        if key not in opt and not allow_extra_parameters:
+            raise KeyError(f"Invalid parameter in overrides: {key}")
+        values[key] = value
+
+    _apply_overrides(override_index, values, opt)
+
+    opt.update(values)
+    _evaluate_deferred(opt)
+    return opt
+
+
+# state of a sweep() worker process, set once per process by _sweep_worker_init()
+_sweep_state = None
+
+
+def _sweep_worker_init(*state):
+    global _sweep_state
+    _sweep_state = state
+
+
+def _sweep_worker(overrides):
+    return _resolve_overrides(*_sweep_state, overrides)
+
+
+# options of ConfigMaster itself that init() has to know about before the parser is built
+_CM_OPTIONS = ("--cm-profile-config", "--cm-timings")
+
+
+def _cm_options_in_argv(argv):
+    """
+    The _CM_OPTIONS given in argv, read the way argparse reads them: whole, as --option=value, or abbreviated to
+    a prefix that matches only one of them.  No param option starts with --cm- (param names can't contain a
+    dash), so a prefix argparse would accept is one of these.
+    """
+    given = set()
+    for token in argv:
+        if token == "--":
+            break
+        name = token.split("=", 1)[0]
+        if name.startswith("--cm-"):
+            matches = [option for option in _CM_OPTIONS if option.startswith(name)]
+            if len(matches) == 1:
+                given.add(matches[0])
+    return given
+
+
+def _is_url(path):
+    """
+    True for a config source given as an http:// or https:// URL instead of a file path.
+    """
+    return path.startswith(("http://", "https://"))
+
+
+def _content_signature(body):
+    """
+    What stands in for (mtime_ns, size) of a file for a config source fetched over http: taken from the contents,
+    so it only changes when they do.
+    """
+    import hashlib
+    return (int.from_bytes(hashlib.sha256(body).digest()[:8], "big"), len(body))
+
+
+# idle keep-alive connections to the servers config sources are fetched from: (scheme, host, port) -> connections
+_http_pool = {}
+_http_pool_lock = _thread.allocate_lock()
+
+
+def _http_get(url, headers, timeout, pool_size):
+    """
+    GET url over a pooled keep-alive connection.  A pooled connection the server has closed in the meantime is
+    replaced by a new one and the request sent again, a timeout is not retried.
+    :param int pool_size: idle connections kept per server
+    :return: (status, response headers, body bytes, whether a new connection was opened)
+    """
+    import http.client
+    import urllib.parse
+
+    parts = urllib.parse.urlsplit(url)
+    key = (parts.scheme, parts.hostname, parts.port)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    while True:
+        with _http_pool_lock:
+            idle = _http_pool.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+        if conn is None:
+            cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+            conn = cls(parts.hostname, parts.port, timeout=timeout)
+        else:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+        try:
+            conn.request("GET", target, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except TimeoutError:
+            conn.close()
+            raise
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            if reused:
+                continue
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            with _http_pool_lock:
+                idle = _http_pool.setdefault(key, [])
+                if len(idle) < pool_size:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        return response.status, response.headers, body, not reused
+
+
+class _Inotify:
+    """
+    Minimal inotify wrapper (through ctypes) used by watchConfigFiles() to wake up as soon as a config directory
+    changes.  create() returns None where inotify is not available.
+    """
+    # IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x002 | 0x004 | 0x008 | 0x080 | 0x100 | 0x200
+
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+
+    @classmethod
+    def create(cls):
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add_watch(self, path):
+        return self.libc.inotify_add_watch(self.fd, os.fsencode(path or "."), self.MASK) >= 0
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for an event, and drain all pending events.
+        """
+        import select
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+        return bool(readable)
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _logger_verbose(logger, msg, *args, **kwargs):
+    """
+    Logger.verbose(), log msg at the VERBOSE level.
+    """
+    import logging
+    if logger.isEnabledFor(logging.VERBOSE):
+        # report the caller of verbose() as the source of the message
+        kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
+        logger._log(logging.VERBOSE, msg, args, **kwargs)
+
+
+def _logging_verbose(msg, *args, **kwargs):
+    """
+    logging.verbose(), log msg at the VERBOSE level on the root logger.
+    """
+    import logging
+    if logging.root.isEnabledFor(logging.VERBOSE):
+        kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
+        logging.log(logging.VERBOSE, msg, *args, **kwargs)
+
+
+def _jsonable(value):
+    """
+    value with what JSON can't hold replaced: keys that are not strings and non-finite floats become their repr().
+    Other types are left to the encoder (which falls back to repr() too).
+    """
+    t = type(value)
+    if t is float:
+        return value if value - value == 0.0 else repr(value)
+    if t is dict:
+        return {k if type(k) is str else repr(k): _jsonable(v) for k, v in value.items()}
+    if t is list or t is tuple:
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _isLiteral(value):
+    """
+    True if repr(value) is a python literal that gives value back
+    """
+    if value is None or type(value) in (bool, int, str, bytes):
+        return True
+    if type(value) is float:
+        # not inf or nan
+        return value - value == 0.0
+    if type(value) in (list, tuple, set):
+        return all(_isLiteral(v) for v in value)
+    if type(value) is dict:
+        return all(_isLiteral(k) and _isLiteral(v) for k, v in value.items())
+    return False
+
+
+class _CmdLineArgs(type(sys.implementation)):
+    """
+    The parsed cmd line (a SimpleNamespace).  Params that have no option in the parser (see
+    ConfigMaster.getParamArgsInArgv) read as None, like options that were not given.
+    """
+    __slots__ = ("_params",)
+
+    def __init__(self, params, **kwargs):
+        super().__init__(**kwargs)
+        self._params = params
+
+    def __getattr__(self, name):
+        if name != "_params" and _arg_type(self._params.get(name)) is not None:
+            return None
+        raise AttributeError(name)
+
+
+class _PhaseTimer:
+    """
+    Context manager that adds the time spent in its block to timings[name], and, with starts, records in
+    starts[name] when it first started (time.perf_counter())
+    """
+    def __init__(self, timings, name, starts=None):
+        self.timings = timings
+        self.name = name
+        self.starts = starts
+
+    def __enter__(self):
+        import time
+        self.start = time.perf_counter()
+        if self.starts is not None:
+            self.starts.setdefault(self.name, self.start)
+
+    def __exit__(self, *exc_info):
+        import time
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def _new_override_table():
+    import collections
+    return collections.defaultdict(lambda: collections.defaultdict(lambda: collections.defaultdict(list)))
+
+
+def _environ_signature():
+    return sorted(os.environ.items())
+
+
+# a parameter that is not set, in fingerprints
+_MISSING = object()
+# types whose repr() is the same in every run and tells apart values that are not equal
+_REPR_SCALARS = (int, float, str, bytes, bool, type(None), complex)
+_FunctionType = type(_isLiteral)
+
+
+def _canonical(value):
+    """
+    bytes that identify value, the same in every process: dicts and sets are sorted, so neither insertion order
+    nor string hash randomization changes them.  Functions are identified by name.  Raises TypeError for objects
+    whose repr has their memory address (the default repr), the key would be different for every copy.
+    """
+    t = type(value)
+    if t in _REPR_SCALARS:
+        return repr(value).encode("utf-8", "surrogateescape")
+    if t is list or t is tuple:
+        if all(type(v) in _REPR_SCALARS for v in value):
+            return repr(value).encode("utf-8", "surrogateescape")
+        return t.__name__.encode() + b"(" + b",".join(_canonical(v) for v in value) + b")"
+    if t is dict:
+        items = sorted(_canonical(k) + b":" + _canonical(v) for k, v in value.items())
+        return b"dict(" + b",".join(items) + b")"
+    if t is set or t is frozenset:
+        return t.__name__.encode() + b"(" + b",".join(sorted(_canonical(v) for v in value)) + b")"
+    if value is _MISSING:
+        return b"<missing>"
+    if t is _FunctionType and "<" not in value.__qualname__:
+        return f"function:{value.__module__}.{value.__qualname__}".encode("utf-8", "surrogateescape")
+    r = repr(value)
+    if " at 0x" in r:
+        raise TypeError(f"no stable key for {r}, give {t.__qualname__} a __repr__ that identifies its value")
+    return t.__qualname__.encode() + b":" + r.encode("utf-8", "surrogateescape")
+
+
+# objects that belong to the program, not to one configuration: counted but not followed by _estimate_size()
+_SIZE_OPAQUE = (type, _ModuleType, type(_canonical), type(len), type(_canonical.__call__))
+
+
+def _estimate_size(obj, seen=None):
+    """
+    Rough memory footprint of obj in bytes: sys.getsizeof() of obj and of everything reachable from it through
+    containers and instance __dict__s, each object counted once.  Interned strings, small ints and other
+    objects shared with the rest of the program are counted too, so this is an upper bound.
+    :param set seen: ids already counted, to measure several objects together
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o, 0)
+        t = type(o)
+        if t is dict:
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif t is list or t is tuple or t is set or t is frozenset:
+            stack.extend(o)
+        elif not isinstance(o, _SIZE_OPAQUE):
+            d = getattr(o, "__dict__", None)
+            if type(d) is dict:
+                stack.append(d)
+    return total
+
+
+# .npy dtypes that can be memory mapped without numpy, as memoryview formats
+_NPY_FORMATS = {"f8": "d", "f4": "f", "i8": "q", "i4": "i", "i2": "h", "i1": "b", "u8": "Q", "u4": "I", "u2": "H",
+                "u1": "B", "b1": "?"}
+
+
+class _ExternalParam:
+    """
+    A parameter whose value is an array in a file, declared with _config_external("stations.npy") in the
+    defaults or a config file.  The file is memory mapped read-only the first time the parameter is used, so
+    processes using the same file share its pages.  Copies and pickles only hold the path.
+
+    .npy files are loaded with numpy.load(mmap_mode="r").  Without numpy, .npy files of simple little-endian
+    types, and raw files, are mapped with the mmap module and returned as a memoryview.
+    """
+    __slots__ = ("path", "dtype", "shape", "_value")
+
+    def __init__(self, path, dtype=None, shape=None):
+        """
+        :param str path: The file (.npy, or raw binary)
+        :param str dtype: Element type of a raw file, a struct module format character ("d", "i", "B" ...)
+        :param tuple shape: Shape of a raw file, one dimension by default
+        """
+        self.path = path
+        self.dtype = dtype
+        self.shape = tuple(shape) if shape is not None else None
+        self._value = None
+
+    def load(self):
+        """
+        The mapped array (mapped on the first call).
+        """
+        if self._value is None:
+            self._value = self._map()
+        return self._value
+
+    def _map(self):
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if self.path.endswith(".npy"):
+            if numpy is not None:
+                return numpy.load(self.path, mmap_mode="r")
+            offset, fmt, shape = self._npyHeader()
+        else:
+            if numpy is not None:
+                return numpy.memmap(self.path, dtype=self.dtype or "B", mode="r", shape=self.shape)
+            offset, fmt, shape = 0, self.dtype or "B", self.shape
+
+        import mmap
+        with open(self.path, "rb") as fh:
+            view = memoryview(mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ))[offset:]
+        return view.cast(fmt, shape) if shape else view.cast(fmt)
+
+    def _npyHeader(self):
+        """
+        (data offset, memoryview format, shape) of a .npy file, for mapping it without numpy.
+        """
+        import ast
+        with open(self.path, "rb") as fh:
+            magic = fh.read(8)
+            if magic[:6] != b"\x93NUMPY":
+                raise ValueError(f"{self.path} is not a .npy file")
+            size_bytes = 2 if magic[6] == 1 else 4
+            header_size = int.from_bytes(fh.read(size_bytes), "little")
+            header = ast.literal_eval(fh.read(header_size).decode("latin1"))
+        descr = header["descr"]
+        fmt = _NPY_FORMATS.get(descr[1:])
+        if fmt is None or header["fortran_order"] or (descr[0] != "|" and
+                                                      (descr[0], sys.byteorder) not in (("<", "little"), (">", "big"))):
+            raise ImportError(f"numpy is needed to load {self.path} ({descr}, fortran_order={header['fortran_order']})")
+        return 8 + size_bytes + header_size, fmt, header["shape"]
+
+    def __repr__(self):
+        args = [repr(self.path)]
+        if self.dtype is not None:
+            args.append(f"dtype={self.dtype!r}")
+        if self.shape is not None:
+            args.append(f"shape={self.shape!r}")
+        return f"_config_external({', '.join(args)})"
+
+    def __eq__(self, other):
+        if type(other) is not _ExternalParam:
+            return NotImplemented
+        return (self.path, self.dtype, self.shape) == (other.path, other.dtype, other.shape)
+
+    def __hash__(self):
+        return hash((self.path, self.dtype, self.shape))
+
+    def __reduce__(self):
+        return (_ExternalParam, (self.path, self.dtype, self.shape))
+
+
+def _external_param_func(base_dir):
+    """
+    The _config_external() function for the defaults or a config file, relative paths are relative to base_dir.
+    """
+    def external(path, dtype=None, shape=None):
+        return _ExternalParam(os.path.join(base_dir, path), dtype, shape)
+    return external
+
+
+# keys of a _config_schema entry, see _compile_schema()
+_SCHEMA_KEYS = ("type", "min", "max", "choices", "path", "format", "allow_none")
+# the types of the values that pass the fast test of a scalar type in _compile_schema()
+_SCHEMA_EXACT_TYPES = {int: (int,), float: (float, int), str: (str,), bool: (bool,)}
+_SCHEMA_PATHS = {"exists": ("path", os.path.exists), "file": ("file", os.path.isfile), "dir": ("directory", os.path.isdir)}
+
+
+def _schema_type_name(t):
+    if type(t) is list:
+        return f"list of {_schema_type_name(t[0])}"
+    if type(t) is dict:
+        (k, v), = t.items()
+        return f"dict of {_schema_type_name(k)}: {_schema_type_name(v)}"
+    if type(t) is tuple:
+        return " or ".join(_schema_type_name(x) for x in t)
+    return t.__name__
+
+
+def _schema_type_test(name, t):
+    """
+    A function value -> True if value has type t.  bool is not accepted as an int or a float, an int is accepted as a
+    float.
+    """
+    if type(t) is tuple:
+        tests = [_schema_type_test(name, x) for x in t]
+        return lambda v: any(test(v) for test in tests)
+    if not isinstance(t, type):
+        raise ValueError(f"_config_schema[{name!r}]: {t!r} is not a type")
+    if t is int:
+        return lambda v: isinstance(v, int) and not isinstance(v, bool)
+    if t is float:
+        return lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)
+    return lambda v: isinstance(v, t)
+
+
+def _schema_leaf(name, spec):
+    """
+    The checks of a schema entry that apply to a single value (each element of a list, each value of a dict).
+    :return: list of functions value -> error message, or None if the value is fine
+    """
+    import datetime
+    import reprlib
+
+    checks = []
+    if "min" in spec:
+        low = spec["min"]
+
+        def check_min(v):
+            try:
+                return None if v >= low else f"{reprlib.repr(v)} is less than the minimum {low!r}"
+            except TypeError:
+                return f"{reprlib.repr(v)} can not be compared with the minimum {low!r}"
+        checks.append(check_min)
+    if "max" in spec:
+        high = spec["max"]
+
+        def check_max(v):
+            try:
+                return None if v <= high else f"{reprlib.repr(v)} is more than the maximum {high!r}"
+            except TypeError:
+                return f"{reprlib.repr(v)} can not be compared with the maximum {high!r}"
+        checks.append(check_max)
+    if "choices" in spec:
+        choices = list(spec["choices"])
+        checks.append(lambda v: None if v in choices else
+                      f"{reprlib.repr(v)} is not one of {', '.join(map(repr, choices))}")
+    if "path" in spec:
+        if spec["path"] not in _SCHEMA_PATHS:
+            raise ValueError(f"_config_schema[{name!r}]: path must be one of {', '.join(_SCHEMA_PATHS)}")
+        kind, exists = _SCHEMA_PATHS[spec["path"]]
+        checks.append(lambda v: None if exists(v) else f"{kind} {v!r} does not exist")
+    if "format" in spec:
+        fmt = spec["format"]
+
+        def check_format(v):
+            if not isinstance(v, str):
+                return None
+            try:
+                datetime.datetime.strptime(v, fmt)
+            except ValueError:
+                return f"{reprlib.repr(v)} does not match the format {fmt!r}"
+            return None
+        checks.append(check_format)
+    return checks
+
+
+def _schema_check(name, t, leaf):
+    """
+    A function (value, where, errors) that appends a message to errors for every problem with value: the wrong
+    type (t, see _compile_schema()), or an element that fails one of the leaf checks.
+    """
+    import reprlib
+
+    if t is None:
+        def check(value, where, errors):
+            for c in leaf:
+                msg = c(value)
+                if msg is not None:
+                    errors.append(f"{where}: {msg}")
+        return check
+
+    if type(t) is list:
+        if len(t) != 1:
+            raise ValueError(f"_config_schema[{name!r}]: a list type has one element type, like [float]")
+        item = _schema_check(name, t[0], leaf)
+        desc = _schema_type_name(t)
+
+        def check(value, where, errors):
+            if not isinstance(value, (list, tuple)):
+                errors.append(f"{where}: expected {desc}, got {type(value).__name__} {reprlib.repr(value)}")
+                return
+            for i, v in enumerate(value):
+                item(v, f"{where}[{i}]", errors)
+        return check
+
+    if type(t) is dict:
+        if len(t) != 1:
+            raise ValueError(f"_config_schema[{name!r}]: a dict type has one key and one value type, like {{str: int}}")
+        (key_type, value_type), = t.items()
+        key = _schema_check(name, key_type, [])
+        item = _schema_check(name, value_type, leaf)
+        desc = _schema_type_name(t)
+
+        def check(value, where, errors):
+            if not isinstance(value, dict):
+                errors.append(f"{where}: expected {desc}, got {type(value).__name__} {reprlib.repr(value)}")
+                return
+            for k, v in value.items():
+                key(k, f"{where} key", errors)
+                item(v, f"{where}[{k!r}]", errors)
+        return check
+
+    test = _schema_type_test(name, t)
+    desc = _schema_type_name(t)
+
+    def check(value, where, errors):
+        if not test(value):
+            errors.append(f"{where}: expected {desc}, got {type(value).__name__} {reprlib.repr(value)}")
+            return
+        for c in leaf:
+            msg = c(value)
+            if msg is not None:
+                errors.append(f"{where}: {msg}")
+    return check
+
+
+def _compile_schema(schema):
+    """
+    Compile a _config_schema table into one function validate(opt, errors), which appends a message to errors for
+    every parameter value that doesn't match its entry, and returns errors.
+
+    An entry is a dict (or just a type, the same as {"type": type}):
+        type        int, float, str, bool, any other class, a tuple of them (any of these types), [type] a list
+                    (or tuple) of elements of that type, {key type: value type} a dict
+        min, max    inclusive bounds
+        choices     the allowed values
+        path        "exists", "file" or "dir": the value is a path that must exist
+        format      a strptime() format that a str value must match, e.g. "%Y%m%d%H"
+        allow_none  None is accepted too
+    min, max, choices, path and format apply to the elements of a list and the values of a dict.
+
+    The entries are sorted into tables by what they check, and the common ones (a scalar type or a list of them
+    with bounds, a scalar type with choices, a plain type) are tested by a loop over their table with a couple
+    of comparisons per value.  Anything else, and any value that fails, goes to a checker from _schema_check()
+    which builds the messages.  Values of _config_external() parameters are not loaded to check them.
+    """
+    ranged = []
+    ranged_lists = []
+    choices = []
+    typed = []
+    other = []
+    specs = {}
+    for name, spec in schema.items():
+        if type(spec) is not dict:
+            spec = {"type": spec}
+        unknown = set(spec).difference(_SCHEMA_KEYS)
+        if unknown:
+            raise ValueError(f"_config_schema[{name!r}]: unknown keys {', '.join(map(repr, sorted(unknown)))}, "
+                             f"expected {', '.join(_SCHEMA_KEYS)}")
+        specs[name] = spec
+        t = spec.get("type")
+        allow_none = bool(spec.get("allow_none"))
+        keys = spec.keys() - {"type", "allow_none"}
+        item = t[0] if type(t) is list and len(t) == 1 else t
+        types = _SCHEMA_EXACT_TYPES.get(item) if isinstance(item, type) else None
+
+        if types and keys <= {"min", "max"} and all(type(spec[key]) in types for key in keys):
+            (ranged if item is t else ranged_lists).append((name, types, spec.get("min"), spec.get("max"),
+                                                            allow_none))
+        elif types and item is t and keys == {"choices"} and all(type(c) in types for c in spec["choices"]):
+            choices.append((name, types, frozenset(spec["choices"]), allow_none))
+        elif isinstance(t, type) and not keys:
+            typed.append((name, t, allow_none))
+        else:
+            # mistakes in the entry show up now, not when a value is checked
+            other.append((name, _schema_check(name, t, _schema_leaf(name, spec)), allow_none))
+
+    checkers = {}
+
+    def failed(name, v, allow_none, errors):
+        # the fast test didn't pass: find out why, with the checker of the entry (made the first time it is needed)
+        if v is _MISSING or (v is None and allow_none) or type(v) is _ExternalParam:
+            return
+        check = checkers.get(name)
+        if check is None:
+            spec = specs[name]
+            check = checkers[name] = _schema_check(name, spec.get("type"), _schema_leaf(name, spec))
+        check(v, name, errors)
+
+    def validate(opt, errors):
+        get = opt.get
+        for name, types, low, high, allow_none in ranged:
+            v = get(name, _MISSING)
+            if type(v) in types and (low is None or v >= low) and (high is None or v <= high):
+                continue
+            failed(name, v, allow_none, errors)
+        for name, types, low, high, allow_none in ranged_lists:
+            v = get(name, _MISSING)
+            if type(v) is list or type(v) is tuple:
+                for x in v:
+                    if not (type(x) in types and (low is None or x >= low) and (high is None or x <= high)):
+                        break
+                else:
+                    continue
+            failed(name, v, allow_none, errors)
+        for name, types, allowed, allow_none in choices:
+            v = get(name, _MISSING)
+            if type(v) in types and v in allowed:
+                continue
+            failed(name, v, allow_none, errors)
+        for name, t, allow_none in typed:
+            v = get(name, _MISSING)
+            if isinstance(v, t):
+                continue
+            failed(name, v, allow_none, errors)
+        for name, check, allow_none in other:
+            v = get(name, _MISSING)
+            if not (v is _MISSING or (v is None and allow_none) or type(v) is _ExternalParam):
+                check(v, name, errors)
+        return errors
+    return validate
+
+
+class FrozenParams:
+    """
+    Immutable snapshot of resolved parameters, returned by ConfigMaster.freeze().
+
+    Each parameter is a __slots__ attribute (cfg.forecastHour), which is faster to read and smaller than a dict.
+    Parameters can't be changed.  Names starting with '_' are derived values (like p["_newDir"] in example4), which
+    can still be set: cfg._newDir = os.path.join(cfg.dataDir, "new").  They live in the cfg._derived namespace.
+    cfg["name"] works for both kinds.  The containers inside the parameters (lists, dicts) are not copied.
+    """
+    __slots__ = ("_derived",)
+    _fields = ()
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            setattr(self._derived, name, value)
+        else:
+            raise AttributeError(f"frozen parameters can't be changed: {name}")
+
+    def __delattr__(self, name):
+        if name.startswith("_"):
+            delattr(self._derived, name)
+        else:
+            raise AttributeError(f"frozen parameters can't be changed: {name}")
+
+    def __getattr__(self, name):
+        # only called when name is not a parameter
+        try:
+            return getattr(object.__getattribute__(self, "_derived"), name)
+        except AttributeError:
+            raise AttributeError(f"no parameter named {name}") from None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        self.__setattr__(key, value)
+
+    def __contains__(self, key):
+        return key in self._fields or hasattr(self._derived, key)
+
+    def __iter__(self):
+        yield from self._fields
+        yield from vars(self._derived)
+
+    def __len__(self):
+        return len(self._fields) + len(vars(self._derived))
+
+    def _asdict(self):
+        d = {name: getattr(self, name) for name in self._fields}
+        d.update(vars(self._derived))
+        return d
+
+    def __repr__(self):
+        return f"FrozenParams({', '.join(f'{k}={v!r}' for k, v in self._asdict().items())})"
+
+    def __reduce__(self):
+        return _make_frozen_params, (self._fields, tuple(getattr(self, name) for name in self._fields),
+                                     vars(self._derived))
+
+
+# generated FrozenParams subclasses, keyed by their tuple of parameter names
+_frozen_classes = {}
+
+
+def _make_frozen_params(names, values, derived):
+    cls = _frozen_classes.get(names)
+    if cls is None:
+        cls = type("FrozenParams", (FrozenParams,), {"__slots__": names, "_fields": names})
+        _frozen_classes[names] = cls
+    frozen = object.__new__(cls)
+    import types
+    object.__setattr__(frozen, "_derived", types.SimpleNamespace(**derived))
+    for name, value in zip(names, values):
+        object.__setattr__(frozen, name, value)
+    return frozen
+
+
+# shared memory snapshots (see ConfigMaster.publishSnapshot): the "pointer" block holds the current version,
+# the data block of each version holds a marshalled index {name: (offset, size, buffers)} and the pickled values
+_SNAPSHOT_MAGIC = b"CMSNAP01"
+_SNAPSHOT_HEADER = 24
+
+
+# names of the snapshot blocks this process published, see _attach_shared_memory()
+_published_snapshot_blocks = set()
+
+
+def _attach_shared_memory(name):
+    """
+    Attach to the shared memory block name, without it being unlinked when this process exits (the publisher
+    owns it).  Since python 3.13 SharedMemory(track=False) does that.  Before, attaching registers the block with
+    the resource tracker: a process started by multiprocessing shares the tracker of the process that started it,
+    where the publisher registered the block already, but any other process has its own tracker, which would unlink
+    the block at exit, so it is unregistered there.
+    """
+    from multiprocessing import shared_memory
+    try:
+        return shared_memory.SharedMemory(name, create=False, track=False)
+    except TypeError:
+        pass
+    block = shared_memory.SharedMemory(name, create=False)
+    import multiprocessing
+    if os.name == "posix" and multiprocessing.parent_process() is None and name not in _published_snapshot_blocks:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister("/" + block.name, "shared_memory")
+    return block
+
+
+class SharedParams:
+    """
+    Read-only view of a parameter snapshot published with ConfigMaster.publishSnapshot(), attached by name
+    (ConfigMaster.attachSnapshot(name)).  Attaching only reads the index, each value is unpickled from the shared
+    memory the first time it is used.  Buffers (numpy arrays, bytearrays) are not copied, they are read-only views
+    of the shared memory.
+    """
+    # attempts to attach the version the pointer names, while the publisher publishes new ones
+    refresh_tries = 5
+
+    def __init__(self, name):
+        self.name = name
+        self._pointer = _attach_shared_memory(name)
+        self._block = None
+        self.refresh()
+
+    def _pointerVersion(self):
+        import struct
+        magic, version = struct.unpack_from("8sQ", self._pointer.buf)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError(f"{self.name} is not a ConfigMaster snapshot")
+        return version
+
+    def refresh(self):
+        """
+        Attach to the latest published version, if it changed.  Returns True if it did.
+        """
+        import marshal
+        import struct
+        for attempt in range(self.refresh_tries):
+            version = self._pointerVersion()
+            if self._block is not None and version == self.version:
+                return False
+            try:
+                block = _attach_shared_memory(f"{self.name}_{version}")
+                break
+            except FileNotFoundError:
+                # the publisher keeps the previous version too, but more than one publish happened since the
+                # pointer was read: read it again
+                if attempt == self.refresh_tries - 1:
+                    raise
+        index_size, = struct.unpack_from("Q", block.buf, 16)
+        self._close()
+        self._block = block
+        self._buf = block.buf
+        self.version = version
+        self._index = marshal.loads(self._buf[_SNAPSHOT_HEADER:_SNAPSHOT_HEADER + index_size])
+        self._values = {}
+        return True
+
+    def isStale(self):
+        """
+        True if a newer version has been published since this one was attached.
+        """
+        return self._pointerVersion() != self.version
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        import pickle
+        offset, size, buffers = self._index[key]
+        value = pickle.loads(self._buf[offset:offset + size],
+                             buffers=[self._buf[o:o + n] for o, n in buffers])
+        if type(value) is _ExternalParam:
+            value = value.load()
+        self._values[key] = value
+        return value
+
+    def get(self, key, default=None):
+        return self[key] if key in self._index else default
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def keys(self):
+        return self._index.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in self._index)
+
+    def _close(self):
+        if self._block is not None:
+            self._values = {}
+            self._buf = None
+            try:
+                self._block.close()
+            except BufferError:
+                # a value still uses the memory (e.g. a numpy array), it is unmapped when that is gone
+                pass
+            self._block = None
+
+    def close(self):
+        self._close()
+        self._pointer.close()
+
+    def __repr__(self):
+        return f"SharedParams({self.name!r}, version={self.version})"
+
+
 class ConfigMaster:
-    """ This is the main dictionary that holds all the args """
-    opt = {}
+    """
+    This is the main dictionary that holds all the args
+
+    Thread safety: every ConfigMaster keeps its parameters in its own opt dictionary, so separate instances can be
+    created and initialized concurrently from different threads.  The process wide pieces (bytecode cache,
+    config layer cache, the os.environ tracking used by the resolved cache) are safe to share.  A single instance
+    must not be initialized from two threads at once; once init() returns it can be read from any thread.
+    Note that createDefaultLogger() configures the (process wide) root logger, only the first call takes effect.
+    """
 
     defaultParamsHeader = "#!/usr/bin/env python3\n"
     defaultParams = ""
+    _addedDefaultParamsHeader = False
     # optionsToIgnore = ['dt', 'os']
-    parser = None
-
-    # this hangs on to a reference of the cmd line args for us.
-    args = None
 
-    version_info = (1, 6)
+    version_info = (2, 18)
     version = ".".join(map(str, version_info))
 
-    configFilePath = None
     allow_extra_parameters = False
 
     allow_config_override = True
@@ -64,8 +1493,82 @@ class ConfigMaster:
 
     doDebug = False
 
-    # dumb default constructor does nothing.
-    # TODO - should the assignments above be in a constructor?
+    # compiled defaultParams / config files are cached on disk (like __pycache__).
+    # Set use_bytecode_cache = False (or CONFIGMASTER_NO_CACHE=1 in the environment) to turn this off.
+    use_bytecode_cache = True
+    # None means $CONFIGMASTER_CACHE_DIR, or $XDG_CACHE_HOME/ConfigMaster, or ~/.cache/ConfigMaster
+    cache_dir = None
+    bytecode_cache_suffix = ".cmc"
+    # sources shorter than this (in characters) are compiled every time: that costs less than the cache lookup
+    # and the import of zlib in a fresh process
+    bytecode_cache_min_size = 2048
+    # top-level `name = literal` assignments are set directly instead of being run, see _literal_plan().
+    # Only used for sources that go through the bytecode cache.
+    literal_fast_path = True
+    # process wide counters, see getBytecodeCacheStats()
+    bytecode_cache_stats = {"hits": 0, "misses": 0, "errors": 0}
+    _stats_lock = _thread.allocate_lock()
+
+    # opt-in cache of the fully resolved opt dictionary (see init(resolved_cache=True) or CONFIGMASTER_RESOLVED_CACHE=1)
+    use_resolved_cache = False
+    resolved_cache_suffix = ".cmr"
+    resolved_cache_stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "errors": 0}
+
+    # config sources given as http:// or https:// URLs, see fetchConfigSource(): seconds to wait for the server,
+    # seconds a fetched copy is used without asking the server again (0: a conditional request on every load),
+    # idle connections kept open per server, and headers sent with every request (e.g. {"Authorization": ...}).
+    # Each instance gets its own copy of http_headers, see __init__
+    http_timeout = 10.0
+    http_max_age = 0.0
+    http_pool_size = 4
+    http_headers = None
+    http_cache_suffix = ".cmh"
+    # process wide counters, see getHTTPStats()
+    http_stats = {"requests": 0, "downloads": 0, "not_modified": 0, "fresh": 0, "stale": 0, "errors": 0,
+                  "connections": 0}
+
+    # time every top-level statement of the defaults and config files (also turned on by --cm-profile-config)
+    profile_config = False
+    profile_report_lines = 15
+    # checkConfigFiles() (and the watcher) reload a changed file once its size and mtime stayed the same for this
+    # many seconds, so a file that is still being written isn't loaded half way.  It waits at most
+    # reload_settle_tries times, then tries again at the next check.
+    reload_settle_seconds = 0.1
+    reload_settle_tries = 20
+    # only add the --name options of the params that are on the cmd line (all of them for -h)
+    lazy_param_args = True
+    # print the init() phase timings (also turned on by --cm-timings)
+    print_timings = False
+    # default logger (see createDefaultLogger): write the log records from a background thread, keep up to
+    # log_buffer_records records before writing them (ERROR and above are written right away), and rotate the
+    # log file at log_max_bytes, keeping log_backup_count old files.  0 turns buffering and rotating off.
+    async_logging = False
+    log_buffer_records = 0
+    log_max_bytes = 0
+    log_backup_count = 5
+    # argparse destinations that control ConfigMaster itself and are not copied into opt
+    internal_arg_dests = ("dump_resolved", "cm_profile_config", "cm_timings")
+
+    # name of the function config files call to include another config file
+    config_include_func_name = "_config_include"
+    # name of the function that declares a parameter stored in an array file, see _ExternalParam
+    config_external_func_name = "_config_external"
+    # name of the function that declares a default computed only if nothing overrides it, see _Deferred
+    config_deferred_func_name = "_config_deferred"
+    # name of the table of parameter schemas in defaultParams, see _compile_schema()
+    config_schema_dict_name = "_config_schema"
+    # check the resolved parameters against their schemas at the end of init() and reloadConfig()
+    validate_params = True
+    # reuse evaluated config layers across init() and reloadConfig() calls and ConfigMasters (also turned on by
+    # init(layer_cache=True), ConfigRegistry turns it on for its entries).  Off by default: a cached layer is only
+    # evaluated again when a file it was built from or an environment variable it read changes, so a layer that
+    # e.g. lists a directory would keep its old value.  Without it a layer is still evaluated only once per
+    # init() or reload, however many config files include it.
+    use_layer_cache = False
+    # cache of evaluated config layers, see use_layer_cache and clearLayerCache():
+    # abspath -> (settings, copy of the variables, files it was built from, line of each variable, environment
+    # variables it read)
+    _layer_cache = {}
 
     # Instead of this:
     # p = ConfigMaster()
@@ -76,6 +1579,77 @@ class ConfigMaster:
     # parameterized constructor
     def __init__(self, defaultParams=None, docString="", **kwargs):
 
+        # state of this configuration.  Everything that changes per configuration lives on the instance.
+        self.opt = {}
+        # this hangs on to a reference of the cmd line args for us.
+        self.args = None
+        self.parser = None
+        # params that have a --name option in the parser, and all the params when some were left out
+        # (see getParamArgsInArgv)
+        self._param_args = set()
+        self._param_arg_defaults = None
+        # the cmd line to parse, None means sys.argv
+        self.argv = None
+        self.configFilePath = None
+        # every config file given with -c, see getConfigFilePaths()
+        self.configFilePaths = []
+        # time spent loading each config layer of the last init(), reload or handleConfigFile(), see getLayerReport()
+        self.layer_timings = []
+        # abspath -> (variables, files, layer_timings) of config files evaluated ahead by initAsync() or
+        # reloadConfigAsync(), used by the next load of the file
+        self._prefetched_layers = {}
+        # filename -> {name: line of its last top-level assignment}, for error messages (see _literal_plan)
+        self.config_lines = {}
+        # opt after the defaults were assigned, and after the defaults and config files were applied (but before
+        # the command line)
+        self.default_opt = None
+        self.base_opt = None
+        # (path, mtime_ns, size) of every config file and included layer of this configuration
+        self.config_deps = []
+        # included layers evaluated during the current init(), reload or handleConfigFile() (None in between),
+        # in the layer cache format
+        self._layer_scope = None
+        # called with (this ConfigMaster, {key: (old value, new value)}) after a reload changed parameters
+        self.reload_callbacks = []
+        self.reload_metrics = {"polls": 0, "poll_seconds": 0.0, "last_poll_seconds": 0.0, "reloads": 0,
+                               "reload_errors": 0, "last_reload_seconds": 0.0, "last_reload_latency_seconds": 0.0,
+                               "inotify": False}
+        self._reload_lock = _thread.allocate_lock()
+        # reload_metrics is written by the watcher thread and read by anyone
+        self._metrics_lock = _thread.allocate_lock()
+        self._watcher = None
+        # per statement timings of the defaults and config files, see getConfigProfileReport()
+        self.config_profile = []
+        # how long each phase of init() took, in seconds, see getTimingReport()
+        self.init_timings = {"version": self.version, "program": sys.argv[0] if sys.argv else "", "total": 0.0,
+                             "resolved_cache_hit": False, "config_files": [], "phases": {}, "phase_starts": {}}
+        # called with init_timings at the end of init(), e.g. to send them to a metrics system
+        self.timing_hook = None
+        # the _config_schema entries of the defaults, and the function that checks them (see validateParams())
+        self.param_schema = {}
+        self._schema_validator = None
+        # compiled _config_override rules, the rules that fired and conflicting rules, see doConfigOverride()
+        self.override_index = None
+        self.override_trace = []
+        self.override_conflicts = []
+        # inputs recorded while resolving, only set while the resolved cache is active
+        self._resolved_inputs = None
+        # the background thread writing the log records, see async_logging
+        self.log_listener = None
+        self._log_listener_running = False
+        # parameter reads, see trackAccess() and countAccess().  _tracking is non-zero while anything records
+        self._tracking = 0
+        self._access_lock = _thread.allocate_lock()
+        self._access_local = _thread._local()
+        self.access_counts = None
+        # shared memory snapshot, see publishSnapshot()
+        self._snapshot_name = None
+        self._snapshot_version = 0
+        self._snapshot_pointer = None
+        self._snapshot_blocks = []
+        # headers sent with the http requests of this configuration, starting from the class wide ones
+        self.http_headers = dict(type(self).http_headers or {})
+
         # print(kwargs)
         # to be backwards compatible, we support the old method of setting up ConfigMaster with 3 different calls
         if defaultParams != None:
@@ -91,21 +1665,90 @@ class ConfigMaster:
     def setDefaultParams(self, dp):
         if dp.lstrip()[0:2] == "#!":
             self.defaultParams = dp
+            self._addedDefaultParamsHeader = False
         else:
             self.defaultParams = self.defaultParamsHeader + dp
+            self._addedDefaultParamsHeader = True
 
     def printParams(self):
         print(f"{self.getParamsString()}")
 
     def getParamsString(self):
-        returnString = ""
-        for o in self.opt:
-            if self.allow_config_override and not self.config_override_dict_name == o:
-                returnString += (o + " : " + str(self.opt[o]) + "\n")
-        return returnString
+        # returnString = ""
+        # for o in self.opt:
+        #     if self.allow_config_override and not self.config_override_dict_name == o:
+        #         returnString += (o + " : " + str(self.opt[o]) + "\n")
+        # return returnString
+        return "".join(f"{o} : {self.opt[o]}\n" for o in self.opt if o != self.config_override_dict_name)
+
+    def dumpParams(self, fp=None, format="python"):
+        """
+        Write the resolved parameters to fp, one parameter at a time.  The _config_override table is left out,
+        its rules have already been applied.
+        :param fp: File-like object to write to, sys.stdout by default
+        :param str format: "python" (a config file: name = value), "json" (an object) or "lines" (name, a tab and
+                           the JSON encoded value on each line)
+        """
+        if fp is None:
+            fp = sys.stdout
+        names = (o for o in self.opt if o != self.config_override_dict_name)
+
+        if format == "python":
+            fp.write(f"# resolved parameters, ConfigMaster {self.version}\n")
+            for path in self.getConfigFilePaths():
+                fp.write(f"# config file: {path}\n")
+            for o in names:
+                value = self.opt[o]
+                if _isLiteral(value) or type(value) is _ExternalParam:
+                    fp.write(f"{o} = {value!r}\n")
+                elif isinstance(value, float):
+                    # inf and nan
+                    fp.write(f"{o} = float({repr(value)!r})\n")
+                else:
+                    fp.write(f"# {o} = {value!r}  (not a literal)\n")
+        elif format in ("json", "lines"):
+            import json
+            # NaN and Infinity are not JSON, they go through _jsonable() like keys that are not strings
+            encoder = json.JSONEncoder(default=repr, allow_nan=False)
+
+            def encode(value):
+                try:
+                    return encoder.encode(value)
+                except (TypeError, ValueError):
+                    return encoder.encode(_jsonable(value))
+
+            if format == "lines":
+                for o in names:
+                    fp.write(f"{o}\t{encode(self.opt[o])}\n")
+            else:
+                separator = "{\n"
+                for o in names:
+                    fp.write(f"{separator}  {encoder.encode(o)}: {encode(self.opt[o])}")
+                    separator = ",\n"
+                fp.write("{}\n" if separator == "{\n" else "\n}\n")
+        else:
+            raise ValueError(f"unknown dump format {format!r}, use python, json or lines")
+
+    def dumpResolvedParams(self, path):
+        """
+        Write the resolved parameters to path ("-" for stdout), as JSON for .json files, "lines" for .lines and
+        .txt files and python otherwise.  This is what --dump_resolved does.
+        """
+        format = {".json": "json", ".lines": "lines", ".txt": "lines"}.get(os.path.splitext(path)[1], "python")
+        if path == "-":
+            self.dumpParams(sys.stdout, format)
+            return
+        # write a temp file and rename it, so an archived config is never half written
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as fh:
+                self.dumpParams(fh, format)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
     def assignParameters(self, p):
-        global opt
         self.opt = p
 
     def printDefaultParams(self):
@@ -116,32 +1759,337 @@ class ConfigMaster:
         #    self.defaultParams = dp
         #  self.opt["_config_override"] = collections.defaultdict(lambda: collections.defaultdict(lambda: collections.defaultdict(list)))
         dp = self.defaultParams
-        if self.allow_config_override:
-            dp = f"import collections\n{self.config_override_dict_name} = collections.defaultdict(lambda: collections.defaultdict(lambda: collections.defaultdict(list)))\n" + dp
-        exec(dp, self.opt)
+        if self._addedDefaultParamsHeader and dp.startswith(self.defaultParamsHeader):
+            # run the params as they were given, so line numbers match the caller's string
+            dp = dp[len(self.defaultParamsHeader):]
+        external = self.opt[self.config_external_func_name] = _external_param_func(os.getcwd())
+        self.opt[self.config_deferred_func_name] = _config_deferred
+        self.opt[self.config_schema_dict_name] = {}
+        self.execSource(dp, self.opt, "<defaultParams>")
+        self.setSchema(self.opt.pop(self.config_schema_dict_name))
         #print("opt ")
         #print(self.opt)
-        del self.opt['__builtins__']
+        # only there if some statement had to be run
+        self.opt.pop('__builtins__', None)
+        if self.opt.get(self.config_external_func_name) is external:
+            del self.opt[self.config_external_func_name]
+        if self.opt.get(self.config_deferred_func_name) is _config_deferred:
+            del self.opt[self.config_deferred_func_name]
+        _bind_deferred(self.opt)
 
         # make a copy of the keys because we are going to be deleting as we iterate
         ko_keys = list(self.opt.keys())
         for ko in ko_keys:
-            if type(self.opt[ko]) == types.ModuleType:
+            if type(self.opt[ko]) == _ModuleType:
                 del self.opt[ko]
 
+        # keep the defaults, reloadConfig() starts over from them
+        self.default_opt = dict(self.opt)
+        if self.config_override_dict_name in self.default_opt:
+            self.default_opt[self.config_override_dict_name] = self._plainOverrides()
+
+    def execSource(self, source, namespace, filename):
+        """
+        Run defaultParams or config file source in namespace, with the _config_override table set up.
+        With literal_fast_path on, the literal assignments are set without running anything (see _literal_plan()).
+        With profiling on (--cm-profile-config), each top-level statement is timed separately.
+        :return: the steps that were run: code objects and (names, value) tuples (None when profiling)
+        """
+        if self.allow_config_override:
+            import collections
+            # this used to be a preamble prepended to the source, which shifted every line number by 2
+            namespace["collections"] = collections
+            namespace[self.config_override_dict_name] = _new_override_table()
+
+        if self.profile_config:
+            self._execProfiled(source, namespace, filename)
+            return None
+
+        # building the plan costs more than a compile() (the whole ast is made of python objects), it pays off
+        # when it comes from the cache
+        if not self.literal_fast_path or not self._cachesBytecode(source):
+            code = self.compileSource(source, filename)
+            exec(code, namespace)
+            return [code]
+
+        steps, lines = self.compileSource(source, filename, literal_plan=True)
+        self.config_lines[filename] = lines
+        for step in steps:
+            if type(step) == tuple:
+                names, value = step
+                for name in names:
+                    namespace[name] = value
+            else:
+                exec(step, namespace)
+        return steps
+
+    def _execProfiled(self, source, namespace, filename):
+        import ast
+        import time
+
+        lines = source.splitlines()
+        tree = ast.parse(source, filename)
+        for stmt in tree.body:
+            code = compile(ast.Module(body=[stmt], type_ignores=[]), filename, "exec")
+            start = time.perf_counter()
+            try:
+                exec(code, namespace)
+            finally:
+                self.config_profile.append({"file": filename, "line": stmt.lineno, "end_line": stmt.end_lineno,
+                                            "seconds": time.perf_counter() - start,
+                                            "source": lines[stmt.lineno - 1].strip()})
+
+    def getConfigProfileReport(self, limit=None):
+        """
+        The slowest top-level statements of the defaults and config files, recorded with --cm-profile-config.
+        :param int limit: number of statements to report (default profile_report_lines)
+        """
+        limit = self.profile_report_lines if limit is None else limit
+        slowest = sorted(self.config_profile, key=lambda r: r["seconds"], reverse=True)[:limit]
+        total = sum(r["seconds"] for r in self.config_profile)
+        lines = [f"config profile: {len(self.config_profile)} statements, {total * 1000.0:.3f} ms total, slowest:"]
+        for r in slowest:
+            where = f"{r['file']}:{r['line']}" + (f"-{r['end_line']}" if r["end_line"] != r["line"] else "")
+            lines.append(f"{r['seconds'] * 1000.0:10.3f} ms  {where}  {r['source']}")
+        return "\n".join(lines)
+
+    def getCacheDir(self):
+        if self.cache_dir is not None:
+            return self.cache_dir
+        if os.environ.get("CONFIGMASTER_CACHE_DIR"):
+            return os.environ["CONFIGMASTER_CACHE_DIR"]
+        xdg = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        return os.path.join(xdg, "ConfigMaster")
+
+    def bytecodeCacheEnabled(self):
+        if not self.use_bytecode_cache:
+            return False
+        return os.environ.get("CONFIGMASTER_NO_CACHE", "") in ("", "0")
+
+    def _cachesBytecode(self, source):
+        # small sources are compiled every time, see bytecode_cache_min_size
+        return len(source) >= self.bytecode_cache_min_size and self.bytecodeCacheEnabled()
+
+    def _count(self, stats, key):
+        with self._stats_lock:
+            stats[key] += 1
+
+    def getBytecodeCacheStats(self):
+        """
+        Return a copy of the process wide bytecode cache counters (hits, misses, errors).
+        """
+        return dict(self.bytecode_cache_stats)
+
+    def layerCacheEnabled(self):
+        if os.environ.get("CONFIGMASTER_NO_CACHE", "") not in ("", "0"):
+            return False
+        return self.use_layer_cache
+
+    @classmethod
+    def clearLayerCache(cls):
+        """
+        Forget every config layer kept for the process, see use_layer_cache.
+        """
+        cls._layer_cache.clear()
+
+    def clearBytecodeCache(self):
+        """
+        Remove every cached code object from the cache directory.
+        """
+        cache_dir = self.getCacheDir()
+        if not os.path.isdir(cache_dir):
+            return
+        for f in os.listdir(cache_dir):
+            if f.endswith(self.bytecode_cache_suffix):
+                try:
+                    os.remove(os.path.join(cache_dir, f))
+                except OSError:
+                    pass
+
+    def compileSource(self, source, filename, literal_plan=False):
+        """
+        Compile source for exec(), reusing a marshalled code object from the on-disk cache when possible.
+
+        Cache entries are keyed by checksums (crc32 and adler32) of the source text, the filename and the
+        interpreter's cache tag and version, so an edited file or a different python version simply misses and
+        writes a new entry.  Sources shorter than bytecode_cache_min_size are always compiled.  Any problem
+        reading or writing the cache falls back to a plain compile().
+        :param str source: python source, including any preamble
+        :param str filename: filename used in tracebacks
+        :param bool literal_plan: return the steps of _literal_plan() instead of one code object
+        :return: code object, or (steps, lines) with literal_plan
+        """
+        build = _literal_plan if literal_plan else lambda src, fn: compile(src, fn, "exec")
+        tag = sys.implementation.cache_tag
+        if tag is None or not self._cachesBytecode(source):
+            return build(source, filename)
+
+        # (importing hashlib or importlib.util for a digest or the magic number would cost more than a compile)
+        import marshal
+        import zlib
+
+        key = "\0".join((tag, "%x" % sys.hexversion, "plan" if literal_plan else "code", filename,
+                         source)).encode("utf-8", "surrogateescape")
+        name = "%08x%08x%08x" % (zlib.crc32(key), zlib.adler32(key), len(key) & 0xffffffff)
+        cache_dir = self.getCacheDir()
+        cache_file = os.path.join(cache_dir, name + self.bytecode_cache_suffix)
+        header = name.encode("ascii")
+
+        try:
+            with open(cache_file, "rb") as cfh:
+                data = cfh.read()
+            if data[:len(header)] == header:
+                code = marshal.loads(data[len(header):])
+                self._count(self.bytecode_cache_stats, "hits")
+                self.debug(f"bytecode cache hit for {filename}")
+                return code
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, EOFError, TypeError):
+            # corrupt or unreadable entry.  Treat it as a miss, it gets rewritten below.
+            self._count(self.bytecode_cache_stats, "errors")
+
+        self._count(self.bytecode_cache_stats, "misses")
+        self.debug(f"bytecode cache miss for {filename}")
+        code = build(source, filename)
+
+        try:
+            import tempfile
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temp file and rename, so a concurrent reader never sees a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tfh:
+                    tfh.write(header + marshal.dumps(code))
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except (OSError, ValueError):
+            # ValueError: marshal can't write it (a literal too deeply nested, say), it is just not cached
+            self._count(self.bytecode_cache_stats, "errors")
+
+        return code
+
+    def fetchConfigSource(self, url):
+        """
+        Fetch a config source given as an http:// or https:// URL (with -c, handleConfigFile() or _config_include()).
+
+        Every fetched source is kept in the cache directory (see getCacheDir()) with its ETag and Last-Modified.
+        The next fetch is a conditional request (If-None-Match, If-Modified-Since), which the server answers with
+        a short 304 if the source didn't change, over a connection kept open from the previous request.  Within
+        http_max_age seconds of the last answer the cached copy is used without a request at all.  If the server
+        can't be reached, doesn't answer within http_timeout seconds or fails (5xx), the cached copy is used, with
+        a warning.
+        :return: (text, signature), the signature stands in for (mtime_ns, size) of a file
+        """
+        import http.client
+        import time
+
+        cached = self._readHTTPCache(url)
+        if cached is not None and time.time() - cached[0]["checked"] < self.http_max_age:
+            self._count(self.http_stats, "fresh")
+            return cached[1].decode("utf-8"), _content_signature(cached[1])
+
+        headers = dict(self.http_headers)
+        if cached is not None:
+            if cached[0].get("etag"):
+                headers["If-None-Match"] = cached[0]["etag"]
+            if cached[0].get("last_modified"):
+                headers["If-Modified-Since"] = cached[0]["last_modified"]
+
+        self._count(self.http_stats, "requests")
+        status = None
+        try:
+            status, response_headers, body, new_connection = _http_get(url, headers, self.http_timeout,
+                                                                       self.http_pool_size)
+        except (OSError, http.client.HTTPException) as e:
+            problem = f"{e!r}"
+        else:
+            if new_connection:
+                self._count(self.http_stats, "connections")
+            if status == 304 and cached is not None:
+                self._count(self.http_stats, "not_modified")
+                self.debug(f"{url} not modified")
+                if self.http_max_age:
+                    cached[0]["checked"] = time.time()
+                    self._writeHTTPCache(url, cached[0], cached[1])
+                return cached[1].decode("utf-8"), _content_signature(cached[1])
+            if status == 200:
+                self._count(self.http_stats, "downloads")
+                self._writeHTTPCache(url, {"url": url, "etag": response_headers.get("ETag"),
+                                           "last_modified": response_headers.get("Last-Modified"),
+                                           "checked": time.time()}, body)
+                return body.decode("utf-8"), _content_signature(body)
+            problem = f"HTTP {status}"
+
+        self._count(self.http_stats, "errors")
+        if cached is not None and (status is None or status >= 500):
+            self._count(self.http_stats, "stale")
+            print(f"WARNING: could not fetch {url} ({problem}), using the copy from "
+                  f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(cached[0]['checked']))}")
+            return cached[1].decode("utf-8"), _content_signature(cached[1])
+        if status == 404:
+            raise FileNotFoundError(f"config source not found: {url} ({problem})")
+        raise OSError(f"could not fetch config source {url} ({problem})")
+
+    def getHTTPStats(self):
+        """
+        Return a copy of the process wide counters of the config sources fetched over http: requests sent, full
+        downloads, not modified answers, copies used without a request (http_max_age), stale copies used because
+        the server failed, errors, and connections opened.
+        """
+        return dict(self.http_stats)
+
+    def getHTTPCacheFile(self, url):
+        import hashlib
+        return os.path.join(self.getCacheDir(), "http",
+                            hashlib.sha256(url.encode("utf-8", "surrogateescape")).hexdigest() + self.http_cache_suffix)
+
+    def _readHTTPCache(self, url):
+        # (headers of the cached copy, body), or None
+        import json
+        try:
+            with open(self.getHTTPCacheFile(url), "rb") as fh:
+                meta = json.loads(fh.readline())
+                body = fh.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != url:
+            return None
+        return meta, body
+
+    def _writeHTTPCache(self, url, meta, body):
+        cache_file = self.getHTTPCacheFile(url)
+        try:
+            import json
+            import tempfile
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            # write to a temp file and rename, so a concurrent reader never sees a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tfh:
+                    tfh.write(json.dumps(meta).encode("utf-8") + b"\n" + body)
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except OSError:
+            self._count(self.http_stats, "errors")
+
     def getConfigFilePath(self):
         return self.configFilePath
 
+    def getConfigFilePaths(self):
+        """
+        All the config files given with -c, in the order they were applied.
+        """
+        return list(self.configFilePaths)
+
     # config file path
     def handleConfigFile(self, cfp):
         self.configFilePath = cfp
-        config_path, config_file = os.path.split(cfp)
-
-        if config_file[-3:] == ".py":
-            config_file = config_file[:-3]
-
-        if config_path != '':
-            sys.path.append(config_path)
+        self.configFilePaths.append(cfp)
 
         # print "importing config file: {}".format(config_file)
         # cf = __import__(config_file, globals(), locals(), [])
@@ -149,77 +2097,334 @@ class ConfigMaster:
         # cf = importlib.import_module(config_file)
 
         print(f"loading configuration from {cfp}")
-        with open(cfp, 'r') as my_conf_file:
-            conf_string = my_conf_file.read()
-        #print(f"conf_str = {conf_string}")
-        #spec = importlib.util.spec_from_file_location(config_file, cfp)
-        #cf = importlib.util.module_from_spec(spec)
-        #spec.loader.exec_module(cf)
-        cf = {}
-        if self.allow_config_override:
-            conf_string = f"import collections\n{self.config_override_dict_name} = collections.defaultdict(lambda: collections.defaultdict(lambda: collections.defaultdict(list)))\n" + conf_string
-
-        # when I switched from importlib back to exec, __file__ stopped working, so swap by hand:
-        conf_string = conf_string.replace("__file__","'"+config_file+"'")
-
-        #self.debug(f"about to exec:\n {conf_string}\n\n")
+        # called on its own (not by the parser in init()): the layers of this call only
+        scoped = self._layer_scope is None
+        if scoped:
+            self._layer_scope = {}
+            self.layer_timings = []
         try:
-            exec(conf_string, cf)
-        except: 
-            print(f"FAIL: exec of conf_string:\n{conf_string}\n")
-            raise
-        
-        del cf['__builtins__']
-        #for cfk in list(cf.keys()):
-        #    if type(cf[cfk]) == types.ModuleType:
-        #        del cf[cfk]
+            with self._phaseTimer("handleConfigFile"):
+                cf = self.loadConfigLayer(cfp, _deps=self.config_deps)
+        finally:
+            if scoped:
+                self._layer_scope = None
+        if self.doDebug:
+            print(self.getLayerReport())
 
+        self.applyConfigLayer(self.opt, cf, cfp)
+
+    def applyConfigLayer(self, opt, cf, cfp):
+        """
+        Apply the variables of a config file (see loadConfigLayer()) to the parameter dictionary opt.
+        """
         # cf = importlib.import_module(config_file)
-        for o in self.opt:
+        for o in opt:
             #self.debug(f"looking at {o}")
-            #if o == self.config_override_dict_name:
-            #    continue
             #if o in dir(cf):
             #    self.debug(f"found in cf: setting to {getattr(cf, o)}")
             #    self.opt[o] = getattr(cf, o)
-            if o in cf:
+            if o == self.config_override_dict_name and o in cf:
+                # override rules from every layer are kept, later layers win for the same rule
+                self.mergeOverrides(opt[o], cf[o])
+            elif o in cf:
                 self.debug(f"found {o} in config file\n\toverriding to {cf[o]}")
-                self.opt[o] = cf[o]
+                opt[o] = cf[o]
 
         #dcf = dir(cf)
         #self.debug(f"cf = {cf}")
         #self.debug(f"dcf = {dcf}")
 
-        # make a copy of the keys because we are going to be deleting them.
-        #cf_keys = list(cf.keys())
-
         #print (cf)
         for cfo in cf:
             #self.debug(f"cfo = {cfo}  type={type(cfo)}")
-            # cfo = dcf[kcfo]
-            # print cfo,type(cf.__dict__[cfo])
             if cfo.startswith("__"):  #
                 continue
-            #if type(cf.__dict__[cfo]) == types.ModuleType:
-            #    continue
-            if type(cf[cfo]) == types.ModuleType:
-                continue
             #print(f"{cfo} = {type(cfo)}")
             #print(f"{cf[cfo]} = {type(cf[cfo])}")
-            if cfo not in self.opt:
+            if cfo not in opt:
+                line = self._configLine(cfp, cfo)
+                where = cfp if line is None else f"{cfp}, line {line}"
                 if self.allow_extra_parameters:
-                    print("WARNING: Extra parameter in configuration file {}: {}\n".format(cfp, cfo))
-                    self.opt[cfo] = cf[cfo]
+                    print("WARNING: Extra parameter in configuration file {}: {}\n".format(where, cfo))
+                    opt[cfo] = cf[cfo]
                 else:
-                    print("\nERROR: Invalid parameter in configuration file {}: {}\n".format(cfp, cfo))
+                    print("\nERROR: Invalid parameter in configuration file {}: {}\n".format(where, cfo))
                     exit(1)
 
+    def _configLine(self, cfp, name):
+        """
+        The line of config file cfp that last assigned name at the top level, for messages (None if unknown).
+        Files that didn't go through the literal plan (see execSource()) are parsed again here.
+        """
+        if cfp not in self.config_lines and not _is_url(cfp):
+            try:
+                with open(cfp) as fh:
+                    self.config_lines[cfp] = _literal_plan(fh.read(), cfp)[1]
+            except (OSError, SyntaxError, ValueError):
+                self.config_lines[cfp] = {}
+        return self.config_lines.get(cfp, {}).get(name)
+
+    @staticmethod
+    def mergeOverrides(dst, src):
+        """
+        Merge the _config_override rules in src into dst.  A rule in src replaces the same rule in dst.
+        """
+        for param1, targets in src.items():
+            for param1_target, param2s in targets.items():
+                dst.setdefault(param1, {}).setdefault(param1_target, {}).update(param2s)
+
+    def loadConfigLayer(self, cfp, _including=(), _deps=None, _timings=None):
+        """
+        Evaluate one config file (a layer) and return its variables.
+
+        A config file can pull in other layers with _config_include("path") (relative paths are relative to the
+        including file).  The included variables are applied at that point, so the rest of the file can use
+        and override them.  An included layer is evaluated once per init() or reload, and with use_layer_cache
+        every layer is evaluated at most once per process (until it, or a file it includes, changes on disk);
+        later loads get a copy of the cached result.  The time spent on every layer is appended to
+        layer_timings.
+
+        :param str cfp: config file path, or an http:// or https:// URL (see fetchConfigSource())
+        :return: dict of the variables set by the layer (and the layers it includes)
+        """
+        import time
+
+        is_url = _is_url(cfp)
+        abs_cfp = cfp if is_url else os.path.abspath(cfp)
+        if abs_cfp in _including:
+            raise RecursionError(f"config file includes itself: {' -> '.join(_including + (abs_cfp,))}")
+
+        if _timings is None:
+            _timings = self.layer_timings
+        # evaluated ahead, in a thread of initAsync() or reloadConfigAsync(), for this load
+        prefetched = self._prefetched_layers.pop(abs_cfp, None) if not _including else None
+        if prefetched is not None:
+            cf, deps, timings = prefetched
+            if _deps is not None:
+                _deps.extend(deps)
+            _timings.extend(timings)
+            return cf
+
+        start = time.perf_counter()
+
+        if is_url:
+            # fetched once, for the layer cache check and (if it misses) the evaluation
+            conf_string, signature = self.fetchConfigSource(cfp)
+        else:
+            conf_string = signature = None
+
+        # while the resolved config cache is recording inputs, only reuse layers evaluated while it was recording,
+        # so environment reads are seen.  Nothing is reused when profiling, so the real cost shows up.
+        share = self.layerCacheEnabled()
+        cached = None
+        if not self.profile_config:
+            if self._layer_scope is not None:
+                cached = self._layer_scope.get(abs_cfp)
+            if cached is None and share and self._resolved_inputs is None:
+                cached = self._layer_cache.get(abs_cfp)
+        if cached is not None and cached[0] == (self.allow_config_override, self.config_override_dict_name) and \
+                all((signature if path == abs_cfp and is_url else self._fileSignature(path)) == (mtime_ns, size)
+                    for path, mtime_ns, size in cached[2]) and _environ_unchanged(cached[4]):
+            if _deps is not None:
+                _deps.extend(cached[2])
+            # a layer including this one depends on the same environment variables
+            _note_environ_reads(cached[4])
+            if cached[3] is not None:
+                self.config_lines[cfp] = cached[3]
+            cf = self._restoreLayer(cached[1])
+            _timings.append({"path": cfp, "seconds": time.perf_counter() - start, "cached": True,
+                             "depth": len(_including)})
+            return cf
+
+        config_path, config_file = os.path.split(cfp)
+
+        if config_file[-3:] == ".py":
+            config_file = config_file[:-3]
+
+        # if config_path != '':
+        #     sys.path.append(config_path)
+        # helper modules next to the config file are imported by a scoped importer instead, see _ScopedImporter
+        importer = _ScopedImporter(None if is_url else os.path.dirname(abs_cfp))
+
+        if not is_url:
+            signature = self._fileSignature(abs_cfp)
+            with open(cfp, 'r') as my_conf_file:
+                conf_string = my_conf_file.read()
+        if self._resolved_inputs is not None:
+            self._recordInputFile(abs_cfp, conf_string)
+        # files this layer was built from: (path, mtime_ns, size)
+        deps = [(abs_cfp,) + signature]
+        #print(f"conf_str = {conf_string}")
+        #spec = importlib.util.spec_from_file_location(config_file, cfp)
+        #cf = importlib.util.module_from_spec(spec)
+        #spec.loader.exec_module(cf)
+        cf = {}
+
+        def include(include_path):
+            if is_url:
+                import urllib.parse
+                include_path = urllib.parse.urljoin(abs_cfp, include_path)
+            elif not os.path.isabs(include_path) and not _is_url(include_path):
+                include_path = os.path.join(os.path.dirname(abs_cfp), include_path)
+            layer = self.loadConfigLayer(include_path, _including + (abs_cfp,), deps, _timings)
+            for k, v in layer.items():
+                if k == self.config_override_dict_name and k in cf:
+                    self.mergeOverrides(cf[k], v)
+                else:
+                    cf[k] = v
+
+        cf[self.config_include_func_name] = include
+        cf["__builtins__"] = importer.builtins
+        external = cf[self.config_external_func_name] = _external_param_func(
+            os.getcwd() if is_url else os.path.dirname(abs_cfp))
+        cf[self.config_deferred_func_name] = _config_deferred
+
+        # when I switched from importlib back to exec, __file__ stopped working, so swap by hand:
+        # conf_string = conf_string.replace("__file__","'"+config_file+"'")
+        # (that also changed "__file__" in strings and comments.  It is a variable now, with the same value)
+        cf["__file__"] = config_file
+
+        #self.debug(f"about to exec:\n {conf_string}\n\n")
+        # the environment variables the layer (and the layers it includes) read, a layer cached for the process is
+        # only valid while they keep their values
+        env_reads = {}
+        if share:
+            _track_environ(env_reads)
+        try:
+            steps = self.execSource(conf_string, cf, cfp)
+        except SyntaxError as e:
+            print(f"FAIL: syntax error in {cfp}, line {e.lineno}: {(e.text or '').strip()}\n")
+            raise
+        except:
+            line = self._failedLine(cfp)
+            print(f"FAIL: exec of {cfp}" + (f", line {line}: {conf_string.splitlines()[line - 1].strip()}\n"
+                                            if line else "\n"))
+            raise
+        finally:
+            if share:
+                _untrack_environ()
+
+        del cf['__builtins__']
+        if cf.get("__file__") == config_file:
+            del cf["__file__"]
+        for path in importer.files:
+            if self._resolved_inputs is not None:
+                with open(path) as fh:
+                    self._recordInputFile(path, fh.read())
+            deps.append((path,) + self._fileSignature(path))
+        if cf.get(self.config_include_func_name) is include:
+            del cf[self.config_include_func_name]
+        if cf.get(self.config_external_func_name) is external:
+            del cf[self.config_external_func_name]
+        if cf.get(self.config_deferred_func_name) is _config_deferred:
+            del cf[self.config_deferred_func_name]
+        _bind_deferred(cf)
+        for cfk in list(cf.keys()):
+            if type(cf[cfk]) == _ModuleType:
+                del cf[cfk]
+
+        if _deps is not None:
+            _deps.extend(deps)
+        # remember the result for the next load of this layer, unless it depends on the time of day
+        keep = share or (self._layer_scope is not None and len(_including) > 0)
+        if steps is None or not keep:
+            pass
+        elif any(_usesTimeFunctions(step) for step in steps if type(step) != tuple):
+            self.debug(f"{cfp} looks at the current time, it will be evaluated every time it is loaded")
+        else:
+            try:
+                entry = ((self.allow_config_override, self.config_override_dict_name), self._copyLayer(cf, steps),
+                         deps, self.config_lines.get(cfp), _environ_inputs(env_reads))
+            except Exception:
+                self.debug(f"can not copy the variables of {cfp}, it will be evaluated every time it is loaded")
+            else:
+                if self._layer_scope is not None:
+                    self._layer_scope[abs_cfp] = entry
+                if share:
+                    self._layer_cache[abs_cfp] = entry
+
+        _timings.append({"path": cfp, "seconds": time.perf_counter() - start, "cached": False,
+                         "depth": len(_including)})
+        return cf
+
+    @staticmethod
+    def _copyLayer(cf, steps):
+        """
+        Copy of the variables of a layer for the layer cache, turned back into a dict by _restoreLayer().
+        If every statement of the file was a literal assignment, those values are exactly what ast.literal_eval
+        built, and they are copied with marshal, which is many times faster than deepcopy for big lists and dicts.
+        Everything else goes through deepcopy.
+        """
+        import copy
+        import marshal
+
+        literal_names = set()
+        if all(type(step) == tuple for step in steps):
+            for names, value in steps:
+                literal_names.update(names)
+        literals = {k: v for k, v in cf.items() if k in literal_names}
+        rest = {k: v for k, v in cf.items() if k not in literal_names}
+        return list(cf), marshal.dumps(literals), copy.deepcopy(rest)
+
+    @staticmethod
+    def _restoreLayer(layer_copy):
+        import copy
+        import marshal
+
+        order, literals, rest = layer_copy
+        values = marshal.loads(literals)
+        values.update(copy.deepcopy(rest))
+        return {k: values[k] for k in order}
+
+    @staticmethod
+    def _failedLine(filename):
+        """
+        The line of filename where the exception being handled was raised (the innermost frame in that file).
+        """
+        tb = sys.exc_info()[2]
+        line = None
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == filename:
+                line = tb.tb_lineno
+            tb = tb.tb_next
+        return line
+
+    def _fileSignature(self, path):
+        if _is_url(path):
+            try:
+                return self.fetchConfigSource(path)[1]
+            except OSError:
+                return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def getLayerReport(self):
+        """
+        One line per config layer that was loaded: how long it took, and whether it came from the layer cache.
+        Included layers are indented and listed just before the file that included them, and their time is also
+        counted in the including file.
+        """
+        lines = []
+        for t in self.layer_timings:
+            status = "cached" if t["cached"] else "evaluated"
+            lines.append(f"{'  ' * t['depth']}{t['path']}: {t['seconds'] * 1000.0:.3f} ms ({status})")
+        return "\n".join(lines)
+
     def init(self, program_description=None, add_param_args=True, add_default_logging=True, additional_args=None,
-             allow_extra_parameters=None, doDebug=False):
+             allow_extra_parameters=None, doDebug=False, resolved_cache=None, argv=None, timing_hook=None,
+             async_logging=None, layer_cache=None):
         """
         Parse command line arguments, and initialize parameter dictionary.
 
         :param doDebug: Turn on ConfigMaster debugging
+        :param list argv: Command line arguments to parse instead of sys.argv[1:]
+        :param timing_hook: Called with init_timings (how long each phase of init() took) at the end of init()
+        :param async_logging: If True, the default logger writes log records on a background thread
+        :param layer_cache: If True, reuse config layers evaluated earlier in this process, see use_layer_cache
+        :param resolved_cache: If True, reuse the resolved parameters of an earlier run with the same defaults, config file, command line and environment.
         :param add_default_logging: This can be used to turn on/off the --debugString and --logPath options
         :param allow_extra_parameters: If this is true, then ConfigMaster will merely warn and not exit if an extra parameter is found in the config file.
         :param str program_description: Short description of the program function. __doc__ is a recommended value.
@@ -233,61 +2438,899 @@ class ConfigMaster:
         if allow_extra_parameters is not None:
             self.allow_extra_parameters = allow_extra_parameters
 
+        if resolved_cache is not None:
+            self.use_resolved_cache = resolved_cache
+
+        if argv is not None:
+            self.argv = list(argv)
+
+        if timing_hook is not None:
+            self.timing_hook = timing_hook
+
+        if async_logging is not None:
+            self.async_logging = async_logging
+
+        if layer_cache is not None:
+            self.use_layer_cache = layer_cache
+
+        # these have to be known before the defaults are evaluated, so don't wait for argparse
+        cm_options = _cm_options_in_argv(sys.argv[1:] if self.argv is None else self.argv)
+        if "--cm-profile-config" in cm_options:
+            self.profile_config = True
+        if "--cm-timings" in cm_options:
+            self.print_timings = True
+
+        init_timer = _PhaseTimer(self.init_timings, "total")
+        with init_timer:
+            cache_key = None
+            if self.resolvedCacheEnabled():
+                with self._phaseTimer("loadResolvedCache"):
+                    cache_key = self.getResolvedCacheKey(program_description, add_param_args, add_default_logging,
+                                                         additional_args)
+                    self.init_timings["resolved_cache_hit"] = self.loadResolvedCache(cache_key)
+                if not self.init_timings["resolved_cache_hit"]:
+                    self.startInputTracking()
+
+            if not self.init_timings["resolved_cache_hit"]:
+                # the config files and layers of this configuration only
+                self.configFilePaths = []
+                self.config_deps = []
+                self.layer_timings = []
+                self._layer_scope = {}
+                try:
+                    self._resolve(program_description, add_param_args, add_default_logging, additional_args)
+                finally:
+                    self._layer_scope = None
+                    inputs = self.stopInputTracking() if cache_key is not None else None
+
+                if cache_key is not None and not self.profile_config:
+                    with self._phaseTimer("storeResolvedCache"):
+                        self.storeResolvedCache(cache_key, inputs)
+
+            # print(self.opt)
+            if add_default_logging:
+                with self._phaseTimer("createDefaultLogger"):
+                    self.createDefaultLogger()
+
+        if self.profile_config:
+            print(self.getConfigProfileReport())
+
+        if getattr(self.args, "dump_resolved", None):
+            # archiving the parameters is a side job, the program runs anyway
+            try:
+                self.dumpResolvedParams(self.args.dump_resolved)
+            except Exception as e:
+                print(f"ERROR: could not write the resolved parameters to {self.args.dump_resolved}: {e!r}")
+
+        self.init_timings["config_files"] = self.getConfigFilePaths()
+        self.init_timings["phase_starts"] = {phase: start - init_timer.start
+                                             for phase, start in self.init_timings["phase_starts"].items()}
+        if self.print_timings or getattr(self.args, "cm_timings", None):
+            print(self.getTimingReport())
+        if self.timing_hook is not None:
+            self.timing_hook(self.init_timings)
+
+    async def initAsync(self, program_description=None, config_files=(), argv=(), executor=None, **kwargs):
+        """
+        init() for asyncio programs.  The config files are read and evaluated in threads of executor, all of them
+        at once (asyncio.gather), then init() runs in the executor and applies them in order, so the event loop
+        keeps running the whole time.  Unlike init(), the command line is only parsed when it is passed in:
+
+        p = ConfigMaster()
+        p.setDefaultParams(defaultParams)
+        await p.initAsync(__doc__, config_files=["site.py", "run.py"], argv=sys.argv[1:])
+
+        :param list config_files: config files to apply, in this order, before any -c in argv
+        :param list argv: command line to parse (default: nothing, sys.argv is not looked at)
+        :param executor: concurrent.futures executor for the blocking work (default: the loop's default executor)
+        :param kwargs: the other arguments of init()
+        :return: self
+        """
+        argv = [token for path in config_files for token in ("-c", path)] + list(argv)
+        if not (kwargs.get("resolved_cache") or self.resolvedCacheEnabled() or
+                "--cm-profile-config" in _cm_options_in_argv(argv)):
+            await self._prefetchLayers(self._configFilesInArgv(argv), executor)
+
+        import asyncio
+        import functools
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                executor, functools.partial(self.init, program_description, argv=argv, **kwargs))
+        finally:
+            self._prefetched_layers = {}
+        return self
+
+    @staticmethod
+    def _configFilesInArgv(argv):
+        paths = []
+        tokens = iter(argv)
+        for token in tokens:
+            if token == "--":
+                break
+            if token in ("-c", "--config"):
+                paths.append(next(tokens, None))
+            elif token.startswith("--config="):
+                paths.append(token[len("--config="):])
+            elif token.startswith("-c") and not token.startswith("--"):
+                paths.append(token[2:])
+        return [path for path in paths if path]
+
+    async def _prefetchLayers(self, paths, executor):
+        """
+        Evaluate the config layers in paths concurrently in executor threads, and keep them for the load that
+        applies them (see _prefetched_layers), so none is evaluated twice.  Errors are left for that load to
+        report.
+        """
+        import asyncio
+
+        if self.profile_config or len(paths) == 0:
+            return
+        paths = list(dict.fromkeys(paths))
+        loop = asyncio.get_running_loop()
+        layers = await asyncio.gather(*(loop.run_in_executor(executor, self._prefetchLayer, path) for path in paths),
+                                      return_exceptions=True)
+        for path, layer in zip(paths, layers):
+            if not isinstance(layer, BaseException):
+                self._prefetched_layers[path if _is_url(path) else os.path.abspath(path)] = layer
+
+    def _prefetchLayer(self, cfp):
+        deps = []
+        timings = []
+        cf = self.loadConfigLayer(cfp, _deps=deps, _timings=timings)
+        return cf, deps, timings
+
+    def _resolve(self, program_description, add_param_args, add_default_logging, additional_args):
+        """
+        Evaluate the defaults, build the parser, parse the cmd line (and config files) and apply _config_override
+        """
+
         #print("initial params")
         #self.printParams()
-        self.assignDefaultParams()
+        with self._phaseTimer("assignDefaultParams"):
+            self.assignDefaultParams()
 
         #print("after default assigned")
         #self.printParams()
-        self.parser = argparse.ArgumentParser(description=program_description,
-                                              formatter_class=argparse.RawDescriptionHelpFormatter)
+        with self._phaseTimer("buildParser"):
+            self.parser = make_ArgumentParser(program_description)
 
         # add possible arguments to the parser
-        self.addParseArgs(add_param_args=add_param_args, add_default_logging=add_default_logging,
-                          additional_args=additional_args)
+        with self._phaseTimer("addParseArgs"):
+            self.addParseArgs(add_param_args=add_param_args, add_default_logging=add_default_logging,
+                              additional_args=additional_args)
 
         # parse the cmd line and add to opt dictionary
-        self.handleArgParse()
+        with self._phaseTimer("handleArgParse"):
+            self.handleArgParse()
         #print("after arg parse")
         #self.printParams()
 
         # print(f" aco = {self.allow_config_override}")
         if self.allow_config_override:
-            self.doConfigOverride()
-            self.handleArgParse()
+            with self._phaseTimer("doConfigOverride"):
+                self.doConfigOverride()
+            with self._phaseTimer("reapplyArgParse"):
+                self.handleArgParse()
+
+        with self._phaseTimer("evaluateDeferred"):
+            _evaluate_deferred(self.opt)
+
+        if self.validate_params:
+            with self._phaseTimer("validateParams"):
+                errors = self.validateParams()
+            if errors:
+                print("\nERROR: Invalid parameter values:\n  " + "\n  ".join(errors) + "\n")
+                exit(1)
 
         #print("after config override")
         #self.printParams()
 
+    def _phaseTimer(self, name):
+        # times a phase of init(), see init_timings
+        return _PhaseTimer(self.init_timings["phases"], name, self.init_timings["phase_starts"])
 
-        # print(self.opt)
-        if add_default_logging:
-            self.createDefaultLogger()
+    def getTimingReport(self):
+        """
+        The phase timings of init() as text, see init_timings.
+        """
+        lines = [f"ConfigMaster init timings ({self.init_timings['total'] * 1000.0:.3f} ms total"
+                 f"{', resolved cache hit' if self.init_timings['resolved_cache_hit'] else ''}):"]
+        phases = self.init_timings["phases"]
+        starts = self.init_timings["phase_starts"]
+        # in the order they started, a phase that started while another one ran (config files are loaded by
+        # argparse, so handleConfigFile is part of handleArgParse) is indented below it
+        order = sorted(phases, key=lambda phase: starts.get(phase, 0.0))
+        for phase in order:
+            start = starts.get(phase, 0.0)
+            depth = sum(1 for other in order if other != phase and
+                        starts.get(other, 0.0) <= start < starts.get(other, 0.0) + phases[other])
+            lines.append(f"{'  ' * (depth + 1)}{phase:24s} {phases[phase] * 1000.0:10.3f} ms")
+        return "\n".join(lines)
+
+    def resolvedCacheEnabled(self):
+        if os.environ.get("CONFIGMASTER_NO_CACHE", "") not in ("", "0"):
+            return False
+        return self.use_resolved_cache or os.environ.get("CONFIGMASTER_RESOLVED_CACHE", "") not in ("", "0")
+
+    def getResolvedCacheStats(self):
+        """
+        Return a copy of the process wide resolved cache counters.
+        """
+        return dict(self.resolved_cache_stats)
+
+    def getResolvedCacheKey(self, *init_args):
+        """
+        Everything, apart from files and environment variables, that the resolved opt dictionary depends on.
+        """
+        return repr((self.version, sys.version, type(self).__name__, self.defaultParams, os.getcwd(),
+                     os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else "",
+                     sys.argv[1:] if self.argv is None else self.argv,
+                     self.allow_extra_parameters, self.allow_config_override, self.config_override_dict_name,
+                     init_args))
+
+    def getResolvedCacheFile(self, cache_key):
+        import zlib
+        name = "%08x%08x" % (zlib.crc32(cache_key.encode("utf-8", "surrogateescape")),
+                             zlib.adler32(cache_key.encode("utf-8", "surrogateescape")))
+        return os.path.join(self.getCacheDir(), "resolved", name + self.resolved_cache_suffix)
+
+    def startInputTracking(self):
+        """
+        Start recording the config files, environment variables and time functions that resolving reads.
+        """
+        self._resolved_inputs = {"files": {}, "env": {}, "time": False}
+        _track_environ(self._resolved_inputs["env"])
+        self._saved_profile = sys.getprofile()
+        inputs = self._resolved_inputs
+
+        def time_profiler(frame, event, arg):
+            if event == "c_call":
+                owner = getattr(getattr(arg, "__self__", None), "__name__", None)
+                if owner in _TIME_FUNCTIONS and arg.__name__ in _TIME_FUNCTIONS[owner]:
+                    inputs["time"] = True
+
+        sys.setprofile(time_profiler)
+
+    def stopInputTracking(self):
+        sys.setprofile(self._saved_profile)
+        _untrack_environ()
+        inputs = self._resolved_inputs
+        self._resolved_inputs = None
+        inputs["env"] = _environ_inputs(inputs["env"])
+        return inputs
+
+    def _recordInputFile(self, path, content):
+        import hashlib
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        if _is_url(path):
+            self._resolved_inputs["files"][path] = _content_signature(content.encode("utf-8")) + (digest,)
+            return
+        st = os.stat(path)
+        self._resolved_inputs["files"][os.path.abspath(path)] = (st.st_mtime_ns, st.st_size, digest)
+
+    def _inputsUnchanged(self, inputs):
+        if not _environ_unchanged(inputs["env"]):
+            return False
+
+        for path, (mtime_ns, size, digest) in inputs["files"].items():
+            if _is_url(path):
+                # the signature of a fetched source is taken from its contents
+                if self._fileSignature(path) != (mtime_ns, size):
+                    return False
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                return False
+            if (st.st_mtime_ns, st.st_size) == (mtime_ns, size):
+                continue
+            # touched but maybe not changed, compare contents
+            import hashlib
+            with open(path, 'r') as fh:
+                if hashlib.sha256(fh.read().encode()).hexdigest() != digest:
+                    return False
+        return True
+
+    def _plainOverrides(self, overrides=None):
+        """
+        Copy the nested _config_override defaultdicts into plain dicts (which can be marshalled and pickled).
+        """
+        if overrides is None:
+            overrides = self.opt.get(self.config_override_dict_name, {})
+        return {p1: {t1: dict(p2s) for t1, p2s in targets.items()} for p1, targets in overrides.items()}
+
+    def loadResolvedCache(self, cache_key):
+        """
+        Load a previously resolved opt dictionary, if none of its inputs changed.
+        :return: True on a cache hit
+        """
+        import marshal
+        cache_file = self.getResolvedCacheFile(cache_key)
+        try:
+            with open(cache_file, "rb") as fh:
+                data = fh.read()
+            if data[:1] == b"m":
+                entry = marshal.loads(data[1:])
+            else:
+                import pickle
+                entry = pickle.loads(data[1:])
+        except FileNotFoundError:
+            entry = None
+        except Exception:
+            self._count(self.resolved_cache_stats, "errors")
+            entry = None
+
+        # (entries written by earlier versions of the format lack the schema, or keep the contents in deps)
+        if entry is None or entry.get("key") != cache_key or "schema" not in entry or "deps" not in entry or \
+                not self._inputsUnchanged(entry["inputs"]):
+            self._count(self.resolved_cache_stats, "misses")
+            self.debug("resolved cache miss")
+            return False
+        schema = {}
+        if entry["schema"]:
+            import pickle
+            try:
+                schema = pickle.loads(entry["schema"])
+            except Exception:
+                self._count(self.resolved_cache_stats, "errors")
+                return False
+
+        self.opt = entry["opt"]
+        self.base_opt = entry["base_opt"]
+        self.default_opt = entry["default_opt"]
+        self.args = _CmdLineArgs(self.default_opt, **entry["args"])
+        self.configFilePath = entry["configFilePath"]
+        self.configFilePaths = entry["configFilePaths"]
+        self.config_deps = entry["deps"]
+        # the defaults were not run, so their _config_schema has to come from the cache too, for reloadConfig()
+        self.setSchema(schema)
+        self._count(self.resolved_cache_stats, "hits")
+        self.debug(f"resolved cache hit: {cache_file}")
+        return True
+
+    def storeResolvedCache(self, cache_key, inputs):
+        if inputs["time"]:
+            # the result depends on when we ran, don't reuse it
+            self._count(self.resolved_cache_stats, "uncacheable")
+            self.debug("resolved configuration called a time function, not caching it")
+            return
+
+        opt = dict(self.opt)
+        if self.config_override_dict_name in opt:
+            opt[self.config_override_dict_name] = self._plainOverrides()
+        base_opt = dict(self.base_opt)
+        if self.config_override_dict_name in base_opt:
+            base_opt[self.config_override_dict_name] = self._plainOverrides()
+        schema = b""
+        if self.param_schema:
+            # schemas hold types, which marshal can't store
+            import pickle
+            try:
+                schema = pickle.dumps(self.param_schema, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                self._count(self.resolved_cache_stats, "uncacheable")
+                self.debug("_config_schema can not be pickled, not caching the resolved configuration")
+                return
+        entry = {"key": cache_key, "inputs": inputs, "opt": opt, "base_opt": base_opt, "default_opt": self.default_opt,
+                 "args": dict(vars(self.args)), "configFilePath": self.configFilePath,
+                 "configFilePaths": self.configFilePaths, "deps": self.config_deps, "schema": schema}
+        try:
+            import marshal
+            data = b"m" + marshal.dumps(entry)
+        except ValueError:
+            import pickle
+            try:
+                data = b"p" + pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception as e:
+                self._count(self.resolved_cache_stats, "uncacheable")
+                self.debug(f"resolved configuration can not be pickled, not caching it: {e}")
+                return
+
+        cache_file = self.getResolvedCacheFile(cache_key)
+        try:
+            import tempfile
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cache_file), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as tfh:
+                    tfh.write(data)
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._count(self.resolved_cache_stats, "stores")
+        except OSError:
+            self._count(self.resolved_cache_stats, "errors")
+
+    def setSchema(self, schema):
+        """
+        Set the parameter schemas checked by validateParams(), see _compile_schema() for what an entry can hold.
+        Usually they come from the _config_schema table of the defaults:
+
+        forecastHour = 6
+        _config_schema["forecastHour"] = {"type": int, "min": 0, "max": 384}
+        thresholds = [0.5, 1.0]
+        _config_schema["thresholds"] = {"type": [float], "min": 0}
+
+        :param dict schema: parameter name -> schema entry
+        """
+        if not isinstance(schema, dict):
+            raise TypeError(f"{self.config_schema_dict_name} must be a dict, not {type(schema).__name__}")
+        if not self.allow_extra_parameters:
+            for name in schema:
+                if name not in self.opt:
+                    raise ValueError(f"{self.config_schema_dict_name}[{name!r}]: there is no parameter {name}")
+        self._schema_validator = _compile_schema(schema)
+        self.param_schema = dict(schema)
+
+    def validateParams(self, opt=None):
+        """
+        Check parameter values against their schemas (see setSchema()).
+        :param dict opt: the parameters to check, default the resolved parameters (e.g. the result of sweep())
+        :return: list of messages, one for each problem found, empty if all values are fine
+        """
+        if self._schema_validator is None:
+            return []
+        return self._schema_validator(self.opt if opt is None else opt, [])
 
     def doConfigOverride(self):
         #print("t")
         # _config_override["model"]["GFS5"]["min_expected_filesize"] = 160e+6  # 160M
+        # _config_override["model", "site"]["GFS5", "boulder"]["min_expected_filesize"] = 170e+6
 
         # self.debug("doConfigOverride")
-        for param1 in self.opt[self.config_override_dict_name]:
-            self.debug(f"Using {param1} for overriding")
-            for param1_target in self.opt[self.config_override_dict_name][param1]:
-                self.debug(f"If user sets {param1} to {param1_target} on the cmd line")
-                for param2 in self.opt[self.config_override_dict_name][param1][param1_target]:
-                    param2_target = self.opt[self.config_override_dict_name][param1][param1_target][param2]
-                    self.debug(f"If user sets {param1} to {param1_target} (on the cmd line), then {param2} gets set to {param2_target}")
-                    if getattr(self.args, param1) == param1_target:
-                        self.opt[param2] = param2_target
-                        self.debug(f"overriding {param2} with {param2_target} ({self.config_override_dict_name})")
+        self.override_index = _compile_overrides(self.opt[self.config_override_dict_name])
+        values = self.getCmdLineValues()
+        fired, conflicts = _apply_overrides(self.override_index, values, self.opt)
+
+        self.override_trace = [(dict(conditions), assignments) for _, conditions, assignments in fired]
+        for conditions, assignments in self.override_trace:
+            self.debug(f"{self.config_override_dict_name}: {self._describeConditions(conditions)} (on the cmd line), "
+                       f"so overriding {assignments}")
+        for target, rule1, rule2 in conflicts:
+            print(f"WARNING: conflicting {self.config_override_dict_name} rules for {target}: "
+                  f"{self._describeConditions(dict(rule1[1]))} sets {rule1[2][target]!r}, "
+                  f"{self._describeConditions(dict(rule2[1]))} sets {rule2[2][target]!r}.  Using {rule2[2][target]!r}")
+        self.override_conflicts = conflicts
+
+    @staticmethod
+    def _describeConditions(conditions):
+        return " and ".join(f"{param} == {value!r}" for param, value in conditions.items())
+
+    def getOverrideIndex(self):
+        """
+        The compiled _config_override rules, see _compile_overrides().
+        """
+        if self.override_index is None:
+            self.override_index = _compile_overrides(self.opt.get(self.config_override_dict_name, {}))
+        return self.override_index
+
+    def getOverrideTrace(self):
+        """
+        The _config_override rules that fired during init(), in the order they were applied, as a list of
+        (conditions, assignments) tuples, e.g. ({"model": "GFS4"}, {"expected_file_size": 15e+7})
+        """
+        return list(self.override_trace)
+
+    def snapshot(self):
+        """
+        The current parameter dictionary.  reloadConfig() replaces the whole dictionary instead of changing it, so
+        use this to read several parameters that must come from the same version of the configuration.
+        Don't modify it.
+        """
+        return self.opt
+
+    def publishSnapshot(self, name=None):
+        """
+        Publish the current parameters in shared memory, for worker processes to read with
+        ConfigMaster.attachSnapshot(name) instead of getting them pickled with every task.  Call it again after a
+        reload to publish the new version under the same name, workers see it with SharedParams.refresh().
+        Parameters that can not be pickled are left out (with a warning).  The memory is released by
+        unpublishSnapshot(), or at exit.
+        :param str name: Name of the snapshot, generated the first time by default
+        :return: the name workers attach to
+        """
+        import marshal
+        import pickle
+        import struct
+        from multiprocessing import shared_memory
+
+        with self._reload_lock:
+            opt = self.snapshot()
+            if name is None:
+                name = self._snapshot_name or f"cm{os.getpid()}_{id(self):x}"
+            if self._snapshot_name is not None and name != self._snapshot_name:
+                self.unpublishSnapshot()
+
+            # the values and their out of band buffers (pickle protocol 5), 64 byte aligned for numpy
+            pieces = []
+            index = {}
+            for key, value in opt.items():
+                if key == self.config_override_dict_name:
+                    continue
+                buffers = []
+                try:
+                    data = pickle.dumps(value, protocol=5, buffer_callback=buffers.append)
+                except Exception as e:
+                    print(f"WARNING: {key} can not be pickled, it is not in the shared snapshot: {e}")
+                    continue
+                index[key] = (len(pieces), [b.raw() for b in buffers])
+                pieces.append(data)
+
+            layout = {}
+            offset = 0
+            for key, (piece, raws) in index.items():
+                spans = []
+                for raw in raws:
+                    offset = (offset + 63) & ~63
+                    spans.append((offset, raw.nbytes))
+                    offset += raw.nbytes
+                layout[key] = (offset, len(pieces[piece]), spans)
+                offset += len(pieces[piece])
+            # offsets are relative to the data, make them absolute once the size of the index is known
+            index_size = len(marshal.dumps({k: (2 ** 63, v[1], [(2 ** 63, n) for _, n in v[2]])
+                                            for k, v in layout.items()}))
+            start = (_SNAPSHOT_HEADER + index_size + 63) & ~63
+            layout = {k: (start + o, n, [(start + bo, bn) for bo, bn in spans]) for k, (o, n, spans) in layout.items()}
+            index_data = marshal.dumps(layout)
+
+            version = self._snapshot_version + 1
+            block = shared_memory.SharedMemory(f"{name}_{version}", create=True, size=max(start + offset, 1))
+            struct.pack_into("8sQQ", block.buf, 0, _SNAPSHOT_MAGIC, version, len(index_data))
+            block.buf[_SNAPSHOT_HEADER:_SNAPSHOT_HEADER + len(index_data)] = index_data
+            for key, (piece, raws) in index.items():
+                offset, size, spans = layout[key]
+                block.buf[offset:offset + size] = pieces[piece]
+                for (buffer_offset, buffer_size), raw in zip(spans, raws):
+                    block.buf[buffer_offset:buffer_offset + buffer_size] = raw.cast("B")
+
+            if self._snapshot_pointer is None:
+                self._snapshot_pointer = shared_memory.SharedMemory(name, create=True, size=16)
+                _published_snapshot_blocks.add(name)
+                import atexit
+                atexit.register(self.unpublishSnapshot)
+            _published_snapshot_blocks.add(block.name)
+            # workers that attached to an old version keep their mapping after it is unlinked, and the previous
+            # version stays, for workers that read the pointer just before it changed
+            struct.pack_into("8sQ", self._snapshot_pointer.buf, 0, _SNAPSHOT_MAGIC, version)
+            for old in self._snapshot_blocks[:-1]:
+                old.close()
+                old.unlink()
+                _published_snapshot_blocks.discard(old.name)
+            self._snapshot_blocks = self._snapshot_blocks[-1:] + [block]
+            self._snapshot_name = name
+            self._snapshot_version = version
+        return name
+
+    def unpublishSnapshot(self):
+        """
+        Release the shared memory of publishSnapshot().  Workers that are attached can still read it.
+        """
+        for block in self._snapshot_blocks + ([self._snapshot_pointer] if self._snapshot_pointer else []):
+            block.close()
+            try:
+                block.unlink()
+            except FileNotFoundError:
+                pass
+            _published_snapshot_blocks.discard(block.name)
+        self._snapshot_blocks = []
+        self._snapshot_pointer = None
+        self._snapshot_name = None
+
+    @staticmethod
+    def attachSnapshot(name):
+        """
+        Attach to parameters published with publishSnapshot(), e.g. in a worker process.
+        :return: a read-only SharedParams mapping
+        """
+        return SharedParams(name)
+
+    def addReloadCallback(self, callback):
+        """
+        Call callback(cm, changed) after a reload changed parameters.  changed maps each changed parameter name to
+        an (old value, new value) tuple (a missing value is None).
+        """
+        self.reload_callbacks.append(callback)
+
+    def getReloadMetrics(self):
+        """
+        Counters and timings of the config file watcher: number of polls and total/last time spent polling,
+        number of reloads and failed reloads, the time the last reload took, and its latency (from the file's
+        modification time until the new values were in place).
+        """
+        with self._metrics_lock:
+            return dict(self.reload_metrics)
+
+    def configFilesChanged(self):
+        """
+        Stat every config file (and included layer) that was loaded, and return True if any of them changed.
+        """
+        import time
+        start = time.perf_counter()
+        changed = any(self._fileSignature(path) != (mtime_ns, size) for path, mtime_ns, size in self.config_deps)
+        elapsed = time.perf_counter() - start
+        with self._metrics_lock:
+            self.reload_metrics["polls"] += 1
+            self.reload_metrics["poll_seconds"] += elapsed
+            self.reload_metrics["last_poll_seconds"] = elapsed
+        return changed
+
+    def reloadConfig(self):
+        """
+        Re-evaluate the config files and swap in the new parameters.
+
+        The new values are resolved the same way init() did (defaults, config files, _config_override, command
+        line) into a new dictionary, which then replaces opt in one step, so readers never see a half-applied
+        configuration.  With use_layer_cache, layers that did not change come from the layer cache.  Values that
+        were added after init() (e.g. p["_newDir"] = ...) are kept.  If the config files can't be loaded, the old
+        parameters stay in place.
+
+        :return: dict of changed parameters, name -> (old value, new value)
+        """
+        changed = self._reload()
+        self._runReloadCallbacks(changed)
+        return changed
+
+    async def reloadConfigAsync(self, executor=None):
+        """
+        reloadConfig() for asyncio programs: the config files are read and evaluated concurrently in threads of
+        executor, and the new parameters are resolved there too, then swapped in in one step.  The reload callbacks
+        run on the event loop.
+        :param executor: concurrent.futures executor for the blocking work (default: the loop's default executor)
+        :return: dict of changed parameters, name -> (old value, new value)
+        """
+        import asyncio
+
+        await self._prefetchLayers(self.getConfigFilePaths(), executor)
+        try:
+            changed = await asyncio.get_running_loop().run_in_executor(executor, self._reload)
+        finally:
+            self._prefetched_layers = {}
+        self._runReloadCallbacks(changed)
+        return changed
+
+    def _reload(self):
+        # reloadConfig() without the callbacks
+        import time
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                opt = dict(self.default_opt)
+                if self.config_override_dict_name in opt:
+                    opt[self.config_override_dict_name] = self._plainOverrides(opt[self.config_override_dict_name])
+                deps = []
+                self._layer_scope = {}
+                self.layer_timings = []
+                try:
+                    for cfp in self.configFilePaths:
+                        print(f"reloading configuration from {cfp}")
+                        self.applyConfigLayer(opt, self.loadConfigLayer(cfp, _deps=deps), cfp)
+                finally:
+                    self._layer_scope = None
+            except (Exception, SystemExit) as e:
+                with self._metrics_lock:
+                    self.reload_metrics["reload_errors"] += 1
+                print(f"WARNING: could not reload configuration, keeping the current values: {e!r}")
+                # don't retry until one of the files changes again
+                self.config_deps = [(path,) + (self._fileSignature(path) or (None, None))
+                                    for path, _, _ in self.config_deps]
+                return {}
+
+            base_opt = dict(opt)
+            override_index = _compile_overrides(opt.pop(self.config_override_dict_name, {})) \
+                if self.allow_config_override else {}
+            cmd_values = self.getCmdLineValues()
+            new_opt = _resolve_overrides(opt, override_index, cmd_values, True, {})
+            errors = self.validateParams(new_opt) if self.validate_params else []
+            if errors:
+                with self._metrics_lock:
+                    self.reload_metrics["reload_errors"] += 1
+                print("WARNING: could not reload configuration, keeping the current values.  Invalid parameter "
+                      "values:\n  " + "\n  ".join(errors))
+                self.config_deps = [(path,) + (self._fileSignature(path) or (None, None))
+                                    for path, _, _ in self.config_deps]
+                return {}
+            if self.config_override_dict_name in base_opt:
+                new_opt[self.config_override_dict_name] = base_opt[self.config_override_dict_name]
+
+            old_opt = self.opt
+            for key, value in old_opt.items():
+                if key not in new_opt and key not in base_opt:
+                    new_opt[key] = value
+            changed = {key: (old_opt.get(key), new_opt.get(key)) for key in set(old_opt) | set(new_opt)
+                       if key != self.config_override_dict_name and
+                       (key not in old_opt or key not in new_opt or old_opt[key] != new_opt[key])}
+
+            self.base_opt = base_opt
+            self.config_deps = deps
+            if self.allow_config_override:
+                self.override_index = override_index
+            self.opt = new_opt
+
+            now = time.time()
+            newest = max((mtime_ns for path, mtime_ns, _ in deps if not _is_url(path)), default=None)
+            with self._metrics_lock:
+                self.reload_metrics["reloads"] += 1
+                self.reload_metrics["last_reload_seconds"] = time.perf_counter() - start
+                if newest is not None:
+                    self.reload_metrics["last_reload_latency_seconds"] = max(0.0, now - newest / 1e9)
+
+        return changed
+
+    def _runReloadCallbacks(self, changed):
+        if changed:
+            self.debug(f"reload changed {sorted(changed)}")
+            for callback in list(self.reload_callbacks):
+                try:
+                    callback(self, changed)
+                except Exception as e:
+                    print(f"WARNING: reload callback {callback!r} failed: {e!r}")
+
+    def checkConfigFiles(self):
+        """
+        Reload the config files if any of them changed on disk, once they stopped changing (see
+        reload_settle_seconds).
+        :return: dict of changed parameters (empty if nothing changed)
+        """
+        if not self.configFilesChanged():
+            return {}
+        import time
+        # an editor or a copy may still be writing: wait until the size and mtime of the files hold still
+        paths = [path for path, _, _ in self.config_deps if not _is_url(path)]
+        signatures = [self._fileSignature(path) for path in paths]
+        for _ in range(self.reload_settle_tries):
+            time.sleep(self.reload_settle_seconds)
+            latest = [self._fileSignature(path) for path in paths]
+            if latest == signatures:
+                return self.reloadConfig()
+            signatures = latest
+        self.debug("config files are still changing, not reloading yet")
+        return {}
+
+    def watchConfigFiles(self, callback=None, interval=1.0, use_inotify=True):
+        """
+        Start a background thread that reloads the config files when they change.
+
+        The files are checked with os.stat() every interval seconds.  On Linux, inotify (when available) wakes the
+        watcher as soon as a file in one of the config directories is written, so changes are picked up without
+        waiting for the next poll.
+
+        :param callback: optional reload callback, see addReloadCallback()
+        :param float interval: seconds between stat polls
+        :param bool use_inotify: use inotify on Linux when it is available
+        """
+        if not self.config_deps:
+            raise RuntimeError("no config file to watch, pass one with -c")
+        if callback is not None:
+            self.addReloadCallback(callback)
+        if self._watcher is not None:
+            return
+
+        import threading
+        stop = threading.Event()
+        inotify = _Inotify.create() if use_inotify else None
+        with self._metrics_lock:
+            self.reload_metrics["inotify"] = inotify is not None
+
+        def watch():
+            watched_dirs = set()
+            try:
+                while not stop.is_set():
+                    if inotify is not None:
+                        dirs = {os.path.dirname(path) for path, _, _ in self.config_deps if not _is_url(path)}
+                        for d in dirs - watched_dirs:
+                            inotify.add_watch(d)
+                        watched_dirs |= dirs
+                        inotify.wait(interval)
+                    else:
+                        stop.wait(interval)
+                    if not stop.is_set():
+                        self.checkConfigFiles()
+            finally:
+                if inotify is not None:
+                    inotify.close()
+
+        self._watcher = (threading.Thread(target=watch, name="ConfigMaster-watcher", daemon=True), stop)
+        self._watcher[0].start()
+
+    def stopWatching(self):
+        """
+        Stop the thread started by watchConfigFiles().
+        """
+        if self._watcher is not None:
+            thread, stop = self._watcher
+            self._watcher = None
+            stop.set()
+            thread.join()
+
+    def resolveOverrides(self, overrides):
+        """
+        Return the parameters this ConfigMaster would have resolved if the values in overrides had been given
+        on the command line (in addition to the real command line), including any _config_override rules they
+        trigger.  The ConfigMaster itself is not changed.
+        :param dict overrides: parameter name -> value
+        :return: dict of resolved parameters (without the _config_override table)
+        """
+        return _resolve_overrides(*self._sweepState(), overrides)
+
+    def _sweepState(self):
+        if self.base_opt is None:
+            raise RuntimeError("init() must be called before resolving overrides")
+        base = dict(self.base_opt)
+        base.pop(self.config_override_dict_name, None)
+        cmd_values = self.getCmdLineValues()
+        override_index = self.getOverrideIndex() if self.allow_config_override else {}
+        return base, override_index, cmd_values, self.allow_extra_parameters
+
+    def sweep(self, grid=None, override_sets=None, processes=None):
+        """
+        Resolve the parameters for many sets of overrides, e.g. every model x forecastHour combination of an
+        ensemble, without going through init() and argparse for each one.
+
+        Each member is resolved like resolveOverrides(): its values act as command line values, so the
+        _config_override rules they trigger are applied.  Members are expanded lazily, and results are yielded
+        in member order as they are needed.
+
+        p.sweep(grid={"model": ["GFS4", "GFS5"], "forecastHour": range(0, 48, 6)})
+        p.sweep(override_sets=[{"model": "GFS4"}, {"model": "GFS5", "region": "conus"}], processes=8)
+
+        :param dict grid: parameter name -> list of values.  Every combination is a member.
+        :param override_sets: iterable of dicts, one per member.  Use instead of grid.
+        :param int processes: resolve in a pool of this many processes.  The parameters must be picklable.
+        :return: generator of resolved parameter dicts (without the _config_override table)
+        """
+        # the arguments are checked here, not when the first member is asked for
+        if (grid is None) == (override_sets is None):
+            raise ValueError("sweep() needs exactly one of grid or override_sets")
+        if processes is not None and (type(processes) is not int or processes < 0):
+            raise ValueError(f"processes must be a number of processes, not {processes!r}")
+        state = self._sweepState()
+
+        if grid is not None:
+            import itertools
+            names = list(grid)
+            if not self.allow_extra_parameters:
+                for name in names:
+                    if name not in state[0]:
+                        raise KeyError(f"Invalid parameter in overrides: {name}")
+            override_sets = (dict(zip(names, values)) for values in itertools.product(*grid.values()))
+        else:
+            override_sets = iter(override_sets)
+        return self._sweep(override_sets, state, processes)
+
+    @staticmethod
+    def _sweep(override_sets, state, processes):
+        # sweep() after the arguments are checked
+        if not processes:
+            for overrides in override_sets:
+                yield _resolve_overrides(*state, overrides)
+            return
+
+        import collections
+        import concurrent.futures
+        # the base state is sent to each worker once, and only a bounded number of members are in flight, so
+        # huge (or endless) sweeps are not expanded up front
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_sweep_worker_init,
+                                                    initargs=state) as pool:
+            pending = collections.deque()
+            for overrides in override_sets:
+                pending.append(pool.submit(_sweep_worker, overrides))
+                if len(pending) >= processes * 4:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
     def createDefaultLogger(self):
 
         import logging
-        # Add custom verbose logging level
-        logging.VERBOSE = 5
-        logging.addLevelName(logging.VERBOSE, "VERBOSE")
-        logging.Logger.verbose = lambda inst, msg, *args, **kwargs: inst.log(logging.VERBOSE, msg, *args, **kwargs)
-        logging.verbose = lambda msg, *args, **kwargs: logging.log(logging.VERBOSE, msg, *args, **kwargs)
+        # Add custom verbose logging level.  Only patch the logging module once per process.
+        if not hasattr(logging, "VERBOSE"):
+            logging.VERBOSE = 5
+            logging.addLevelName(logging.VERBOSE, "VERBOSE")
+            # logging.Logger.verbose = lambda inst, msg, *args, **kwargs: inst.log(logging.VERBOSE, msg, *args, **kwargs)
+            # logging.verbose = lambda msg, *args, **kwargs: logging.log(logging.VERBOSE, msg, *args, **kwargs)
+            logging.Logger.verbose = _logger_verbose
+            logging.verbose = _logging_verbose
 
         numeric_level = getattr(logging, self.opt["debugLevel"].upper(), None)
 
@@ -297,12 +3340,80 @@ class ConfigMaster:
 
         if self.opt["logPath"] == "-":
             print("Logging to stdout")
-            logging.basicConfig(format="[%(levelname)-8s] [%(asctime)s] -- %(message)s",
-                                level=numeric_level, datefmt='%Y%d%m %H:%M:%S', stream=sys.stdout)
         else:
             print(f"Logging to {self.opt['logPath']}")
-            logging.basicConfig(format="[[[%(levelname)-9s] [%(asctime)s] -- %(message)s", level=numeric_level,
-                                datefmt='%Y%m%d %H:%M:%S', filename=self.opt["logPath"])
+
+        if not (self.async_logging or self.log_buffer_records or self.log_max_bytes):
+            if self.opt["logPath"] == "-":
+                logging.basicConfig(format="[%(levelname)-8s] [%(asctime)s] -- %(message)s",
+                                    level=numeric_level, datefmt='%Y%d%m %H:%M:%S', stream=sys.stdout)
+            else:
+                logging.basicConfig(format="[[[%(levelname)-9s] [%(asctime)s] -- %(message)s", level=numeric_level,
+                                    datefmt='%Y%m%d %H:%M:%S', filename=self.opt["logPath"])
+            return
+
+        # like basicConfig, leave logging alone if it has already been set up
+        if logging.root.handlers:
+            return
+
+        handler = self.createLogHandler()
+        if self.async_logging:
+            import atexit
+            import logging.handlers
+            import queue
+            log_queue = queue.SimpleQueue()
+            self.log_listener = logging.handlers.QueueListener(log_queue, handler)
+            self.log_listener.start()
+            self._log_listener_running = True
+            # runs before logging's own exit handler, which then flushes and closes the handlers
+            atexit.register(self._stopLogListener)
+            # the message is formatted on the calling thread (so later changes to mutable arguments don't show up
+            # in it), only writing it is left to the listener thread
+            handler = logging.handlers.QueueHandler(log_queue)
+        logging.basicConfig(level=numeric_level, handlers=[handler])
+
+    def createLogHandler(self):
+        """
+        The handler the default logger writes to when async_logging, log_buffer_records or log_max_bytes are set:
+        stdout or logPath, rotated at log_max_bytes and buffered for log_buffer_records records.
+        """
+        import logging
+        import logging.handlers
+        if self.opt["logPath"] == "-":
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("[%(levelname)-8s] [%(asctime)s] -- %(message)s",
+                                                  datefmt='%Y%d%m %H:%M:%S'))
+        else:
+            if self.log_max_bytes:
+                handler = logging.handlers.RotatingFileHandler(self.opt["logPath"], maxBytes=self.log_max_bytes,
+                                                               backupCount=self.log_backup_count)
+            else:
+                handler = logging.FileHandler(self.opt["logPath"])
+            handler.setFormatter(logging.Formatter("[[[%(levelname)-9s] [%(asctime)s] -- %(message)s",
+                                                  datefmt='%Y%m%d %H:%M:%S'))
+
+        if self.log_buffer_records:
+            # write the buffer when it is full, for errors, and at exit (logging.shutdown closes it)
+            handler = logging.handlers.MemoryHandler(self.log_buffer_records, flushLevel=logging.ERROR,
+                                                     target=handler)
+        return handler
+
+    def flushLogs(self):
+        """
+        Write out the log records that are still queued (async_logging) or buffered (log_buffer_records).
+        """
+        import logging
+        if self._log_listener_running:
+            # stop() waits for the queue to be empty
+            self.log_listener.stop()
+            self.log_listener.start()
+        for handler in logging.root.handlers + (list(self.log_listener.handlers) if self.log_listener else []):
+            handler.flush()
+
+    def _stopLogListener(self):
+        if self._log_listener_running:
+            self._log_listener_running = False
+            self.log_listener.stop()
 
     def createLogArguments(self):
 
@@ -341,7 +3452,13 @@ class ConfigMaster:
         :return:
         """
         if self.args == None:
-            self.args = self.parser.parse_args()
+            if self._param_arg_defaults is None:
+                self.args = self.parser.parse_args(self.argv)
+            else:
+                # params left out of the parser (see getParamArgsInArgv) were not on the cmd line
+                self.args = self.parser.parse_args(self.argv, _CmdLineArgs(self._param_arg_defaults))
+            # defaults + config files, before any command line values.  Used by sweep()
+            self.base_opt = dict(self.opt)
 
 
         '''
@@ -355,16 +3472,30 @@ class ConfigMaster:
         '''
         # print(f"{ vars(args).keys()}")
         # print(f"{ self.opt}")
-        for o in vars(self.args).keys():
-            if getattr(self.args, o) != None:
-                # print(f"seting {o} to {getattr(self.args,o)} from command line")
-                self.opt[o] = getattr(self.args, o)
+        for o, value in self.getCmdLineValues().items():
+            # print(f"seting {o} to {value} from command line")
+            self.opt[o] = value
+
+    def getCmdLineValues(self):
+        """
+        The parameters that were set on the command line (or have a default there, like debugLevel)
+        """
+        return {k: v for k, v in vars(self.args).items() if v is not None and k not in self.internal_arg_dests}
 
     def addParseArgs(self, add_param_args=True, add_default_logging=True, additional_args=None):
         # parser.add_argument('-c','--config', help="The configuration file.")
-        self.parser.add_argument('-c', '--config', help="The configuration file.", action=make_ConfigAction(self))
+        self.parser.add_argument('-c', '--config', action=make_ConfigAction(self),
+                                 help="The configuration file.  Can be given more than once, later files override "
+                                      "earlier ones.")
         self.parser.add_argument('-p', '--print_params', action=make_PrintParamsAction(self.defaultParams),
                                  nargs=0, help="Generate a default configuration file.")
+        self.parser.add_argument('--dump_resolved', metavar="FILE",
+                                 help="Write the resolved parameters to FILE ('-' for stdout), as JSON for .json "
+                                      "files.")
+        self.parser.add_argument('--cm-profile-config', action="store_true", default=None,
+                                 help="Report the slowest statements of the default params and config files.")
+        self.parser.add_argument('--cm-timings', action="store_true", default=None,
+                                 help="Print how long each step of the ConfigMaster setup took.")
 
         argslist = []
         if add_default_logging:
@@ -376,19 +3507,78 @@ class ConfigMaster:
         self.addAdditionalArguments(argslist)
 
         if add_param_args:
-            self.addAdvancedParseArgs()
+            names = self.getParamArgsInArgv()
+            self.addAdvancedParseArgs(names)
+            if names is not None:
+                # the options of the other params are only needed for error messages
+                self._param_arg_defaults = self.default_opt if self.default_opt is not None else dict(self.opt)
+                self.parser.on_error = lambda message: self._completeParserError(message, add_default_logging,
+                                                                                 additional_args)
+
+    def getParamArgsInArgv(self):
+        """
+        The params named on the command line (--name, --no-name, --name=value), so only their options need
+        to be added to the parser.  Returns None when the full parser is needed: -h, abbreviated or unknown
+        options, or lazy_param_args turned off.
+        """
+        if not self.lazy_param_args:
+            return None
+        known = self.parser.option_dests
+        names = []
+        for token in (sys.argv[1:] if self.argv is None else self.argv):
+            if token == "--":
+                break
+            if known.get(token) == "help":
+                return None
+            if not token.startswith("-") or token == "-" or token in known:
+                continue
+            if token.startswith("--"):
+                name = token[2:].split("=", 1)[0]
+                if "--" + name in known:
+                    continue
+                if _arg_type(self.opt.get(name)) is not None:
+                    names.append(name)
+                    continue
+                if name.startswith("no-") and _arg_type(self.opt.get(name[3:])) is bool:
+                    names.append(name[3:])
+                    continue
+            try:
+                # a negative number given as a value
+                float(token)
+            except ValueError:
+                return None
+        return names
+
+    def _completeParserError(self, message, add_default_logging, additional_args):
+        # report the error with the full parser, so usage and error messages are the same as without
+        # lazy_param_args
+        self.parser = make_ArgumentParser(self.parser.description)
+        self._param_args = set()
+        self.addParseArgs(add_param_args=False, add_default_logging=add_default_logging,
+                          additional_args=additional_args)
+        self.addAdvancedParseArgs(list(self._param_arg_defaults))
+        self.parser.error(message)
 
-    def addAdvancedParseArgs(self):
+    def addAdvancedParseArgs(self, names=None):
+        """
+        Add --name options for the params (all of them, or just names), --name/--no-name for bools.
+        Params that already have their option are skipped.
+        :param names: Only add the options of these params
+        """
         # self.addParseArgs()
 
-        for o in self.opt:
+        for o in (self.opt if names is None else names):
+            if o in self._param_args:
+                continue
+            self._param_args.add(o)
             # print "o is {} {} {}".format(o,self.opt[o],type(self.opt[o]))
             # if o in self.optionsToIgnore:
             #  continue
 
             # print "Type of {} is {}".format(o,type(self.opt[o]))
+            arg_type = _arg_type(self.opt[o])
 
-            if isinstance(self.opt[o], bool):
+            if arg_type is bool:
                 bool_parser = self.parser.add_mutually_exclusive_group(required=False)
                 # print "{} is a bool".format(o)
                 argument = "--" + o
@@ -399,15 +3589,383 @@ class ConfigMaster:
                 action = "store_false"
                 helpString = "Set " + o + " to False"
                 bool_parser.add_argument(argument, action=action, help=helpString, default=None, dest=o)
-            elif isinstance(self.opt[o], (int, float, str)):
+            elif arg_type is not None:
                 # print "working on {}".format(o)
                 argument = "--" + o
                 helpString = "Overide the param file value of " + o
-                self.parser.add_argument(argument, help=helpString, type=type(self.opt[o]))
+                self.parser.add_argument(argument, help=helpString, type=arg_type)
+
+    def freeze(self):
+        """
+        Return an immutable FrozenParams snapshot of the parameters, with attribute access (cfg.forecastHour).
+        Reading an attribute of it is faster than p["forecastHour"], and it uses less memory than a dict.
+        Parameters whose names start with '_' (derived values, like _newDir) stay settable, see FrozenParams.
+        """
+        import keyword
+        names = []
+        values = []
+        derived = {}
+        for key, value in self.opt.items():
+            if key == self.config_override_dict_name:
+                continue
+            if type(value) is _ExternalParam:
+                value = value.load()
+            if key.isidentifier() and not keyword.iskeyword(key) and not key.startswith("_"):
+                names.append(key)
+                values.append(value)
+            else:
+                derived[key] = value
+        return _make_frozen_params(tuple(names), values, derived)
+
+    def trackAccess(self):
+        """
+        Context manager that records which parameters are read with p["name"] in this thread while it is active:
+
+            with p.trackAccess() as reads:
+                run_model()
+            print(reads)    # {"forecastHour": 3, "model": 1}
+
+        Regions can be nested, each records all the reads inside it.  Reads of opt or freeze() are not seen.
+        :return: a context manager giving a dict of parameter name -> number of reads
+        """
+        import contextlib
+
+        @contextlib.contextmanager
+        def region():
+            reads = {}
+            stack = self._access_local.__dict__.setdefault("stack", [])
+            stack.append(reads)
+            with self._access_lock:
+                self._tracking += 1
+            try:
+                yield reads
+            finally:
+                stack.remove(reads)
+                with self._access_lock:
+                    self._tracking -= 1
+
+        return region()
+
+    def countAccess(self, enable=True):
+        """
+        Count the reads of every parameter with p["name"] from now on (all threads), see getAccessCounts().
+        """
+        with self._access_lock:
+            if enable and self.access_counts is None:
+                self.access_counts = {}
+                self._tracking += 1
+            elif not enable and self.access_counts is not None:
+                self.access_counts = None
+                self._tracking -= 1
+
+    def getAccessCounts(self):
+        """
+        The number of reads of each parameter since countAccess() was called, most read first.
+        """
+        with self._access_lock:
+            counts = dict(self.access_counts or {})
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def _recordAccess(self, key):
+        counts = self.access_counts
+        if counts is not None:
+            with self._access_lock:
+                counts[key] = counts.get(key, 0) + 1
+        for reads in getattr(self._access_local, "stack", ()):
+            reads[key] = reads.get(key, 0) + 1
+
+    def fingerprint(self, keys=None):
+        """
+        A hash of the values of the parameters in keys (all of them by default), e.g. the keys recorded by
+        trackAccess().  It does not depend on the order of keys or of dicts and sets in the values, and is the
+        same in every run (and process) with the same values.
+        :return: hex string
+        """
+        import hashlib
+        if keys is None:
+            keys = [k for k in self.opt if k != self.config_override_dict_name]
+        h = hashlib.blake2b(digest_size=16)
+        for key in sorted(keys):
+            h.update(_canonical((key, self.opt.get(key, _MISSING))))
+        return h.hexdigest()
+
+    def memoize(self, func=None, cache=None):
+        """
+        Decorator that caches the results of func by its arguments and the fingerprint of just the parameters it
+        read (with p["name"]) the last time it ran, so changing an unrelated parameter (logPath ...) doesn't
+        invalidate the cached results.
+
+            @p.memoize(cache=shelve.open("products.db"))
+            def make_product(date):
+                ...
+
+        The arguments and parameters have to be values that can be keyed (see _canonical()): an object with the
+        default repr, which has its memory address, raises TypeError instead of silently missing every time.
+        :param cache: Mapping with str keys to keep the results in, e.g. a shelve to keep them between runs.
+                      A dict by default.  The wrapper's .hits and .misses count lookups.
+        """
+        if func is None:
+            import functools
+            return functools.partial(self.memoize, cache=cache)
+
+        import functools
+        import hashlib
+        store = {} if cache is None else cache
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call = f"{name}:{hashlib.blake2b(_canonical((args, kwargs)), digest_size=16).hexdigest()}"
+            keys = store.get(call + ":keys")
+            if keys is not None:
+                try:
+                    result = store[f"{call}:{self.fingerprint(keys)}"]
+                    wrapper.hits += 1
+                    return result
+                except KeyError:
+                    pass
+            wrapper.misses += 1
+            with self.trackAccess() as reads:
+                result = func(*args, **kwargs)
+            keys = sorted(reads)
+            store[call + ":keys"] = keys
+            store[f"{call}:{self.fingerprint(keys)}"] = result
+            return result
+
+        wrapper.cache = store
+        wrapper.hits = 0
+        wrapper.misses = 0
+        return wrapper
 
     def __getitem__(self, key):
-        return self.opt[key]
+        value = self.opt[key]
+        if self._tracking:
+            self._recordAccess(key)
+        if type(value) is _ExternalParam:
+            # mapped on first use, opt keeps the reference so printParams() doesn't print the whole array
+            return value.load()
+        return value
 
     def __setitem__(self, key, value):
-        global opt
         self.opt[key] = value
+
+
+class _RegistryBuild:
+    # a build of a ConfigRegistry entry in progress, that other threads asking for the same key wait for
+    def __init__(self):
+        import threading
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class ConfigRegistry:
+    """
+    Keeps resolved ConfigMasters for many configurations (e.g. one per model and site in a service), built the
+    first time they are asked for and evicted least recently used first:
+
+        registry = ConfigRegistry(defaultParams, max_entries=200, max_bytes=256 * 2**20)
+        p = registry.get(["sites/boulder.py", "models/gfs.py"], overrides={"forecastHour": 12})
+
+    An entry is keyed by the defaults, the config files (paths or URLs) and the overrides.  Threads asking for
+    an entry that is being built wait for that build instead of starting their own.  The ConfigMasters are
+    shared by everyone asking for the same key, so treat them as read-only (or use freeze()).  The overrides
+    act as command line values, like resolveOverrides(), so a reloadConfig() of an entry would drop them: use
+    discardChanged() to rebuild the entries whose config files changed.  The entries share the config layers
+    they have in common (a site base included by every model, say) through a layer cache of the registry, see
+    ConfigMaster.use_layer_cache; pass layer_cache=False to evaluate the layers of every entry anew.
+    """
+
+    def __init__(self, defaultParams=None, max_entries=128, max_bytes=None, program_description="", **init_kwargs):
+        """
+        :param str defaultParams: defaults for get() calls that don't give their own
+        :param int max_entries: entries kept, None for no limit
+        :param int max_bytes: estimated memory of the entries kept (see _estimate_size()), None for no limit.
+                              An entry bigger than this on its own is built and returned, but not kept.
+        :param init_kwargs: passed to ConfigMaster.init(), add_default_logging and add_param_args are False
+                            and layer_cache is True by default
+        """
+        import collections
+        self.defaultParams = defaultParams
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.program_description = program_description
+        self.init_kwargs = dict({"add_default_logging": False, "add_param_args": False, "layer_cache": True},
+                                **init_kwargs)
+        # evaluated config layers shared by the entries, see ConfigMaster._layer_cache
+        self._layer_cache = {}
+        # key -> entry, least recently used first
+        self._entries = collections.OrderedDict()
+        self._building = {}
+        self._lock = _thread.allocate_lock()
+        self._bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "builds": 0, "coalesced": 0, "build_errors": 0, "evictions": 0,
+                      "size_evictions": 0, "oversize": 0, "build_seconds": 0.0}
+
+    def key(self, config_files=(), overrides=None, defaultParams=None):
+        """
+        The key get() files the configuration under.
+        """
+        if isinstance(config_files, str):
+            config_files = (config_files,)
+        files = tuple(f if _is_url(f) else os.path.abspath(f) for f in config_files)
+        dp = self.defaultParams if defaultParams is None else defaultParams
+        if dp is None:
+            raise ValueError("ConfigRegistry needs defaultParams, for the registry or for get()")
+        return dp, files, _canonical(dict(overrides)) if overrides else b""
+
+    def get(self, config_files=(), overrides=None, defaultParams=None):
+        """
+        Return the ConfigMaster for the defaults, config files and overrides, building it if it isn't kept.
+        :param config_files: config file path or URL, or a list of them, applied in order like -c
+        :param dict overrides: parameter name -> value, applied like command line values
+        :param str defaultParams: defaults of this configuration, instead of the registry's
+        """
+        key = self.key(config_files, overrides, defaultParams)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                entry["hits"] += 1
+                return entry["config"]
+            self.stats["misses"] += 1
+            build = self._building.get(key)
+            owner = build is None
+            if owner:
+                build = self._building[key] = _RegistryBuild()
+            else:
+                self.stats["coalesced"] += 1
+
+        if not owner:
+            build.done.wait()
+            if build.error is not None:
+                raise build.error
+            return build.entry["config"]
+
+        try:
+            build.entry = self._build(key, overrides)
+        except BaseException as e:
+            build.error = e
+            with self._lock:
+                self.stats["build_errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                del self._building[key]
+                if build.entry is not None:
+                    self._store(key, build.entry)
+            build.done.set()
+        return build.entry["config"]
+
+    def _build(self, key, overrides):
+        import time
+        dp, files, _ = key
+        start = time.perf_counter()
+        p = ConfigMaster()
+        p._layer_cache = self._layer_cache
+        p.setDefaultParams(dp)
+        argv = []
+        for f in files:
+            argv += ["-c", f]
+        try:
+            p.init(self.program_description, argv=argv, **self.init_kwargs)
+        except SystemExit as e:
+            # init() exits on a bad command line or invalid parameter values, a service has to keep running
+            raise ValueError(f"could not build the configuration for {list(files)} (exit code {e.code})") from None
+        if overrides:
+            try:
+                opt = p.resolveOverrides(overrides)
+            except KeyError as e:
+                raise ValueError(f"invalid overrides for {list(files)}: {e.args[0]}") from None
+            errors = p.validateParams(opt) if p.validate_params else []
+            if errors:
+                raise ValueError(f"invalid overrides for {list(files)}: " + "; ".join(errors))
+            if p.config_override_dict_name in p.opt:
+                opt[p.config_override_dict_name] = p.opt[p.config_override_dict_name]
+            p.opt = opt
+        # the argparse parser is only needed to parse the command line, and would be most of the entry
+        p.parser = None
+        seconds = time.perf_counter() - start
+        # the defaults string and the layer cache are shared by the entries, don't count them against each of them
+        size = _estimate_size(vars(p), {id(dp), id(self._layer_cache)})
+        with self._lock:
+            self.stats["builds"] += 1
+            self.stats["build_seconds"] += seconds
+        return {"config": p, "files": files, "overrides": dict(overrides or {}), "bytes": size, "hits": 0,
+                "build_seconds": seconds}
+
+    def _store(self, key, entry):
+        # called with _lock held
+        if self.max_bytes is not None and entry["bytes"] > self.max_bytes:
+            self.stats["oversize"] += 1
+            return
+        self._entries[key] = entry
+        self._bytes += entry["bytes"]
+        while self.max_entries is not None and len(self._entries) > self.max_entries:
+            self._evict("evictions")
+        while self.max_bytes is not None and self._bytes > self.max_bytes:
+            self._evict("size_evictions")
+
+    def _evict(self, reason):
+        _, entry = self._entries.popitem(last=False)
+        self._bytes -= entry["bytes"]
+        self.stats[reason] += 1
+
+    def discard(self, config_files=(), overrides=None, defaultParams=None):
+        """
+        Drop the entry of a configuration, the next get() builds it again.  Returns True if it was kept.
+        """
+        key = self.key(config_files, overrides, defaultParams)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry["bytes"]
+        return entry is not None
+
+    def discardChanged(self):
+        """
+        Drop the entries whose config files (or the files they include) changed since they were built, see
+        ConfigMaster.configFilesChanged().  Returns the number of entries dropped.
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        changed = [key for key, entry in entries if entry["config"].configFilesChanged()]
+        with self._lock:
+            for key in changed:
+                entry = self._entries.pop(key, None)
+                if entry is not None:
+                    self._bytes -= entry["bytes"]
+        return len(changed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        self._layer_cache.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, config_files):
+        return self.key(config_files) in self._entries
+
+    def getStats(self):
+        """
+        Return the counters (hits, misses, builds, coalesced builds, evictions by count and by size, ...), with
+        the number of entries, their estimated bytes and the hit rate.
+        """
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def getEntryReport(self):
+        """
+        One dict per entry, most recently used first: config files, overrides, estimated bytes, hits and build
+        seconds.
+        """
+        with self._lock:
+            entries = list(self._entries.values())
+        return [{k: v for k, v in entry.items() if k != "config"} for entry in reversed(entries)]
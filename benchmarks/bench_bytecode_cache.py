@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+'''
+Bytecode cache benchmark: time assignDefaultParams() for defaults of several sizes in fresh interpreters, like a
+script launched from cron, with the bytecode cache
+
+  * off        CONFIGMASTER_NO_CACHE=1, every source is compiled
+  * always     bytecode_cache_min_size = 0, every source comes from the (warm) cache
+  * default    the default bytecode_cache_min_size: small sources are compiled, bigger ones come from the cache
+
+The cache only pays off once compiling costs more than looking the entry up (and importing zlib), which is what
+bytecode_cache_min_size is for.  Exits non-zero if the default setting is more than 10% slower than no cache for
+the biggest defaults.
+
+Usage:
+  ./bench_bytecode_cache.py [--runs 9] [--sizes 5 50 200 2000]
+'''
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+
+SNIPPET = r'''
+import json, sys, time
+from ConfigMaster import ConfigMaster
+if sys.argv[2] != "default":
+    ConfigMaster.bytecode_cache_min_size = int(sys.argv[2])
+with open(sys.argv[1]) as fh:
+    source = fh.read()
+p = ConfigMaster()
+p.setDefaultParams(source)
+start = time.perf_counter()
+p.assignDefaultParams()
+print(json.dumps({"seconds": time.perf_counter() - start}))
+'''
+
+MODES = (("off", "default", {"CONFIGMASTER_NO_CACHE": "1"}), ("always", "0", {}), ("default", "default", {}))
+
+
+def make_defaults(num_params):
+    lines = ["import os", 'dataDir = "/data"', 'model = "GFS4"']
+    for i in range(num_params):
+        kind = i % 3
+        if kind == 0:
+            lines.append(f"param{i} = {i}")
+        elif kind == 1:
+            lines.append(f'param{i} = os.path.join(dataDir, model, "p{i}")')
+        else:
+            lines.append(f"param{i} = [{i}, {i * 0.5}, 'v{i}']")
+    lines.append('_config_override["model"]["GFS5"]["dataDir"] = "/data5"')
+    return "\n".join(lines) + "\n"
+
+
+def run(path, min_size, env, cache_dir):
+    full_env = dict(os.environ)
+    full_env["PYTHONPATH"] = REPO + os.pathsep + full_env.get("PYTHONPATH", "")
+    full_env.pop("CONFIGMASTER_NO_CACHE", None)
+    full_env["CONFIGMASTER_CACHE_DIR"] = cache_dir
+    full_env.update(env)
+    out = subprocess.run([sys.executable, "-c", SNIPPET, path, min_size], capture_output=True, text=True,
+                         env=full_env, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=9, help="Number of fresh interpreters per measurement")
+    ap.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 200, 2000], help="Numbers of parameters")
+    args = ap.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="cm_bytecode_")
+    results = {}
+    try:
+        print(f"assignDefaultParams() in a fresh interpreter, median of {args.runs} runs (ms)")
+        print(f"{'params':>8s} {'chars':>8s} " + " ".join(f"{mode:>9s}" for mode, _, _ in MODES) + "   gain")
+        for num_params in args.sizes:
+            path = os.path.join(tmp_dir, f"defaults{num_params}.py")
+            source = make_defaults(num_params)
+            with open(path, "w") as fh:
+                fh.write(source)
+            row = {}
+            for mode, min_size, env in MODES:
+                cache_dir = os.path.join(tmp_dir, f"cache_{mode}")
+                # a warm-up run fills the cache, like a cron job after its first launch
+                run(path, min_size, env, cache_dir)
+                row[mode] = statistics.median(run(path, min_size, env, cache_dir) for _ in range(args.runs))
+            results[num_params] = row
+            print(f"{num_params:8d} {len(source):8d} " +
+                  " ".join(f"{row[mode] * 1000.0:9.3f}" for mode, _, _ in MODES) +
+                  f"  {row['off'] / row['default']:5.2f}x")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    biggest = results[max(results)]
+    if biggest["default"] > biggest["off"] * 1.1:
+        print("the bytecode cache is slower than compiling", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''
+Micro-benchmark: reading parameters through ConfigMaster.__getitem__, a plain dict, and a frozen
+parameter object (ConfigMaster.freeze()), plus the memory used per copy of the parameters.
+'''
+import argparse
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ConfigMaster import ConfigMaster
+
+
+def make_config(num_params):
+    defaultParams = "\n".join(f"param{i} = {i}" for i in range(num_params)) + "\nforecastHour = 4\n"
+    return ConfigMaster(defaultParams, "frozen benchmark", add_default_logging=False, add_param_args=False, argv=[])
+
+
+def memory_per_copy(make_copy, copies):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make_copy() for _ in range(copies)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / copies
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--params", type=int, default=100, help="Number of parameters")
+    ap.add_argument("--reads", type=int, default=1000000, help="Number of reads per measurement")
+    args = ap.parse_args()
+
+    p = make_config(args.params)
+    frozen = p.freeze()
+    opt = p.opt
+
+    timings = {
+        "ConfigMaster p['forecastHour']": timeit.timeit("p['forecastHour']", globals={"p": p}, number=args.reads),
+        "dict opt['forecastHour']": timeit.timeit("opt['forecastHour']", globals={"opt": opt}, number=args.reads),
+        "frozen cfg['forecastHour']": timeit.timeit("cfg['forecastHour']", globals={"cfg": frozen},
+                                                    number=args.reads),
+        "frozen cfg.forecastHour": timeit.timeit("cfg.forecastHour", globals={"cfg": frozen}, number=args.reads),
+    }
+    base = timings["ConfigMaster p['forecastHour']"]
+    print(f"{args.reads} reads, {args.params} parameters")
+    for name, seconds in timings.items():
+        print(f"  {name:32s} {seconds / args.reads * 1e9:8.1f} ns/read  ({base / seconds:4.2f}x)")
+
+    copies = 200
+    params = {k: v for k, v in opt.items() if not k.startswith("_")}
+    print(f"memory per copy of {len(params)} parameters")
+    print(f"  {'dict':32s} {memory_per_copy(lambda: dict(params), copies):10.0f} bytes")
+    print(f"  {'frozen':32s} {memory_per_copy(p.freeze, copies):10.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
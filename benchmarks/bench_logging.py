@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+'''
+Cost of a logging call on the calling thread with the default ConfigMaster logger, writing to a file:
+
+  * sync        the default, logging.basicConfig with a FileHandler
+  * buffered    log_buffer_records = 1000
+  * async       async_logging = True, formatted and written by a background thread
+  * async+buffered
+
+--sink-delay-us adds a delay to every write, like a slow shared filesystem.  Each mode runs in a fresh
+interpreter, logging can only be set up once per process.
+'''
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {
+    "sync": {},
+    "buffered": {"log_buffer_records": 1000},
+    "async": {"async_logging": True},
+    "async+buffered": {"async_logging": True, "log_buffer_records": 1000},
+}
+
+
+def run_mode(mode, calls, log_path, sink_delay_us):
+    import logging
+    from ConfigMaster import ConfigMaster
+
+    class BenchConfigMaster(ConfigMaster):
+        def createLogHandler(self):
+            handler = super().createLogHandler()
+            if sink_delay_us:
+                sink = getattr(handler, "target", None) or handler
+                emit = sink.emit
+
+                def slow_emit(record):
+                    time.sleep(sink_delay_us / 1e6)
+                    emit(record)
+                sink.emit = slow_emit
+            return handler
+
+    for name, value in MODES[mode].items():
+        setattr(BenchConfigMaster, name, value)
+    if sink_delay_us and mode == "sync":
+        # make the default logger go through createLogHandler too, so it gets the delay
+        BenchConfigMaster.log_max_bytes = 1 << 40
+    p = BenchConfigMaster("forecastHour = 4\n", "logging benchmark", argv=["-l", log_path])
+
+    start = time.perf_counter()
+    for i in range(calls):
+        logging.info("processing file %d of %d", i, calls)
+    logged = time.perf_counter() - start
+    for i in range(calls):
+        logging.verbose("not logged %d", i)
+    verbose = time.perf_counter() - start - logged
+    p.flushLogs()
+    total = time.perf_counter() - start - verbose
+    return {"info_us": logged / calls * 1e6, "verbose_off_us": verbose / calls * 1e6, "total_s": total}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--calls", type=int, default=20000, help="Log calls per mode")
+    ap.add_argument("--sink-delay-us", type=float, default=0.0, help="Delay added to every write of the log file")
+    ap.add_argument("--mode", choices=sorted(MODES), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="cm_logging_") as tmp_dir:
+        if args.mode:
+            result = run_mode(args.mode, args.calls, os.path.join(tmp_dir, "bench.log"), args.sink_delay_us)
+            print(json.dumps(result))
+            return 0
+
+        print(f"{args.calls} calls of logging.info(), sink delay {args.sink_delay_us} us")
+        print(f"  {'mode':16s} {'info() us/call':>15s} {'verbose() off':>15s} {'until written s':>16s}")
+        for mode in MODES:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--mode", mode, "--calls",
+                                  str(args.calls), "--sink-delay-us", str(args.sink_delay_us)],
+                                 capture_output=True, text=True, check=True, cwd=tmp_dir)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"  {mode:16s} {result['info_us']:15.2f} {result['verbose_off_us']:15.3f} "
+                  f"{result['total_s']:16.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+'''
+Cost of checking the resolved parameters against their _config_schema entries (ConfigMaster.validateParams()).
+
+For each size the defaults hold that many parameters, each with a schema entry: ints with a range, floats with a
+minimum, strs with choices and lists of floats.  Timed:
+
+  * compile     setSchema(), turning the entries into the validation function, once per ConfigMaster
+  * validate    validateParams() on valid values
+  * 1% bad      validateParams() with one value in a hundred out of range, building the messages
+  * checkers    the same valid values through the per-parameter checkers only (what validateParams() would cost
+                without the inline fast path)
+'''
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ConfigMaster as cm_module
+from ConfigMaster import ConfigMaster
+
+DEFAULT_SIZES = (1000, 10000, 50000)
+
+
+def make_defaults(size):
+    lines = []
+    for i in range(size):
+        kind = i % 4
+        if kind == 0:
+            lines.append(f'param{i} = {i}\n_config_schema["param{i}"] = {{"type": int, "min": 0, "max": {size}}}')
+        elif kind == 1:
+            lines.append(f'param{i} = {i * 0.5}\n_config_schema["param{i}"] = {{"type": float, "min": 0.0}}')
+        elif kind == 2:
+            lines.append(f'param{i} = "GFS4"\n_config_schema["param{i}"] = {{"type": str, "choices": ["GFS4", "GFS5"]}}')
+        else:
+            lines.append(f'param{i} = [0.5, 1.5, 2.5]\n_config_schema["param{i}"] = {{"type": [float], "min": 0}}')
+    return "\n".join(lines) + "\n"
+
+
+def median_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Numbers of parameters")
+    ap.add_argument("--repeat", type=int, default=7, help="Runs per measurement")
+    args = ap.parse_args()
+
+    print(f"{'params':>8s} {'compile':>10s} {'validate':>10s} {'1% bad':>10s} {'checkers':>10s}   (ms)")
+    for size in args.sizes:
+        p = ConfigMaster(make_defaults(size), "schema benchmark", add_default_logging=False, add_param_args=False,
+                         argv=[])
+        schema = dict(p.param_schema)
+        bad = dict(p.opt)
+        # every hundredth parameter is an int with a minimum of 0
+        for i in range(0, size, 100):
+            bad[f"param{i}"] = -1
+        assert p.validateParams() == []
+        assert len(p.validateParams(bad)) == len(range(0, size, 100))
+
+        checkers = []
+        for name, spec in schema.items():
+            checkers.append((name, cm_module._schema_check(name, spec["type"], cm_module._schema_leaf(name, spec))))
+
+        def run_checkers():
+            errors = []
+            opt = p.opt
+            for name, check in checkers:
+                check(opt[name], name, errors)
+            return errors
+
+        timings = [median_time(lambda: p.setSchema(schema), args.repeat), median_time(p.validateParams, args.repeat),
+                   median_time(lambda: p.validateParams(bad), args.repeat), median_time(run_checkers, args.repeat)]
+        print(f"{size:8d} " + " ".join(f"{t * 1000:10.3f}" for t in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+Per-task cost of handing the parameters to a worker: pickling opt (what multiprocessing and
+concurrent.futures do with every task that gets the ConfigMaster or its opt) against attaching to a snapshot
+published once with ConfigMaster.publishSnapshot().
+
+For each size the config holds 100 scalar parameters plus a list of N floats and a bytearray of N*8 bytes.
+'''
+import argparse
+import os
+import pickle
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ConfigMaster import ConfigMaster
+
+DEFAULT_SIZES = (1000, 100000, 1000000)
+
+
+def make_config(size):
+    defaultParams = "\n".join(f"param{i} = {i}" for i in range(100))
+    defaultParams += f"\nforecastHour = 4\nthresholds = [i * 0.5 for i in range({size})]\n"
+    defaultParams += f"blob = bytearray({size * 8})\n"
+    return ConfigMaster(defaultParams, "shared memory benchmark", add_default_logging=False, add_param_args=False,
+                        argv=[])
+
+
+def median_time(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Elements in the big values")
+    ap.add_argument("--repeat", type=int, default=7, help="Runs per measurement")
+    args = ap.parse_args()
+
+    print(f"{'size':>9s} {'pickle opt':>12s} {'publish':>12s} {'attach+scalar':>14s} {'attach+list':>12s} "
+          f"{'attach+blob':>12s}   (ms per task, publish is once)")
+    for size in args.sizes:
+        p = make_config(size)
+        opt = {k: v for k, v in p.opt.items() if k != p.config_override_dict_name}
+
+        def by_pickle():
+            pickle.loads(pickle.dumps(opt, protocol=pickle.HIGHEST_PROTOCOL))
+
+        publish = median_time(p.publishSnapshot, args.repeat)
+        name = p.publishSnapshot()
+
+        def attach(key):
+            def run():
+                shared = ConfigMaster.attachSnapshot(name)
+                value = shared[key]
+                del value
+                shared.close()
+            return run
+
+        timings = [median_time(by_pickle, args.repeat), publish, median_time(attach("forecastHour"), args.repeat),
+                   median_time(attach("thresholds"), args.repeat), median_time(attach("blob"), args.repeat)]
+        p.unpublishSnapshot()
+        print(f"{size:9d} " + " ".join(f"{t * 1000:{w}.3f}" for t, w in zip(timings, (12, 12, 14, 12, 12))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+'''
+Cold start benchmark for ConfigMaster.
+
+Runs each measurement in a fresh interpreter:
+  * "import ConfigMaster" under -X importtime (cumulative microseconds reported by python)
+  * the total cold start: "from ConfigMaster import ConfigMaster" followed by a ConfigMaster(defaultParams, ...)
+    construction, timed with perf_counter from before the import to after the construction
+
+Moving an import from module level into init() makes the import cheaper and init() dearer by the same amount,
+so only the total is compared to the baseline: the ConfigMaster.py of the baseline commit in startup_budget.json,
+timed the same way and alternating with the current one.  Without git the total is compared to total_ms, the
+baseline total measured when the budget was written.  The script exits non-zero if the import is slower than
+import_us or the total slower than the baseline (times the tolerance), or if a module that should be lazy is
+imported up front.
+
+Usage:
+  ./bench_startup.py             # check against the budget
+  ./bench_startup.py --update    # record the current import and the baseline total as the new budget
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(HERE)
+BUDGET_FILE = os.path.join(HERE, "startup_budget.json")
+
+# modules that importing ConfigMaster must not pull in: the ones used by init() and the optional subsystems
+# (http config sources, shared memory snapshots, schemas, the profiler, asyncio loading, the registry)
+LAZY_MODULES = ["argparse", "logging", "importlib.util", "hashlib", "marshal", "json", "ast", "http.client",
+                "urllib.parse", "multiprocessing", "mmap", "ctypes", "asyncio", "threading", "collections",
+                "pickle", "tempfile"]
+
+INIT_SNIPPET = r'''
+import sys, time, json
+t0 = time.perf_counter()
+from ConfigMaster import ConfigMaster
+t1 = time.perf_counter()
+sys.argv = [sys.argv[0]]
+p = ConfigMaster("forecastHour = 4\ndataDir = '/dir'\ntest = True\n", "startup benchmark", add_default_logging=False)
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "init_s": t2 - t1, "total_s": t2 - t0}))
+'''
+
+LAZY_SNIPPET = r'''
+import sys, json
+before = set(sys.modules)
+import ConfigMaster
+print(json.dumps(sorted(set(sys.modules) - before)))
+'''
+
+
+def run_python(args, env=None, repo=REPO):
+    full_env = dict(os.environ)
+    full_env["PYTHONPATH"] = repo + os.pathsep + full_env.get("PYTHONPATH", "")
+    # time the import from __pycache__, like every launch after the first one
+    full_env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if env:
+        full_env.update(env)
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, env=full_env, cwd=HERE,
+                          check=True)
+
+
+def import_time_us():
+    out = run_python(["-X", "importtime", "-c", "import ConfigMaster"])
+    for line in out.stderr.splitlines():
+        parts = [x.strip() for x in line.split("|")]
+        if len(parts) == 3 and parts[2] == "ConfigMaster":
+            return int(parts[1])
+    raise RuntimeError("ConfigMaster not found in -X importtime output")
+
+
+def startup_times_s(cache_dir, repo=REPO):
+    # {"import_s": ..., "init_s": ..., "total_s": ...} of one cold start
+    out = run_python(["-c", INIT_SNIPPET], env={"CONFIGMASTER_CACHE_DIR": cache_dir}, repo=repo)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def checkout_baseline(rev, dest):
+    # the baseline ConfigMaster.py in dest, or None without git (or the commit)
+    try:
+        source = subprocess.run(["git", "show", f"{rev}:ConfigMaster.py"], capture_output=True, cwd=REPO,
+                                check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    os.makedirs(dest)
+    with open(os.path.join(dest, "ConfigMaster.py"), "wb") as fh:
+        fh.write(source)
+    return dest
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=15, help="Number of fresh interpreters per measurement")
+    ap.add_argument("--tolerance", type=float, default=None, help="Allowed slowdown factor (default from budget)")
+    ap.add_argument("--update", action="store_true", help="Write the measured numbers as the new budget")
+    args = ap.parse_args()
+
+    import shutil
+    import tempfile
+    with open(BUDGET_FILE) as fh:
+        budget = json.load(fh)
+    tolerance = args.tolerance or budget.get("tolerance", 1.5)
+    tmp_dir = tempfile.mkdtemp(prefix="cm_startup_")
+    cache_dir = os.path.join(tmp_dir, "cache")
+
+    imported = json.loads(run_python(["-c", LAZY_SNIPPET]).stdout)
+    eager = [m for m in LAZY_MODULES if m in imported]
+
+    baseline = checkout_baseline(budget["baseline"], os.path.join(tmp_dir, "baseline"))
+    trees = [REPO] + ([baseline] if baseline else [])
+    # one warm-up run each writes __pycache__ and fills the bytecode cache, like a real cron job after its
+    # first launch.  Then the two trees take turns, so both see the same machine load
+    for repo in trees:
+        startup_times_s(cache_dir, repo)
+    import_us = statistics.median(import_time_us() for _ in range(args.runs))
+    runs = {repo: [] for repo in trees}
+    for _ in range(args.runs):
+        for repo in trees:
+            runs[repo].append(startup_times_s(cache_dir, repo))
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def median_ms(repo, key):
+        return statistics.median(times[key] for times in runs[repo]) * 1000.0
+
+    total_ms = median_ms(REPO, "total_s")
+    print(f"import ConfigMaster        : {import_us:10.0f} us (median of {args.runs}, -X importtime)")
+    print(f"import + ConfigMaster()    : {total_ms:10.3f} ms (median of {args.runs}: "
+          f"{median_ms(REPO, 'import_s'):.3f} ms import, {median_ms(REPO, 'init_s'):.3f} ms init)")
+    if baseline:
+        baseline_ms = median_ms(baseline, "total_s")
+        print(f"baseline {budget['baseline'][:10]}        : {baseline_ms:10.3f} ms (median of {args.runs}: "
+              f"{median_ms(baseline, 'import_s'):.3f} ms import, {median_ms(baseline, 'init_s'):.3f} ms init)")
+    else:
+        baseline_ms = budget["total_ms"]
+        print(f"baseline {budget['baseline'][:10]} not found, using total_ms from {BUDGET_FILE}")
+
+    if args.update:
+        budget.update({"import_us": round(import_us), "total_ms": round(baseline_ms, 3), "tolerance": tolerance})
+        with open(BUDGET_FILE, "w") as fh:
+            json.dump(budget, fh, indent=2)
+            fh.write("\n")
+        print(f"wrote {BUDGET_FILE}")
+        return 0
+
+    failed = False
+    if eager:
+        print(f"FAIL: importing ConfigMaster loaded {', '.join(eager)}")
+        failed = True
+
+    for name, measured, limit, unit in (("import", import_us, budget["import_us"], "us"),
+                                        ("import + init", total_ms, baseline_ms, "ms")):
+        status = "ok" if measured <= limit * tolerance else "FAIL"
+        print(f"{status:4s} {name}: {measured:.3f} {unit} (budget {limit:.3f} {unit} x {tolerance}, "
+              f"{measured / limit:.2f}x)")
+        failed = failed or measured > limit * tolerance
+
+    if failed:
+        print("startup budget exceeded", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+'''
+Benchmark suite for ConfigMaster.
+
+Builds synthetic default params with 10, 1000 and 50000 parameters (plus a config file with large literals
+and an override table with hundreds of rules for each size) and times:
+
+  * construct          ConfigMaster(defaultParams, ...) including the cmd line and _config_override
+  * handleConfigFile   loading the config file into a constructed instance (handleConfigFileExec: with
+                       literal_fast_path off, handleConfigFileCached: from the layer cache)
+  * doConfigOverride   compiling and applying the _config_override rules
+  * argParse           building the parser and parsing the cmd line (argParseFull: with lazy_param_args off)
+  * getParamsString    formatting all the parameters
+  * getitem            p["name"], per read
+
+Each case runs --repeat times, the median and minimum are stored as JSON so runs can be compared:
+
+  ./bench_suite.py -o before.json
+  ... change something ...
+  ./bench_suite.py -o after.json
+  ./bench_suite.py --compare before.json after.json    # exits non-zero on a regression
+'''
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ConfigMaster import ConfigMaster
+
+DEFAULT_SIZES = (10, 1000, 50000)
+
+# name -> function(workload, repeat) returning a list of timings in seconds
+CASES = {}
+
+
+def case(name):
+    def register(func):
+        CASES[name] = func
+        return func
+    return register
+
+
+class Workload:
+    """
+    Synthetic default params, config file and override rules for num_params parameters.
+    """
+    def __init__(self, num_params, tmp_dir, num_rules=None, literal_size=100000):
+        self.num_params = num_params
+        self.num_rules = num_rules if num_rules is not None else min(500, max(10, num_params // 2))
+        self.argv = ["--model", "M7", "--site", "s3"]
+
+        lines = ['model = "M0"', 'site = "s0"']
+        for i in range(num_params):
+            kind = i % 4
+            if kind == 0:
+                lines.append(f"param{i} = {i}")
+            elif kind == 1:
+                lines.append(f"param{i} = {i * 0.5}")
+            elif kind == 2:
+                lines.append(f'param{i} = "value {i}"')
+            else:
+                lines.append(f"param{i} = {bool(i % 3)}")
+        for r in range(self.num_rules):
+            target = f"param{(r * 7) % num_params}"
+            if r % 3 == 0:
+                lines.append(f'_config_override["model", "site"]["M{r % 20}", "s{r % 5}"]["{target}"] = {r}')
+            else:
+                lines.append(f'_config_override["model"]["M{r % 20}"]["{target}"] = {r}')
+        self.defaultParams = "\n".join(lines) + "\n"
+
+        self.config_file = os.path.join(tmp_dir, f"config_{num_params}.py")
+        with open(self.config_file, "w") as fh:
+            fh.write(f"big_list = {list(range(literal_size))!r}\n")
+            fh.write(f"big_dict = {dict((f'key{i}', f'value{i}') for i in range(literal_size // 10))!r}\n")
+            for i in range(0, num_params, 10):
+                fh.write(f"param{i} = {i + 1}\n" if i % 4 == 0 else f"param{i} = {str(i)!r}\n")
+
+    def build(self, **kwargs):
+        kwargs.setdefault("argv", self.argv)
+        p = ConfigMaster(self.defaultParams, "benchmark suite", add_default_logging=False, allow_extra_parameters=True,
+                         **kwargs)
+        return p
+
+
+def timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+@case("construct")
+def bench_construct(w, repeat):
+    return timed(w.build, repeat)
+
+
+def handle_config_file_timings(w, repeat, fast_path=True, layer_cache=False):
+    timings = []
+    try:
+        ConfigMaster.literal_fast_path = fast_path
+        ConfigMaster.use_layer_cache = layer_cache
+        ConfigMaster.clearLayerCache()
+        for _ in range(repeat):
+            if layer_cache:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    w.build().handleConfigFile(w.config_file)
+            p = w.build()
+            # the ConfigMasters of earlier runs are in reference cycles, don't time the collector freeing them
+            gc.collect()
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                p.handleConfigFile(w.config_file)
+                timings.append(time.perf_counter() - start)
+    finally:
+        ConfigMaster.literal_fast_path = True
+        ConfigMaster.use_layer_cache = False
+        ConfigMaster.clearLayerCache()
+    return timings
+
+
+@case("handleConfigFile")
+def bench_handle_config_file(w, repeat):
+    return handle_config_file_timings(w, repeat)
+
+
+@case("handleConfigFileExec")
+def bench_handle_config_file_exec(w, repeat):
+    # the same, running the whole file with exec() (literal_fast_path = False)
+    return handle_config_file_timings(w, repeat, fast_path=False)
+
+
+@case("handleConfigFileCached")
+def bench_handle_config_file_cached(w, repeat):
+    # loading a config file that is in the layer cache (reloads, sweep(), several ConfigMasters)
+    return handle_config_file_timings(w, repeat, layer_cache=True)
+
+
+@case("doConfigOverride")
+def bench_do_config_override(w, repeat):
+    p = w.build()
+    return timed(p.doConfigOverride, repeat)
+
+
+ARG_PARSE_PHASES = ("buildParser", "addParseArgs", "handleArgParse", "reapplyArgParse")
+
+
+def arg_parse_timings(w, repeat, lazy):
+    timings = []
+    try:
+        ConfigMaster.lazy_param_args = lazy
+        for _ in range(repeat):
+            phases = w.build().init_timings["phases"]
+            timings.append(sum(phases.get(phase, 0.0) for phase in ARG_PARSE_PHASES))
+    finally:
+        ConfigMaster.lazy_param_args = True
+    return timings
+
+
+@case("argParse")
+def bench_arg_parse(w, repeat):
+    # building the parser and parsing the cmd line, with only the options that are on the cmd line
+    return arg_parse_timings(w, repeat, True)
+
+
+@case("argParseFull")
+def bench_arg_parse_full(w, repeat):
+    # the same with an option for every param (lazy_param_args = False)
+    return arg_parse_timings(w, repeat, False)
+
+
+@case("getParamsString")
+def bench_get_params_string(w, repeat):
+    p = w.build()
+    return timed(p.getParamsString, repeat)
+
+
+@case("getitem")
+def bench_getitem(w, repeat):
+    import timeit
+    p = w.build()
+    name = f"param{w.num_params // 2}"
+    reads = 100000
+    return [t / reads for t in timeit.repeat(f"p[{name!r}]", globals={"p": p}, number=reads, repeat=repeat)]
+
+
+def run(sizes, cases, repeat):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="cm_suite_") as tmp_dir:
+        # a private, warm bytecode cache, like a script that has run before
+        os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+        for size in sizes:
+            w = Workload(size, tmp_dir)
+            w.build()
+            for name in cases:
+                timings = CASES[name](w, repeat)
+                key = f"{name}/{size}"
+                results[key] = {"median_s": statistics.median(timings), "min_s": min(timings), "runs": len(timings)}
+                print(f"  {key:28s} median {format_seconds(results[key]['median_s'])}  "
+                      f"min {format_seconds(results[key]['min_s'])}", flush=True)
+    return results
+
+
+def format_seconds(seconds):
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:9.3f} {unit:2s}"
+    return f"{seconds / 1e-9:9.1f} ns"
+
+
+def compare(old_file, new_file, threshold):
+    with open(old_file) as fh:
+        old = json.load(fh)["results"]
+    with open(new_file) as fh:
+        new = json.load(fh)["results"]
+
+    regressions = []
+    for key in sorted(set(old) & set(new), key=lambda k: (int(k.split("/")[1]), k)):
+        # the minimum is the least noisy estimate of the cost of the code
+        ratio = new[key]["min_s"] / old[key]["min_s"] if old[key]["min_s"] else 1.0
+        status = "ok"
+        if ratio > threshold:
+            status = "SLOWER"
+            regressions.append(key)
+        elif ratio < 1.0 / threshold:
+            status = "faster"
+        print(f"{status:6s} {key:28s} {format_seconds(old[key]['min_s'])} -> {format_seconds(new[key]['min_s'])}"
+              f"  ({ratio:5.2f}x)")
+    for key in sorted(set(old) ^ set(new)):
+        print(f"{'only in ' + (old_file if key in old else new_file)}: {key}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {threshold}x: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Numbers of parameters")
+    ap.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="Cases to run")
+    ap.add_argument("--repeat", type=int, default=5, help="Runs per case")
+    ap.add_argument("-o", "--output", help="Write the results to this JSON file")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files")
+    ap.add_argument("--threshold", type=float, default=1.5, help="Slowdown factor reported as a regression")
+    args = ap.parse_args()
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    print(f"ConfigMaster {ConfigMaster.version}, python {platform.python_version()}")
+    results = run(args.sizes, args.cases, args.repeat)
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump({"configmaster_version": ConfigMaster.version, "python": platform.python_version(),
+                       "machine": platform.machine(), "repeat": args.repeat, "results": results}, fh, indent=2)
+            fh.write("\n")
+        print(f"wrote {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
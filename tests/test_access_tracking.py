@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+'''
+trackAccess(), countAccess() and memoize(): reads are counted exactly from several threads, memoize() hits when
+only unrelated parameters changed, and arguments that can't be keyed the same way twice are refused instead of
+missing every time.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+logLabel = "run"
+"""
+
+
+class Opaque:
+    pass
+
+
+class Station:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Station({self.name!r})"
+
+
+def double(value):
+    return 2 * value
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+
+    # countAccess() from several threads loses no reads
+    p.countAccess()
+
+    def read():
+        for _ in range(20000):
+            p["forecastHour"]
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with p.trackAccess() as reads:
+        p["model"]
+    assert p.getAccessCounts() == {"forecastHour": 80000, "model": 1}, p.getAccessCounts()
+    assert reads == {"model": 1}
+    p.countAccess(False)
+
+    calls = []
+
+    @p.memoize
+    def product(station, hours):
+        calls.append(station)
+        return f"{p['model']} {station.name} {hours * p['forecastHour']}"
+
+    assert product(Station("boulder"), 2) == "GFS4 boulder 8"
+    assert product(Station("boulder"), 2) == "GFS4 boulder 8"
+    assert (product.hits, product.misses) == (1, 1)
+    p["logLabel"] = "other"
+    product(Station("boulder"), 2)
+    assert (product.hits, product.misses) == (2, 1)
+    p["forecastHour"] = 6
+    assert product(Station("boulder"), 2) == "GFS4 boulder 12" and product.misses == 2
+
+    # functions are keyed by name, objects with the default repr (it has their address) are refused
+    @p.memoize
+    def apply(func, value):
+        return func(value)
+
+    assert apply(double, 2) == 4 and apply(double, 2) == 4 and apply(len, "abc") == 3
+    assert (apply.hits, apply.misses) == (1, 2)
+    for bad in (Opaque(), lambda v: v, [Opaque()]):
+        try:
+            apply(bad, 1)
+        except TypeError as e:
+            assert "no stable key" in str(e), e
+        else:
+            raise AssertionError(f"{bad!r} was keyed")
+    p["station"] = Opaque()
+    try:
+        p.fingerprint(["station"])
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("a parameter with the default repr was fingerprinted")
+    assert p.fingerprint(["model"]) == p.fingerprint(["model"])
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+initAsync() and reloadConfigAsync(): config files are evaluated off the event loop, several at once and each only
+once, sys.argv is left alone, and the reload callbacks run on the loop.
+'''
+from ConfigMaster import ConfigMaster
+
+import asyncio
+import collections
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+site = "boulder"
+"""
+
+# each config file takes a while to evaluate, like one on a slow filesystem.  It looks at the time, so it is
+# never reused from the layer cache
+slow_config = """
+import threading
+import time
+threading.Event().wait({delay})
+print("evaluating {name}", time.time())
+{name} = {value!r}
+"""
+
+DELAY = 0.4
+
+
+async def ticker(ticks, stop):
+    while not stop.is_set():
+        ticks.append(asyncio.get_running_loop().time())
+        await asyncio.sleep(0.01)
+
+
+def evaluations(out):
+    # config file evaluations printed to out, by parameter name
+    lines = out.getvalue().splitlines()
+    return collections.Counter(line.split()[1] for line in lines if line.startswith("evaluating"))
+
+
+async def run(tmp_dir):
+    files = []
+    for name, value in (("model", "GFS5"), ("site", "fort collins"), ("forecastHour", 12)):
+        path = os.path.join(tmp_dir, f"{name}.py")
+        with open(path, "w") as fh:
+            fh.write(slow_config.format(delay=DELAY, name=name, value=value))
+        files.append(path)
+
+    loop = asyncio.get_running_loop()
+    ticks = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(ticks, stop))
+
+    p = ConfigMaster()
+    p.setDefaultParams(defaultParams)
+    start = loop.time()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert await p.initAsync(__doc__, config_files=files[:2], argv=["-c", files[2], "--site", "cmd"],
+                                 add_default_logging=False) is p
+    elapsed = loop.time() - start
+    stop.set()
+    await tick_task
+
+    assert (p["model"], p["site"], p["forecastHour"]) == ("GFS5", "cmd", 12), p.opt
+    assert p.getConfigFilePaths() == files
+    assert evaluations(out) == {"model": 1, "site": 1, "forecastHour": 1}, out.getvalue()
+    # the three files were evaluated at the same time, not one after the other
+    assert elapsed < 2.5 * DELAY, elapsed
+    # and the loop kept running
+    gaps = [b - a for a, b in zip(ticks, ticks[1:])]
+    assert len(ticks) > 10 and max(gaps) < DELAY / 2, (len(ticks), max(gaps))
+
+    # sys.argv is only parsed when it is passed in
+    q = ConfigMaster()
+    q.setDefaultParams(defaultParams)
+    await q.initAsync(__doc__, add_default_logging=False)
+    assert q["site"] == "boulder"
+
+    # reload: off the loop, swapped in one step, callbacks on the loop thread
+    with open(files[0], "w") as fh:
+        fh.write(slow_config.format(delay=DELAY, name="model", value="GFS6"))
+    callback_threads = []
+    p.addReloadCallback(lambda cm, changed: callback_threads.append((threading.get_ident(), changed)))
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        reload_task = asyncio.create_task(p.reloadConfigAsync())
+        await asyncio.sleep(DELAY / 4)
+        # the old values are in place until the new ones are complete
+        assert p["model"] == "GFS5"
+        changed = await reload_task
+    assert changed == {"model": ("GFS5", "GFS6")}, changed
+    assert evaluations(out) == {"model": 1, "site": 1, "forecastHour": 1}, out.getvalue()
+    assert p["model"] == "GFS6" and p["site"] == "cmd"
+    assert callback_threads == [(threading.get_ident(), changed)], callback_threads
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    # initAsync() must not look at this
+    sys.argv = [sys.argv[0], "--no-such-option"]
+    asyncio.run(run(tmp_dir))
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
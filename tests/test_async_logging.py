@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+'''
+async_logging: records are written by the listener thread, but the message is formatted when it is logged (a
+mutable argument changed afterwards doesn't change it), tracebacks are kept, and flushLogs() writes the queued
+records, also after the listener was stopped at exit.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import logging
+import os
+import tempfile
+import threading
+
+defaultParams = """
+forecastHour = 4
+"""
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    log_file = os.path.join(tmp_dir, "run.log")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-l", log_file], async_logging=True)
+    assert p.log_listener is not None
+
+    # the listener writes from its own thread, so block it until the records are queued
+    gate = threading.Event()
+    handler = p.log_listener.handlers[0]
+    emit = handler.emit
+    handler.emit = lambda record: (gate.wait(), emit(record))
+
+    members = ["gfs"]
+    logging.info("members %s", members)
+    members.append("nam")
+    try:
+        1 / 0
+    except ZeroDivisionError:
+        logging.exception("failed for %d", p["forecastHour"])
+    gate.set()
+    p.flushLogs()
+
+    with open(log_file) as fh:
+        log = fh.read()
+    assert "members ['gfs']\n" in log, log
+    assert "failed for 4\nTraceback (most recent call last):" in log and "ZeroDivisionError" in log, log
+
+    # stopped, like at exit: flushLogs() doesn't start it again
+    p._stopLogListener()
+    assert not p._log_listener_running
+    p.flushLogs()
+    p._stopLogListener()
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+'''
+The bytecode cache: a second compile of the same source is a hit, an edited source or another python version
+(cache tag) is a miss that writes a new entry, a corrupt entry is rewritten, sources shorter than
+bytecode_cache_min_size are not cached, and the hit/miss counters follow along.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+"""
+
+
+def counts(before):
+    stats = ConfigMaster.bytecode_cache_stats
+    return tuple(stats[k] - before[k] for k in ("hits", "misses", "errors"))
+
+
+def compiles(p, source, filename="config.py", literal_plan=False):
+    before = dict(ConfigMaster.bytecode_cache_stats)
+    code = p.compileSource(source, filename, literal_plan)
+    return code, counts(before)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    cache_dir = os.path.join(tmp_dir, "cache")
+    os.environ["CONFIGMASTER_CACHE_DIR"] = cache_dir
+    os.environ.pop("CONFIGMASTER_NO_CACHE", None)
+    min_size = ConfigMaster.bytecode_cache_min_size
+    # the sources here are short, cache them anyway
+    ConfigMaster.bytecode_cache_min_size = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+    p.clearBytecodeCache()
+    entries = lambda: sorted(glob.glob(os.path.join(cache_dir, "*" + p.bytecode_cache_suffix)))
+
+    source = "x = 1\ny = [x, 2]\n"
+    code, stats = compiles(p, source)
+    assert stats == (0, 1, 0) and len(entries()) == 1, (stats, entries())
+    namespace = {}
+    exec(code, namespace)
+    assert namespace["y"] == [1, 2]
+    code, stats = compiles(p, source)
+    assert stats == (1, 0, 0), stats
+    # the same source under another name, or as a literal plan, is another entry
+    assert compiles(p, source, "other.py")[1] == (0, 1, 0)
+    assert compiles(p, source, literal_plan=True)[1] == (0, 1, 0)
+    assert compiles(p, source, literal_plan=True)[1] == (1, 0, 0)
+    assert len(entries()) == 3
+
+    # an edited source misses
+    edited = source.replace("x = 1", "x = 2")
+    code, stats = compiles(p, edited)
+    assert stats == (0, 1, 0), stats
+    namespace = {}
+    exec(code, namespace)
+    assert namespace["y"] == [2, 2]
+    assert compiles(p, edited)[1] == (1, 0, 0)
+
+    # another python version (cache tag) misses, and doesn't replace the entry of this one
+    tag = sys.implementation.cache_tag
+    sys.implementation.cache_tag = "otherpython-99"
+    try:
+        assert compiles(p, source)[1] == (0, 1, 0)
+        assert compiles(p, source)[1] == (1, 0, 0)
+    finally:
+        sys.implementation.cache_tag = tag
+    assert compiles(p, source)[1] == (1, 0, 0)
+
+    # a corrupt entry is an error and a miss, and is rewritten
+    p.clearBytecodeCache()
+    compiles(p, source)
+    entry, = entries()
+    with open(entry, "r+b") as fh:
+        fh.seek(len(os.path.basename(entry)) - len(p.bytecode_cache_suffix))
+        fh.write(b"\xff\xff\xff")
+    assert compiles(p, source)[1] == (0, 1, 1)
+    assert compiles(p, source)[1] == (1, 0, 0)
+
+    # through init(): the defaults and the config file are compiled from the cache on the second run
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write("import os\nforecastHour = len(os.sep) * 6\n")
+    for expected in ((0, 2, 0), (2, 0, 0)):
+        before = dict(ConfigMaster.bytecode_cache_stats)
+        with contextlib.redirect_stdout(io.StringIO()):
+            q = ConfigMaster(defaultParams + "dataDir = '/data' + str(forecastHour)\n", __doc__,
+                             argv=["-c", config_file], add_default_logging=False)
+        assert counts(before) == expected and q["forecastHour"] == 6, (counts(before), expected)
+        assert q.getBytecodeCacheStats() == ConfigMaster.bytecode_cache_stats
+
+    # shorter than bytecode_cache_min_size: compiled, no lookup
+    ConfigMaster.bytecode_cache_min_size = min_size
+    p.clearBytecodeCache()
+    assert len(source) < min_size
+    code, stats = compiles(p, source)
+    assert stats == (0, 0, 0) and entries() == [], stats
+    assert compiles(p, source * (min_size // len(source) + 1))[1] == (0, 1, 0) and len(entries()) == 1
+    ConfigMaster.bytecode_cache_min_size = 0
+
+    # turned off: no lookups, no entries
+    p.clearBytecodeCache()
+    assert entries() == []
+    os.environ["CONFIGMASTER_NO_CACHE"] = "1"
+    try:
+        assert compiles(p, source)[1] == (0, 0, 0) and entries() == []
+    finally:
+        del os.environ["CONFIGMASTER_NO_CACHE"]
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
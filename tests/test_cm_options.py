@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+'''
+--cm-profile-config and --cm-timings are seen however argparse would accept them (abbreviated too), and they
+don't end up in the parameters.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+"""
+
+
+def load(argv):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        p = ConfigMaster(defaultParams, __doc__, argv=argv, add_default_logging=False)
+    return p, out.getvalue()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+
+    for argv in (["--cm-profile-config"], ["--cm-prof"], ["--cm-p", "--forecastHour", "6"]):
+        p, out = load(argv)
+        assert p.profile_config and p.config_profile, argv
+        assert "config profile:" in out, out
+        assert not any(k.startswith("cm_") for k in p.opt), p.opt
+
+    for argv in (["--cm-timings"], ["--cm-t"]):
+        p, out = load(argv)
+        assert not p.profile_config and "total" in p.getTimingReport()
+        assert p.getTimingReport().splitlines()[0] in out, out
+
+    # the phases are listed in the order they started, a config file under the argument parsing that loaded it
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write("forecastHour = 6\n")
+    p, out = load(["-c", config_file, "--cm-timings"])
+    phases = [line.split()[0] for line in p.getTimingReport().splitlines()[1:]]
+    assert phases[:5] == ["assignDefaultParams", "buildParser", "addParseArgs", "handleArgParse",
+                          "handleConfigFile"], phases
+    indents = {line.split()[0]: len(line) - len(line.lstrip()) for line in p.getTimingReport().splitlines()[1:]}
+    assert indents["handleConfigFile"] == 4 and indents["handleArgParse"] == indents["doConfigOverride"] == 2
+    starts = p.init_timings["phase_starts"]
+    assert list(starts) == phases and 0 <= starts["assignDefaultParams"] < starts["handleConfigFile"], starts
+
+    # neither given
+    p, out = load(["--forecastHour", "6"])
+    assert not p.profile_config and not p.config_profile and p["forecastHour"] == 6
+
+    # argparse refuses a value for a flag, and an ambiguous prefix
+    for argv in (["--cm-profile-config=yes"], ["--cm-"]):
+        with contextlib.redirect_stderr(io.StringIO()):
+            try:
+                load(argv)
+            except SystemExit as e:
+                assert e.code == 2, argv
+            else:
+                raise AssertionError(f"no error for {argv}")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+'''
+Load configs from thousands of directories, each importing a helper module that sits next to it, and check
+that sys.path, sys.modules and import latency stay the same.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import tempfile
+import time
+
+NUM_CONFIGS = 10000
+
+defaultParams = """
+dataDir = "/dir"
+member = 0
+"""
+
+
+def import_latency():
+    # a failing import searches every sys.path entry
+    start = time.perf_counter()
+    for i in range(200):
+        importlib.util.find_spec(f"cm_no_such_module_{i}")
+    return (time.perf_counter() - start) / 200
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    sys.dont_write_bytecode = True
+
+    config_files = []
+    for i in range(NUM_CONFIGS):
+        config_dir = os.path.join(tmp_dir, f"site{i}")
+        os.mkdir(config_dir)
+        with open(os.path.join(config_dir, "site_helper.py"), "w") as fh:
+            fh.write(f"import os\nDATA_DIR = os.path.join('/data', 'site{i}')\n")
+        config_files.append(os.path.join(config_dir, "config.py"))
+        with open(config_files[-1], "w") as fh:
+            fh.write(f"import site_helper\ndataDir = site_helper.DATA_DIR\nmember = {i}\n")
+
+    p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+    sys_path = list(sys.path)
+    before = import_latency()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i, config_file in enumerate(config_files):
+            p.handleConfigFile(config_file)
+            assert p["dataDir"] == f"/data/site{i}", p["dataDir"]
+
+    after = import_latency()
+    assert sys.path == sys_path, f"sys.path grew by {len(sys.path) - len(sys_path)} entries"
+    assert "site_helper" not in sys.modules
+    assert not any(path.startswith(tmp_dir) for path in sys.path_importer_cache)
+    assert after < before * 3 + 50e-6, f"import latency went from {before * 1e6:.1f} us to {after * 1e6:.1f} us"
+
+    print(f"loaded {NUM_CONFIGS} configs, import latency {before * 1e6:.1f} us -> {after * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+'''
+_config_override: the compiled index applies single condition rules exactly like the original linear scan over
+the table, compound rules fire only when every condition is on the command line and win over single ones,
+conflicting rules are warned about, and the trace lists the rules in the order they were applied.
+'''
+import ConfigMaster as cm_module
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+
+defaultParams = """
+model = "GFS4"
+site = "boulder"
+forecastHour = 4
+expected_size = 100
+region = "none"
+resolution = 0.5
+
+_config_override["model"]["GFS5"]["expected_size"] = 200
+_config_override["model"]["GFS5"]["resolution"] = 0.25
+_config_override["site"]["denver"]["region"] = "front range"
+_config_override["model", "site"]["GFS5", "boulder"]["expected_size"] = 250
+_config_override["model", "site"]["GFS5", "denver"]["region"] = "denver metro"
+_config_override["forecastHour"][12]["expected_size"] = 300
+"""
+
+
+def linear_scan(table, cmd_values, opt):
+    # what doConfigOverride() did before the index: every rule, in table order, checked against the cmd line
+    for param1 in table:
+        for param1_target in table[param1]:
+            for param2 in table[param1][param1_target]:
+                if param1 in cmd_values and cmd_values[param1] == param1_target:
+                    opt[param2] = table[param1][param1_target][param2]
+    return opt
+
+
+def load(argv, defaults=defaultParams, **kwargs):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        p = ConfigMaster(defaults, __doc__, argv=argv, add_default_logging=False, **kwargs)
+    return p, out.getvalue()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+
+    # single condition rules: the index gives the same result as the linear scan, on random tables
+    rng = random.Random(7)
+    params = [f"p{i}" for i in range(6)]
+    for _ in range(300):
+        table = {}
+        for _ in range(rng.randint(1, 12)):
+            trigger = rng.choice(params)
+            value = rng.randint(0, 3)
+            table.setdefault(trigger, {}).setdefault(value, {})[rng.choice(params)] = rng.randint(0, 99)
+        cmd_values = {p: rng.randint(0, 3) for p in rng.sample(params, rng.randint(0, len(params)))}
+        base = {p: -1 for p in params}
+        expected = linear_scan(table, cmd_values, dict(base))
+        opt = dict(base)
+        cm_module._apply_overrides(cm_module._compile_overrides(table), cmd_values, opt)
+        assert opt == expected, (table, cmd_values, opt, expected)
+
+    # single rules only fire for values given on the command line
+    p, _ = load([])
+    assert (p["expected_size"], p["resolution"], p["region"]) == (100, 0.5, "none")
+    assert p.getOverrideTrace() == []
+
+    p, _ = load(["--model", "GFS5"])
+    assert (p["expected_size"], p["resolution"]) == (200, 0.25)
+    assert p.getOverrideTrace() == [({"model": "GFS5"}, {"expected_size": 200, "resolution": 0.25})]
+
+    # a compound rule needs all of its conditions, and wins over the single ones
+    p, _ = load(["--model", "GFS5", "--site", "boulder"])
+    assert (p["expected_size"], p["resolution"], p["region"]) == (250, 0.25, "none"), p.opt
+    assert p.getOverrideTrace() == [({"model": "GFS5"}, {"expected_size": 200, "resolution": 0.25}),
+                                    ({"model": "GFS5", "site": "boulder"}, {"expected_size": 250})]
+    p, _ = load(["--model", "GFS5", "--site", "denver"])
+    assert (p["expected_size"], p["region"]) == (200, "denver metro"), p.opt
+    p, _ = load(["--site", "denver"])
+    assert (p["expected_size"], p["region"]) == (100, "front range"), p.opt
+
+    # the command line value itself still wins over any rule
+    p, _ = load(["--model", "GFS5", "--site", "boulder", "--expected_size", "7"])
+    assert p["expected_size"] == 7
+
+    # two single rules setting one parameter: the later one wins, with a warning
+    p, out = load(["--model", "GFS5", "--forecastHour", "12"])
+    assert p["expected_size"] == 300
+    assert "WARNING: conflicting _config_override rules for expected_size: model == 'GFS5' sets 200, " \
+           "forecastHour == 12 sets 300.  Using 300" in out, out
+    assert [c[0] for c in p.override_conflicts] == ["expected_size"]
+    # a more specific rule settles it
+    p, out = load(["--model", "GFS5", "--forecastHour", "12", "--site", "boulder"])
+    assert p["expected_size"] == 250 and "WARNING" not in out and p.override_conflicts == [], out
+    assert [conditions for conditions, _ in p.getOverrideTrace()] == \
+        [{"model": "GFS5"}, {"forecastHour": 12}, {"model": "GFS5", "site": "boulder"}]
+
+    # the same value from two rules is not a conflict
+    p, out = load(["--model", "GFS5", "--site", "denver"],
+                  defaults=defaultParams + '_config_override["site"]["denver"]["resolution"] = 0.25\n')
+    assert "WARNING" not in out and p["resolution"] == 0.25
+
+    # the trace is printed with doDebug
+    p, out = load(["--model", "GFS5"], doDebug=True)
+    assert "_config_override: model == 'GFS5' (on the cmd line), so overriding " \
+           "{'expected_size': 200, 'resolution': 0.25}" in out, out
+
+    # a compound rule needs one value per condition
+    try:
+        cm_module._compile_overrides({("model", "site"): {"GFS5": {"x": 1}}})
+    except ValueError as e:
+        assert "expected one value for each of" in str(e), e
+    else:
+        raise AssertionError("no ValueError")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
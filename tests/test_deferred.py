@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+'''
+_config_deferred(): a deferred default is not computed when the config file or the command line gives the
+parameter, it is computed from the final values of the parameters it uses (after --dataDir, -c and
+_config_override), deferred parameters using each other are computed in dependency order and a cycle is an
+error, and with type= the parameter gets a --name option.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+import os
+dataDir = "/data"
+model = "GFS4"
+
+_config_override["model"]["GFS5"]["dataDir"] = "/data5"
+
+# uses outDir, which comes after it
+@_config_deferred
+def outFile():
+    return os.path.join(outDir, "out.txt")
+
+@_config_deferred
+def outDir():
+    return os.path.join(dataDir, model.lower())
+
+@_config_deferred(type=str)
+def stationFile():
+    raise RuntimeError("stationFile was computed")
+
+nRetries = _config_deferred(lambda: 1 // 0, type=int)
+"""
+
+
+def load(argv, defaults=defaultParams):
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return ConfigMaster(defaults, __doc__, argv=argv, add_default_logging=False)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write('dataDir = "/config"\nstationFile = "stations.txt"\n')
+
+    # stationFile and nRetries raise if they are computed: the config file and the cmd line give them
+    p = load(["-c", config_file, "--nRetries", "3"])
+    assert (p["stationFile"], p["nRetries"]) == ("stations.txt", 3), p.opt
+    assert (p["outDir"], p["outFile"]) == ("/config/gfs4", "/config/gfs4/out.txt"), p.opt
+    p = load(["--stationFile", "cmd.txt", "--nRetries", "2", "--dataDir", "/cmd"])
+    assert (p["stationFile"], p["nRetries"]) == ("cmd.txt", 2), p.opt
+    assert p["outFile"] == "/cmd/gfs4/out.txt", p.opt
+
+    # recomputed from the values set by _config_override, and by the cmd line over the config file
+    p = load(["-c", config_file, "--nRetries", "3", "--model", "GFS5"])
+    assert p["outFile"] == "/data5/gfs5/out.txt", p.opt
+    p = load(["-c", config_file, "--nRetries", "3", "--dataDir", "/cmd"])
+    assert p["outFile"] == "/cmd/gfs4/out.txt", p.opt
+    assert p.resolveOverrides({"dataDir": "/sweep"})["outFile"] == "/sweep/gfs4/out.txt"
+    # the deferred default itself can be overridden, its dependents use that value
+    with open(config_file, "a") as fh:
+        fh.write('outDir = "/fixed"\n')
+    p = load(["-c", config_file, "--nRetries", "3", "--model", "GFS5"])
+    assert (p["outDir"], p["outFile"]) == ("/fixed", "/fixed/out.txt"), p.opt
+
+    # computed when nothing gives it
+    try:
+        load(["-c", config_file, "--stationFile", "x"])
+    except ZeroDivisionError:
+        pass
+    else:
+        raise AssertionError("nRetries was not computed")
+
+    # only the parameters with a type get a --name option
+    try:
+        load(["-c", config_file, "--nRetries", "3", "--outDir", "/cmd"])
+    except SystemExit as e:
+        assert e.code == 2, e.code
+    else:
+        raise AssertionError("--outDir was accepted")
+
+    # a cycle
+    try:
+        load([], "a = _config_deferred(lambda: b + 1)\n"
+                 "b = _config_deferred(lambda: c + 1)\n"
+                 "c = _config_deferred(lambda: a)\n")
+    except RecursionError as e:
+        assert "a -> b -> c -> a" in str(e), e
+    else:
+        raise AssertionError("no RecursionError")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+'''
+dumpParams() and --dump_resolved: every format copes with keys that are not strings and with inf and nan, the
+JSON output is valid JSON, and a dump that fails leaves no temp file behind and doesn't stop init().
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+
+defaultParams = """
+d = {(1, 2): 3, None: [float("nan")], 4: {"x": float("inf")}}
+x = float("-inf")
+values = (1.5, float("nan"))
+name = "GFS4"
+"""
+
+
+def not_json(constant):
+    raise AssertionError(f"not JSON: {constant}")
+
+
+class Unprintable:
+    def __repr__(self):
+        raise RuntimeError("no repr")
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+
+    p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+
+    out = io.StringIO()
+    p.dumpParams(out, "json")
+    dumped = json.loads(out.getvalue(), parse_constant=not_json)
+    assert dumped["d"] == {"(1, 2)": 3, "None": ["nan"], "4": {"x": "inf"}}, dumped
+    assert dumped["x"] == "-inf" and dumped["values"] == [1.5, "nan"] and dumped["name"] == "GFS4", dumped
+
+    out = io.StringIO()
+    p.dumpParams(out, "lines")
+    lines = dict(line.split("\t", 1) for line in out.getvalue().splitlines())
+    assert json.loads(lines["d"]) == dumped["d"] and json.loads(lines["x"]) == "-inf", lines
+
+    out = io.StringIO()
+    p.dumpParams(out, "python")
+    assert "# d = {(1, 2): 3" in out.getvalue() and "x = float('-inf')" in out.getvalue(), out.getvalue()
+
+    # --dump_resolved writes the file
+    path = os.path.join(tmp_dir, "resolved.json")
+    with contextlib.redirect_stdout(io.StringIO()):
+        ConfigMaster(defaultParams, __doc__, argv=["--dump_resolved", path], add_default_logging=False)
+    with open(path) as fh:
+        assert json.load(fh)["d"] == dumped["d"]
+
+    # a failed dump: an error, no temp file, and the parameters are there
+    p["bad"] = Unprintable()
+    path = os.path.join(tmp_dir, "failed.json")
+    try:
+        p.dumpResolvedParams(path)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("no RuntimeError")
+    assert sorted(set(os.listdir(tmp_dir)) - {"cache"}) == ["resolved.json"], os.listdir(tmp_dir)
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        q = ConfigMaster(defaultParams + "bad = __import__('__main__').Unprintable()\n", __doc__,
+                         argv=["--dump_resolved", path], add_default_logging=False, allow_extra_parameters=True)
+    assert "ERROR: could not write the resolved parameters to" in out.getvalue(), out.getvalue()
+    assert q["name"] == "GFS4"
+    assert sorted(set(os.listdir(tmp_dir)) - {"cache"}) == ["resolved.json"], os.listdir(tmp_dir)
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+'''
+Parameters stored in array files with _config_external(): loaded on first use, shown as a reference by
+printParams(), and only the reference is pickled.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import pickle
+import struct
+import tempfile
+
+defaultParams = """
+# grid coordinates, (3, 2) float64
+grid = _config_external("grid.npy")
+
+# thresholds, raw float32
+thresholds = _config_external("thresholds.bin", dtype="f", shape=(2, 3))
+
+stations = None
+"""
+
+
+def write_npy(path, descr, fmt, shape, values):
+    header = repr({"descr": descr, "fortran_order": False, "shape": shape})
+    header += " " * (63 - (10 + len(header)) % 64) + "\n"
+    with open(path, "wb") as fh:
+        fh.write(b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        fh.write(struct.pack(f"<{len(values)}{fmt}", *values))
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    os.makedirs(os.path.join(tmp_dir, "conf"))
+    write_npy(os.path.join(tmp_dir, "grid.npy"), "<f8", "d", (3, 2), [0.5, 1, 2, 3, 4, 5.5])
+    write_npy(os.path.join(tmp_dir, "conf", "stations.npy"), "<i4", "i", (4,), [7, 8, 9, 10])
+    with open(os.path.join(tmp_dir, "thresholds.bin"), "wb") as fh:
+        fh.write(struct.pack("<6f", *range(6)))
+    config_file = os.path.join(tmp_dir, "conf", "config.py")
+    with open(config_file, "w") as fh:
+        # relative to the config file
+        fh.write('stations = _config_external("stations.npy")\n')
+
+    os.chdir(tmp_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+
+    # nothing is loaded until it is used
+    assert p.opt["grid"]._value is None
+    params = p.getParamsString()
+    assert "grid : _config_external(" in params and "0.5" not in params, params
+
+    assert p["grid"].tolist() == [[0.5, 1.0], [2.0, 3.0], [4.0, 5.5]], p["grid"].tolist()
+    assert p["grid"][2, 1] == 5.5
+    assert p["thresholds"].tolist() == [[0.0, 1.0, 2.0], [3.0, 4.0, 5.0]], p["thresholds"].tolist()
+    assert p["stations"].tolist() == [7, 8, 9, 10], p["stations"].tolist()
+    assert p["grid"] is p["grid"], "the file is mapped once"
+    assert p.getParamsString() == params
+
+    copy = pickle.loads(pickle.dumps(p.opt["grid"]))
+    assert copy == p.opt["grid"] and copy._value is None
+    assert p.freeze().stations.tolist() == [7, 8, 9, 10]
+
+    print("external params ok")
+
+
+if __name__ == "__main__":
+    main()
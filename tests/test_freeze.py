@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+'''
+freeze(): the parameters of the snapshot can't be changed, '_' derived values can be set and read as attributes
+and with [], names that can't be attributes (not identifiers, keywords) are derived values too, and the snapshot
+pickles.
+'''
+from ConfigMaster import ConfigMaster, FrozenParams, _make_frozen_params
+
+import contextlib
+import io
+import os
+import pickle
+import tempfile
+
+defaultParams = """
+import os
+forecastHour = 4
+dataDir = "/data"
+stations = ["KBOU", "KDEN"]
+_scratchDir = os.path.join(dataDir, "scratch")
+"""
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=["--forecastHour", "6"], add_default_logging=False)
+    p.opt["grid-spacing"] = 3.0
+    p.opt["class"] = "A"
+    cfg = p.freeze()
+    assert isinstance(cfg, FrozenParams)
+    assert (cfg.forecastHour, cfg.dataDir, cfg["stations"]) == (6, "/data", ["KBOU", "KDEN"]), cfg
+
+    # parameters can't be changed, by attribute or []
+    for change in (lambda: setattr(cfg, "forecastHour", 7), lambda: cfg.__setitem__("dataDir", "/x"),
+                   lambda: delattr(cfg, "dataDir"), lambda: setattr(cfg, "newParam", 1)):
+        try:
+            change()
+        except AttributeError:
+            pass
+        else:
+            raise AssertionError("a frozen parameter was changed")
+    assert (cfg.forecastHour, cfg.dataDir) == (6, "/data") and "newParam" not in cfg
+    try:
+        cfg.noSuchParam
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("no AttributeError")
+    try:
+        cfg["noSuchParam"]
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("no KeyError")
+
+    # derived values: set and read both ways
+    assert cfg._scratchDir == cfg["_scratchDir"] == "/data/scratch"
+    cfg._newDir = os.path.join(cfg.dataDir, "new")
+    assert cfg["_newDir"] == "/data/new"
+    cfg["_count"] = 2
+    assert cfg._count == 2
+    del cfg._count
+    assert "_count" not in cfg
+
+    # the keys that can't be attributes
+    assert vars(cfg._derived) == {"_scratchDir": "/data/scratch", "grid-spacing": 3.0, "class": "A",
+                                  "_newDir": "/data/new"}, vars(cfg._derived)
+    assert (cfg["grid-spacing"], cfg["class"]) == (3.0, "A")
+    assert cfg._fields == ("forecastHour", "dataDir", "stations"), cfg._fields
+
+    # the mapping interface
+    assert "forecastHour" in cfg and "_newDir" in cfg and "class" in cfg and "os" not in cfg
+    assert "_config_override" not in cfg
+    assert list(cfg) == ["forecastHour", "dataDir", "stations", "_scratchDir", "grid-spacing", "class", "_newDir"]
+    assert len(cfg) == 7
+    assert cfg._asdict() == {"forecastHour": 6, "dataDir": "/data", "stations": ["KBOU", "KDEN"],
+                             "_scratchDir": "/data/scratch", "grid-spacing": 3.0, "class": "A",
+                             "_newDir": "/data/new"}, cfg._asdict()
+
+    # pickles through _make_frozen_params, with the same generated class for the same names
+    reduced = cfg.__reduce__()
+    assert reduced[0] is _make_frozen_params, reduced
+    copy = pickle.loads(pickle.dumps(cfg))
+    assert type(copy) is type(cfg) and copy._asdict() == cfg._asdict(), copy
+    copy._other = 1
+    assert "_other" not in cfg
+    try:
+        copy.forecastHour = 1
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError("a frozen parameter was changed after unpickling")
+    assert type(p.freeze()) is type(cfg)
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+'''
+Config files fetched over http (-c http://...): the connection is kept open between loads, an unchanged source
+costs one conditional request, includes are relative to the URL, and a server that is down or too slow falls back
+to the cached copy.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import hashlib
+import http.server
+import io
+import os
+import tempfile
+import threading
+import time
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+site = "boulder"
+"""
+
+# path -> body served, and what the server saw
+sources = {}
+seen = {"requests": 0, "conditional": 0, "connections": 0}
+authorization = []
+delay = {"seconds": 0}
+down = threading.Event()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        seen["connections"] += 1
+
+    def do_GET(self):
+        if down.is_set():
+            # like a server going away: the open connection is dropped without an answer
+            self.close_connection = True
+            return
+        seen["requests"] += 1
+        authorization.append(self.headers.get("Authorization"))
+        time.sleep(delay["seconds"])
+        body = sources.get(self.path)
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = body.encode()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        if self.headers.get("If-None-Match") == etag:
+            seen["conditional"] += 1
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def load(url):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-c", url], add_default_logging=False)
+    return p, out.getvalue()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    ConfigMaster.use_layer_cache = True
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    url = base + "/configs/site.py"
+    sources["/configs/site.py"] = 'model = "GFS5"\n_config_include("common/hours.py")\n'
+    sources["/configs/common/hours.py"] = "forecastHour = 12\n"
+
+    p, _ = load(url)
+    assert (p["model"], p["forecastHour"]) == ("GFS5", 12), p.opt
+    assert p.getConfigFilePaths() == [url]
+    assert seen == {"requests": 2, "conditional": 0, "connections": 1}, seen
+
+    # unchanged: one conditional request per source, over the connection already open
+    p, _ = load(url)
+    assert p.layer_timings[-1]["cached"]
+    assert (p["model"], p["forecastHour"]) == ("GFS5", 12)
+    assert seen == {"requests": 4, "conditional": 2, "connections": 1}, seen
+    assert not p.configFilesChanged()
+
+    # changed on the server
+    sources["/configs/common/hours.py"] = "forecastHour = 18\n"
+    assert p.configFilesChanged()
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert p.reloadConfig() == {"forecastHour": (12, 18)}
+
+    # headers belong to the instance they were set on
+    p = ConfigMaster()
+    p.setDefaultParams(defaultParams)
+    p.http_headers["Authorization"] = "Bearer abc"
+    del authorization[:]
+    with contextlib.redirect_stdout(io.StringIO()):
+        p.init(__doc__, argv=["-c", url], add_default_logging=False)
+    load(url)
+    assert authorization == ["Bearer abc", "Bearer abc", None, None], authorization
+    assert ConfigMaster.http_headers is None
+
+    # within http_max_age no request at all
+    ConfigMaster.http_max_age = 60
+    try:
+        before = seen["requests"]
+        load(url)
+        p, _ = load(url)
+        assert seen["requests"] == before, seen
+        assert p["forecastHour"] == 18 and p.getHTTPStats()["fresh"] >= 4
+    finally:
+        ConfigMaster.http_max_age = 0.0
+
+    # too slow: the cached copy, with a warning
+    ConfigMaster.http_timeout = 0.2
+    delay["seconds"] = 1
+    try:
+        p, out = load(url)
+    finally:
+        ConfigMaster.http_timeout = 10.0
+        delay["seconds"] = 0
+    assert (p["model"], p["forecastHour"]) == ("GFS5", 18)
+    assert f"WARNING: could not fetch {url}" in out, out
+
+    # missing on the server
+    try:
+        load(base + "/configs/missing.py")
+    except FileNotFoundError as e:
+        assert "missing.py" in str(e)
+    else:
+        raise AssertionError("no FileNotFoundError")
+
+    # server down: the cached copy, with a warning
+    down.set()
+    server.shutdown()
+    server.server_close()
+    stale = ConfigMaster.http_stats["stale"]
+    p, out = load(url)
+    assert (p["model"], p["forecastHour"]) == ("GFS5", 18)
+    assert f"WARNING: could not fetch {url}" in out, out
+    assert p.getHTTPStats()["stale"] >= stale + 1
+    # a source that was never fetched can't be loaded
+    try:
+        load(base + "/configs/never.py")
+    except OSError:
+        pass
+    else:
+        raise AssertionError("no OSError")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+'''
+The layer cache.  Off by default: every init() evaluates its config files again (a file listing a directory sees
+a new file), os.environ is left alone, and a layer included by several config files is evaluated once per init().
+Turned on: an unchanged config file comes from the cache, but not once an environment variable it read (itself
+or through a file it includes, evaluated or cached) has a different value.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+site = "none"
+dataDir = "/data"
+model = "GFS4"
+forecastHour = 0
+"""
+
+site_config = """
+import os
+site = os.environ.get("CM_LAYER_SITE", "boulder")
+"""
+
+run_config = """
+_config_include("site.py")
+dataDir = "/data/" + site
+model = os.environ["CM_LAYER_MODEL"] if "CM_LAYER_MODEL" in os.environ else "GFS4"
+"""
+
+count_config = """
+import os
+forecastHour = len(os.listdir(os.path.join(os.path.dirname(os.path.abspath(__file__ + ".py")), "data")))
+model = type(os.environ).__name__
+"""
+
+
+def load(*config_files, layer_cache=True):
+    argv = [token for config_file in config_files for token in ("-c", config_file)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=argv, add_default_logging=False, layer_cache=layer_cache)
+    return p, {os.path.basename(t["path"]): t["cached"] for t in p.layer_timings}
+
+
+def main():
+    environ = os.environ
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    for var in ("CM_LAYER_SITE", "CM_LAYER_MODEL"):
+        os.environ.pop(var, None)
+    site = os.path.join(tmp_dir, "site.py")
+    run = os.path.join(tmp_dir, "run.py")
+    other = os.path.join(tmp_dir, "other.py")
+    count = os.path.join(tmp_dir, "count.py")
+    for path, text in ((site, site_config), (run, "import os\n" + run_config),
+                       (other, '_config_include("site.py")\nforecastHour = 6\n'), (count, count_config)):
+        with open(path, "w") as fh:
+            fh.write(text)
+    os.mkdir(os.path.join(tmp_dir, "data"))
+
+    # off: evaluated every time, without swapping os.environ
+    assert not ConfigMaster.use_layer_cache
+    os.chdir(tmp_dir)
+    p, cached = load("count.py", layer_cache=False)
+    assert (p["forecastHour"], p["model"]) == (0, "_Environ") and cached == {"count.py": False}, (p.opt, cached)
+    open(os.path.join(tmp_dir, "data", "f1"), "w").close()
+    p, cached = load("count.py", layer_cache=False)
+    assert p["forecastHour"] == 1 and cached == {"count.py": False}, (p.opt, cached)
+    assert ConfigMaster._layer_cache == {}
+    # ... but site.py, included by both config files, is evaluated once
+    p, _ = load(run, other, layer_cache=False)
+    assert [(os.path.basename(t["path"]), t["cached"]) for t in p.layer_timings] == \
+        [("site.py", False), ("run.py", False), ("site.py", True), ("other.py", False)], p.layer_timings
+    assert (p["dataDir"], p["forecastHour"]) == ("/data/boulder", 6), p.opt
+    # and the layers of one init() only
+    p, _ = load(site, layer_cache=False)
+    assert len(p.layer_timings) == 1 and len(p.config_deps) == 1, p.layer_timings
+
+    p, cached = load(site)
+    assert p["site"] == "boulder" and cached == {"site.py": False}, cached
+    p, cached = load(site)
+    assert cached == {"site.py": True}, cached
+
+    # the cached site.py is included: run.py depends on CM_LAYER_SITE too
+    p, cached = load(run)
+    assert cached == {"run.py": False, "site.py": True}, cached
+    assert (p["site"], p["dataDir"], p["model"]) == ("boulder", "/data/boulder", "GFS4")
+    p, cached = load(run)
+    assert cached == {"run.py": True}, cached
+
+    os.environ["CM_LAYER_SITE"] = "denver"
+    p, cached = load(run)
+    assert cached == {"run.py": False, "site.py": False}, cached
+    assert (p["site"], p["dataDir"]) == ("denver", "/data/denver"), p.opt
+    p, cached = load(run)
+    assert cached == {"run.py": True} and p["dataDir"] == "/data/denver", cached
+
+    # a variable that wasn't set when the layer was evaluated
+    os.environ["CM_LAYER_MODEL"] = "GFS5"
+    p, cached = load(run)
+    assert cached == {"run.py": False, "site.py": True} and p["model"] == "GFS5", cached
+
+    # other variables don't matter
+    os.environ["CM_LAYER_UNRELATED"] = "x"
+    p, cached = load(run)
+    assert cached == {"run.py": True}, cached
+    # the real os.environ is back after each evaluation
+    assert os.environ is environ
+
+    ConfigMaster.clearLayerCache()
+    p, cached = load(run)
+    assert cached == {"run.py": False, "site.py": False}, cached
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
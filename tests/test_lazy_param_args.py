@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+'''
+Check that parsing with only the options named on the cmd line (lazy_param_args) gives the same parameters,
+args, help and error messages as the full parser.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+forecastHour = 4
+threshold = 0.5
+model = "GFS"
+modelName = "GFS3"
+test = True
+verbose = False
+files = [1, 2]
+"""
+
+CMD_LINES = [
+    [],
+    ["--forecastHour", "7"],
+    ["--forecastHour=-3"],
+    ["--threshold", "-1.5"],
+    ["--no-test", "--verbose"],
+    ["--model", "A", "--modelName", "B"],
+    ["--mod", "A"],                 # abbreviation
+    ["--forecastHour", "x"],        # bad int
+    ["--files", "1"],               # list params have no option
+    ["--test", "--no-test"],        # mutually exclusive
+    ["-h"],
+    ["--bogus"],
+    ["--forecastHour"],             # missing value
+    ["--model", "--", "x"],
+    ["-c", "CONFIG", "--extra", "3", "--forecastHour", "5"],
+    ["-c", "CONFIG", "--forecastHour", "x"],         # error after a config file with an extra param
+    ["--site", "boulder", "--threshold", "x"],      # additional_args
+    ["--site"],
+]
+
+
+def build(argv, lazy):
+    ConfigMaster.lazy_param_args = lazy
+    out, err = io.StringIO(), io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            p = ConfigMaster(defaultParams, __doc__, argv=argv, add_default_logging=True, allow_extra_parameters=True,
+                             additional_args=[(["--site"], {"help": "The site."})])
+        # params left out of the lazy parser are not in vars(p.args), but read as None
+        result = (dict(p.opt), {k: v for k, v in vars(p.args).items() if v is not None},
+                  {k: getattr(p.args, k, "missing") for k in p.opt})
+    except SystemExit as e:
+        result = ("exit", e.code)
+    return result, out.getvalue(), err.getvalue()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write("forecastHour = 9\nextraParam = 2\n")
+
+    try:
+        for argv in CMD_LINES:
+            argv = [config_file if a == "CONFIG" else a for a in argv]
+            lazy = build(argv, True)
+            full = build(argv, False)
+            assert lazy == full, f"{argv}:\n  lazy {lazy}\n  full {full}"
+    finally:
+        ConfigMaster.lazy_param_args = True
+
+    print(f"lazy and full parsers agree on {len(CMD_LINES)} cmd lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+'''
+Config files whose top-level `name = literal` assignments are set without running them (literal_fast_path):
+the result is the same as running the whole file, errors point at the right line, and __file__ is only
+replaced where it is used as a variable.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+name = ""
+where = ""
+a = []
+b = []
+c = 0.0
+d = {}
+e = 0.0
+f = 0
+"""
+
+config = '''# this comment mentions __file__
+name = "__file__ is only a string here"
+where = __file__
+a = b = [1, 2]
+a.append(3)
+c = -4.5
+d = {"x": (1, 2), "y": {1, 2}, "z": None}
+e = c * 2
+f = 1
+f += 1
+'''
+
+
+def load(config_file, fast_path=True, defaults=defaultParams):
+    ConfigMaster.clearLayerCache()
+    ConfigMaster.literal_fast_path = fast_path
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out):
+            p = ConfigMaster(defaults, __doc__, argv=["-c", config_file], add_default_logging=False)
+    finally:
+        ConfigMaster.literal_fast_path = True
+    return p, out.getvalue()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    ConfigMaster.use_layer_cache = True
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write(config)
+
+    names = [n for n in ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False).opt
+             if not n.startswith("_")]
+    fast, _ = load(config_file)
+    slow, _ = load(config_file, fast_path=False)
+    for n in names:
+        assert fast[n] == slow[n] and type(fast[n]) == type(slow[n]), (n, fast[n], slow[n])
+    assert fast["name"] == "__file__ is only a string here", fast["name"]
+    assert fast["where"] == "config", fast["where"]
+    assert fast["a"] == [1, 2, 3] and fast["a"] is fast["b"]
+    assert (fast["e"], fast["f"]) == (-9.0, 2)
+
+    # from the layer cache: the same values, and a copy that can be changed without affecting the next load
+    with contextlib.redirect_stdout(io.StringIO()):
+        first = ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+        first["d"]["x"] = "changed"
+        second = ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+    assert second.layer_timings[-1]["cached"]
+    assert second["d"] == {"x": (1, 2), "y": {1, 2}, "z": None}, second["d"]
+    assert second["a"] is second["b"]
+
+    # a pure literal file comes back from the layer cache in file order, extras included
+    literal_file = os.path.join(tmp_dir, "literal.py")
+    with open(literal_file, "w") as fh:
+        fh.write("extra2 = 2\nf = 7\n\nextra1 = [1.5, 'x', b'y', 3j]\n")
+    ConfigMaster.allow_extra_parameters = True
+    try:
+        p, out = load(literal_file)
+        assert "configuration file {}, line 4: extra1".format(literal_file) in out, out
+        with contextlib.redirect_stdout(io.StringIO()):
+            again = ConfigMaster(defaultParams, __doc__, argv=["-c", literal_file], add_default_logging=False)
+        assert again.layer_timings[-1]["cached"]
+        assert [k for k in again.opt if k.startswith("extra")] == ["extra2", "extra1"]
+        assert again["extra1"] == [1.5, "x", b"y", 3j] and again["f"] == 7
+    finally:
+        ConfigMaster.allow_extra_parameters = False
+
+    # errors name the line of the config file
+    bad_file = os.path.join(tmp_dir, "bad.py")
+    with open(bad_file, "w") as fh:
+        fh.write("f = 1\nd = {1: [2,\n 3]}\nc = undefined_name + 1\n")
+    try:
+        load(bad_file)
+    except NameError:
+        pass
+    else:
+        raise AssertionError("no NameError")
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            ConfigMaster(defaultParams, __doc__, argv=["-c", bad_file], add_default_logging=False)
+        except NameError:
+            pass
+    assert f"FAIL: exec of {bad_file}, line 4: c = undefined_name + 1" in out.getvalue(), out.getvalue()
+
+    with open(bad_file, "w") as fh:
+        fh.write("f = 1\n\nf = (\n")
+    try:
+        load(bad_file)
+    except SyntaxError as e:
+        assert e.filename == bad_file and e.lineno == 3, (e.filename, e.lineno)
+    else:
+        raise AssertionError("no SyntaxError")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+'''
+ConfigRegistry: one ConfigMaster per defaults + config files + overrides, built once, evicted least recently used
+first by count and by estimated size, concurrent builds of the same configuration coalesced.
+'''
+from ConfigMaster import ConfigRegistry
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+site = "boulder"
+stations = []
+_config_schema["forecastHour"] = {"type": int, "min": 0, "max": 384}
+"""
+
+# evaluating it takes a while, so concurrent get()s overlap
+slow_config = """
+import threading
+threading.Event().wait(0.3)
+site = "fort collins"
+"""
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    files = {}
+    for site in ("boulder", "denver", "golden"):
+        files[site] = os.path.join(tmp_dir, f"{site}.py")
+        with open(files[site], "w") as fh:
+            fh.write(f"site = {site!r}\nstations = {[f'{site}{i}' for i in range(20)]!r}\n")
+    big = os.path.join(tmp_dir, "big.py")
+    with open(big, "w") as fh:
+        fh.write(f"stations = {[f'station{i}' for i in range(20000)]!r}\n")
+    slow = os.path.join(tmp_dir, "slow.py")
+    with open(slow, "w") as fh:
+        fh.write(slow_config)
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        registry = ConfigRegistry(defaultParams, max_entries=2)
+        boulder = registry.get(files["boulder"])
+        assert boulder["site"] == "boulder" and registry.get([files["boulder"]]) is boulder
+        gfs5 = registry.get(files["boulder"], overrides={"model": "GFS5", "forecastHour": 12})
+        assert (gfs5["model"], gfs5["forecastHour"], gfs5["site"]) == ("GFS5", 12, "boulder")
+        assert gfs5 is not boulder and boulder["model"] == "GFS4"
+
+        # least recently used goes first
+        registry.get(files["boulder"])
+        registry.get(files["denver"])
+        assert files["boulder"] in registry and len(registry) == 2
+        assert registry.get(files["boulder"], overrides={"model": "GFS5", "forecastHour": 12}) is not gfs5
+
+        stats = registry.getStats()
+        assert (stats["hits"], stats["misses"], stats["builds"], stats["evictions"]) == (2, 4, 4, 2), stats
+        assert stats["hit_rate"] == 2 / 6 and stats["entries"] == 2
+        report = registry.getEntryReport()
+        assert [r["files"] for r in report] == [(files["boulder"],), (files["denver"],)], report
+        assert report[0]["overrides"] == {"model": "GFS5", "forecastHour": 12}
+        assert all(r["bytes"] > 0 for r in report) and stats["bytes"] == sum(r["bytes"] for r in report)
+        # the argparse parser is dropped after the build, it would be most of the estimate
+        assert boulder.parser is None and report[1]["bytes"] < 20000, report
+
+        # by size: the least recently used go until the rest fit
+        small_bytes = report[1]["bytes"]
+        registry = ConfigRegistry(defaultParams, max_entries=None)
+        for site in ("boulder", "denver", "golden"):
+            registry.get(files[site])
+        big_config = registry.get(big)
+        big_bytes = registry.getEntryReport()[0]["bytes"]
+        assert big_bytes > small_bytes * 10, (big_bytes, small_bytes)
+        registry.max_bytes = big_bytes + small_bytes * 3 // 2
+        registry.get(files["boulder"], overrides={"model": "GFS5"})
+        stats = registry.getStats()
+        assert stats["size_evictions"] == 3 and stats["entries"] == 2, stats
+        assert big in registry and files["golden"] not in registry
+        # too big on its own: returned, not kept
+        registry.max_bytes = small_bytes * 2
+        assert registry.get(big, overrides={"model": "GFS5"})["stations"] is not None
+        assert registry.getStats()["oversize"] == 1
+        assert big_config["stations"][-1] == "station19999"
+
+        # concurrent get()s of one configuration build it once
+        registry = ConfigRegistry(defaultParams)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get(slow))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(results) == 4 and all(r is results[0] for r in results) and results[0]["site"] == "fort collins"
+        stats = registry.getStats()
+        assert stats["builds"] == 1 and stats["coalesced"] == 3, stats
+
+        # a changed config file is rebuilt after discardChanged()
+        first = registry.get(files["golden"])
+        with open(files["golden"], "w") as fh:
+            fh.write("site = 'golden, co'\n")
+        assert registry.discardChanged() == 1
+        assert registry.get(files["golden"])["site"] == "golden, co"
+        assert registry.discard(files["golden"]) and not registry.discard(files["golden"])
+        assert first["site"] == "golden"
+
+        # a bad configuration raises instead of exiting, and isn't kept
+        for overrides, message in (({"forecastHour": 999}, "forecastHour: 999 is more than the maximum 384"),
+                                   ({"nosuch": 1}, "Invalid parameter in overrides: nosuch")):
+            try:
+                registry.get(files["denver"], overrides=overrides)
+            except ValueError as e:
+                assert message in str(e), e
+            else:
+                raise AssertionError("no ValueError")
+        bad = os.path.join(tmp_dir, "bad.py")
+        with open(bad, "w") as fh:
+            fh.write("forecastHour = -1\n")
+        try:
+            registry.get(bad)
+        except ValueError as e:
+            assert "exit code 1" in str(e), e
+        else:
+            raise AssertionError("no ValueError")
+        assert registry.getStats()["build_errors"] == 3 and bad not in registry
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+'''
+reloadConfig(), checkConfigFiles() and watchConfigFiles(): a changed config file is reloaded (once it stopped
+changing), a config that can't be loaded or has invalid values keeps the old ones, a failing callback doesn't stop
+the others, and stopWatching() stops the watcher thread.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+_config_schema["forecastHour"] = {"type": int, "min": 0, "max": 384}
+"""
+
+
+def write(path, text):
+    with open(path, "w") as fh:
+        fh.write(text)
+    # a new mtime even on filesystems with coarse timestamps
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9 * write.bump))
+    write.bump += 1
+
+
+write.bump = 1
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    config_file = os.path.join(tmp_dir, "config.py")
+    write(config_file, "forecastHour = 6\n")
+
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+        p["_derived"] = "kept"
+        calls = []
+
+        def failing(cm, changed):
+            raise RuntimeError("callback failed")
+
+        p.addReloadCallback(failing)
+        p.addReloadCallback(lambda cm, changed: calls.append(changed))
+
+        # change -> reload, callbacks run in order, a failing one doesn't stop the next
+        assert p.checkConfigFiles() == {}
+        write(config_file, "forecastHour = 12\nmodel = 'GFS5'\n")
+        assert p.configFilesChanged()
+        changed = p.checkConfigFiles()
+        assert changed == {"forecastHour": (6, 12), "model": ("GFS4", "GFS5")}, changed
+        assert calls == [changed] and p["_derived"] == "kept"
+        assert "WARNING: reload callback" in out.getvalue() and "callback failed" in out.getvalue()
+        assert not p.configFilesChanged() and p.checkConfigFiles() == {}
+
+        # a file that doesn't load, and invalid values: the old values stay, and no retry until it changes again
+        for text in ("forecastHour = (\n", "forecastHour = 999\n"):
+            write(config_file, text)
+            assert p.checkConfigFiles() == {}
+            assert p["forecastHour"] == 12 and not p.configFilesChanged()
+        assert p.getReloadMetrics()["reload_errors"] == 2 and p.getReloadMetrics()["reloads"] == 1
+        assert len(calls) == 1
+
+        # a file that is still being written is loaded once it is complete
+        p.reload_settle_seconds = 0.2
+        write(config_file, "forecastHour = 24\n")
+
+        def finish():
+            time.sleep(0.1)
+            write(config_file, "forecastHour = 24\nmodel = 'GFS4'\n")
+
+        writer = threading.Thread(target=finish)
+        writer.start()
+        changed = p.checkConfigFiles()
+        writer.join()
+        assert changed == {"forecastHour": (12, 24), "model": ("GFS5", "GFS4")}, changed
+        assert p.getReloadMetrics()["reload_errors"] == 2
+
+        # the watcher thread, with and without inotify
+        for use_inotify in (True, False):
+            p.reload_settle_seconds = 0.05
+            p.watchConfigFiles(interval=0.1, use_inotify=use_inotify)
+            thread = p._watcher[0]
+            assert thread.is_alive()
+            hour = 30 + use_inotify
+            write(config_file, f"forecastHour = {hour}\n")
+            assert wait_for(lambda: p["forecastHour"] == hour), p["forecastHour"]
+            assert calls[-1]["forecastHour"][1] == hour
+            metrics = p.getReloadMetrics()
+            assert metrics["polls"] > 0 and metrics["last_reload_seconds"] > 0
+
+            p.stopWatching()
+            assert not thread.is_alive() and p._watcher is None
+            write(config_file, "forecastHour = 1\n")
+            time.sleep(0.5)
+            assert p["forecastHour"] == hour
+            assert p.checkConfigFiles() == {"forecastHour": (hour, 1)}
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+'''
+The resolved configuration cache: a second identical run is a hit, a change to an environment variable the
+config read (however it was read) or to a config file is a miss, and os.environ stays a full os._Environ while
+the reads are recorded.  A hit brings back the schema of the defaults, for reloadConfig(), and the deferred
+defaults, for resolveOverrides().
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+import os
+forecastHour = 4
+dataDir = os.environ.get("CM_TEST_DATA", "/data")
+"""
+
+config = """
+import collections.abc
+import os
+model = os.getenv("CM_TEST_MODEL", "GFS4")
+site = os.environ.setdefault("CM_TEST_SITE", "boulder")
+members = ("CM_TEST_MEMBERS" in os.environ) and int(os.environ["CM_TEST_MEMBERS"]) or 1
+merged = sorted(k for k in (os.environ | {"CM_TEST_EXTRA": "1"}) if k.startswith("CM_TEST_EXTRA"))
+environ_ok = isinstance(os.environ, collections.abc.MutableMapping) and isinstance(os.environ.copy(), dict)
+"""
+
+schemaParams = """
+forecastHour = 4
+_config_schema["forecastHour"] = {"type": int, "min": 0, "max": 384}
+"""
+
+deferredParams = """
+import os.path
+dataDir = "/data"
+forecastHour = 4
+
+@_config_deferred
+def outFile(suffix=".out"):
+    return os.path.join(dataDir, "f%03d" % forecastHour + suffix)
+
+outDir = _config_deferred(lambda: os.path.dirname(outFile), type=str)
+"""
+
+
+def load(config_file, defaults=defaultParams):
+    stats = dict(ConfigMaster.resolved_cache_stats)
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaults, __doc__, argv=["-c", config_file], add_default_logging=False,
+                         resolved_cache=True, allow_extra_parameters=True)
+    hit = ConfigMaster.resolved_cache_stats["hits"] - stats["hits"]
+    miss = ConfigMaster.resolved_cache_stats["misses"] - stats["misses"]
+    assert hit + miss == 1, (hit, miss)
+    assert p.init_timings["resolved_cache_hit"] == bool(hit)
+    return p, bool(hit)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    for var in ("CM_TEST_DATA", "CM_TEST_MODEL", "CM_TEST_SITE", "CM_TEST_MEMBERS", "CM_TEST_UNRELATED"):
+        os.environ.pop(var, None)
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write(config)
+
+    environ = os.environ
+    p, hit = load(config_file)
+    assert not hit
+    assert (p["dataDir"], p["model"], p["site"], p["members"]) == ("/data", "GFS4", "boulder", 1), p.opt
+    assert p["merged"] == ["CM_TEST_EXTRA"] and p["environ_ok"]
+    # the real os.environ is back, and setdefault() went through to it
+    assert os.environ is environ and os.environ["CM_TEST_SITE"] == "boulder"
+
+    p, hit = load(config_file)
+    assert hit and p["model"] == "GFS4"
+
+    # every kind of read is an input: get(), getenv(), in, setdefault() and reading the whole environment
+    for var, value in (("CM_TEST_DATA", "/other"), ("CM_TEST_MODEL", "GFS5"), ("CM_TEST_MEMBERS", "3"),
+                       ("CM_TEST_SITE", "denver")):
+        os.environ[var] = value
+        p, hit = load(config_file)
+        assert not hit, var
+        p, hit = load(config_file)
+        assert hit, var
+    assert (p["dataDir"], p["model"], p["site"], p["members"]) == ("/other", "GFS5", "denver", 3), p.opt
+
+    # os.environ | {...} read all of it, so any variable counts
+    os.environ["CM_TEST_UNRELATED"] = "x"
+    p, hit = load(config_file)
+    assert not hit
+
+    # a changed config file
+    with open(config_file, "a") as fh:
+        fh.write("forecastHour = 12\n")
+    p, hit = load(config_file)
+    assert not hit and p["forecastHour"] == 12
+    p, hit = load(config_file)
+    assert hit and p["forecastHour"] == 12
+    assert os.environ is environ
+
+    # the schema of the defaults is there on a hit too, so a reload is still validated
+    schema_config = os.path.join(tmp_dir, "schema_config.py")
+    with open(schema_config, "w") as fh:
+        fh.write("forecastHour = 6\n")
+    p, hit = load(schema_config, schemaParams)
+    assert not hit
+    p, hit = load(schema_config, schemaParams)
+    assert hit and p.param_schema == {"forecastHour": {"type": int, "min": 0, "max": 384}}, p.param_schema
+    with open(schema_config, "w") as fh:
+        fh.write("forecastHour = 999\n")
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        assert p.reloadConfig() == {}
+    assert p["forecastHour"] == 6 and "999 is more than the maximum 384" in out.getvalue(), out.getvalue()
+
+    # deferred defaults are stored as code, and still computed from the final values after a hit
+    for expected_hit in (False, True):
+        stats = dict(ConfigMaster.resolved_cache_stats)
+        p, hit = load(schema_config, deferredParams)
+        assert hit == expected_hit and ConfigMaster.resolved_cache_stats["uncacheable"] == stats["uncacheable"]
+        assert (p["outFile"], p["outDir"]) == ("/data/f999.out", "/data"), p.opt
+        opt = p.resolveOverrides({"dataDir": "/other", "forecastHour": 6})
+        assert (opt["outFile"], opt["outDir"]) == ("/other/f006.out", "/other"), opt
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+'''
+_config_schema entries in the defaults: the resolved parameters are checked at the end of init(), every problem is
+reported at once, and a reload with invalid values keeps the old ones.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import datetime
+import io
+import os
+import tempfile
+
+defaultParams = """
+import datetime
+
+forecastHour = 6
+_config_schema["forecastHour"] = {"type": int, "min": 0, "max": 384}
+
+model = "GFS4"
+_config_schema["model"] = {"type": str, "choices": ["GFS4", "GFS5"]}
+
+thresholds = [0.5, 1, 2.5]
+_config_schema["thresholds"] = {"type": [float], "min": 0}
+
+levels = {"low": 3, "high": 12}
+_config_schema["levels"] = {"type": {str: int}, "max": 20}
+
+dataDir = "."
+_config_schema["dataDir"] = {"type": str, "path": "dir"}
+
+runTime = "2024010100"
+_config_schema["runTime"] = {"type": str, "format": "%Y%m%d%H"}
+
+start = datetime.datetime(2024, 1, 1)
+_config_schema["start"] = datetime.datetime
+
+debugPlots = False
+_config_schema["debugPlots"] = bool
+
+stations = None
+_config_schema["stations"] = {"type": [str], "allow_none": True}
+"""
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+
+    p = ConfigMaster(defaultParams, __doc__, argv=["--forecastHour", "12"], add_default_logging=False)
+    assert p.validateParams() == []
+    assert "_config_schema" not in p.opt
+    assert p.param_schema["forecastHour"] == {"type": int, "min": 0, "max": 384}
+    assert "validateParams" in p.init_timings["phases"]
+
+    bad = dict(p.opt, forecastHour=400, model="GFS9", thresholds=[1.0, -2.0, "x"], levels={"low": 3, "high": 2.5},
+               dataDir=os.path.join(tmp_dir, "missing"), runTime="2024133100", start="2024-01-01", debugPlots=1,
+               stations=["KDEN", 7])
+    errors = p.validateParams(bad)
+    expected = [
+        "forecastHour: 400 is more than the maximum 384",
+        "model: 'GFS9' is not one of 'GFS4', 'GFS5'",
+        "thresholds[1]: -2.0 is less than the minimum 0",
+        "thresholds[2]: expected float, got str 'x'",
+        "levels['high']: expected int, got float 2.5",
+        f"dataDir: directory {os.path.join(tmp_dir, 'missing')!r} does not exist",
+        "runTime: '2024133100' does not match the format '%Y%m%d%H'",
+        "start: expected datetime, got str '2024-01-01'",
+        "debugPlots: expected bool, got int 1",
+        "stations[1]: expected str, got int 7",
+    ]
+    assert sorted(errors) == sorted(expected), errors
+    # ints are floats, bools are not ints
+    assert p.validateParams(dict(p.opt, thresholds=(0, 1.5), forecastHour=True)) == \
+        ["forecastHour: expected int, got bool True"]
+
+    # init() reports every problem and exits
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        try:
+            ConfigMaster(defaultParams, __doc__, argv=["--forecastHour", "-1", "--model", "NAM"],
+                         add_default_logging=False)
+        except SystemExit as e:
+            assert e.code == 1
+        else:
+            raise AssertionError("no exit")
+    assert "forecastHour: -1 is less than the minimum 0" in out.getvalue(), out.getvalue()
+    assert "model: 'NAM' is not one of 'GFS4', 'GFS5'" in out.getvalue(), out.getvalue()
+
+    # a reload with invalid values keeps the old ones
+    config_file = os.path.join(tmp_dir, "config.py")
+    with open(config_file, "w") as fh:
+        fh.write("forecastHour = 24\n")
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+    assert p["forecastHour"] == 24
+    with open(config_file, "w") as fh:
+        fh.write("forecastHour = 999\n")
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        assert p.reloadConfig() == {}
+    assert p["forecastHour"] == 24 and "forecastHour: 999 is more than the maximum 384" in out.getvalue()
+    assert not p.configFilesChanged()
+
+    # mistakes in the schema itself are found when it is set
+    for schema, message in (({"forecastHour": {"type": int, "maximum": 3}}, "unknown keys 'maximum'"),
+                            ({"forecastHour": {"type": [int, str]}}, "one element type"),
+                            ({"forecastHour": {"type": "int"}}, "is not a type"),
+                            ({"forecastHour": {"path": "folder"}}, "path must be one of"),
+                            ({"forecastHours": int}, "there is no parameter forecastHours")):
+        try:
+            p.setSchema(schema)
+        except ValueError as e:
+            assert message in str(e), (message, e)
+        else:
+            raise AssertionError(f"no error for {schema}")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+'''
+Imports of helper modules next to a config file (_ScopedImporter): plain, from-imports, packages with relative
+imports and a helper importing another helper work; two config files in different directories with a helper of
+the same name each get their own; installed modules win over a helper of the same name; a changed helper is
+noticed by the layer cache; and sys.path and sys.modules are left untouched.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+defaultParams = """
+site = "none"
+dataDir = "/data"
+stations = []
+encoder = ""
+"""
+
+config = """
+import site_helper
+from site_helper import STATIONS as stations
+import sitepkg.paths
+import json
+site = site_helper.SITE
+dataDir = sitepkg.paths.data_dir()
+encoder = json.__name__ + ":" + json.MARKER if hasattr(json, "MARKER") else json.__name__
+"""
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        fh.write(text)
+    # a new mtime even on filesystems with coarse timestamps
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def make_site(tmp_dir, name):
+    site_dir = os.path.join(tmp_dir, name)
+    write(os.path.join(site_dir, "site_helper.py"),
+          f"from station_list import STATIONS\nSITE = {name!r}\n")
+    write(os.path.join(site_dir, "station_list.py"), f"STATIONS = [{name!r} + '-1', {name!r} + '-2']\n")
+    write(os.path.join(site_dir, "sitepkg", "__init__.py"), "")
+    write(os.path.join(site_dir, "sitepkg", "paths.py"),
+          f"from . import base\n\ndef data_dir():\n    return base.ROOT + '/' + {name!r}\n")
+    write(os.path.join(site_dir, "sitepkg", "base.py"), "ROOT = '/data'\n")
+    # the installed json module comes first
+    write(os.path.join(site_dir, "json.py"), "MARKER = 'helper'\n")
+    write(os.path.join(site_dir, "config.py"), config)
+    return os.path.join(site_dir, "config.py")
+
+
+def load(config_file):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ConfigMaster(defaultParams, __doc__, argv=["-c", config_file], add_default_logging=False)
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    ConfigMaster.use_layer_cache = True
+    sys.dont_write_bytecode = True
+    sys_path = list(sys.path)
+    modules = set(sys.modules)
+
+    boulder = make_site(tmp_dir, "boulder")
+    denver = make_site(tmp_dir, "denver")
+    for config_file, name in ((boulder, "boulder"), (denver, "denver"), (boulder, "boulder")):
+        p = load(config_file)
+        assert (p["site"], p["dataDir"]) == (name, f"/data/{name}"), p.opt
+        assert p["stations"] == [f"{name}-1", f"{name}-2"] and p["encoder"] == "json", p.opt
+
+    # both in one ConfigMaster: the later config file's helpers, not the earlier one's
+    ConfigMaster.clearLayerCache()
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=["-c", boulder, "-c", denver], add_default_logging=False)
+    assert (p["site"], p["stations"][0]) == ("denver", "denver-1"), p.opt
+
+    # a helper the config file doesn't import directly is still a dependency of the layer
+    load(boulder)
+    write(os.path.join(tmp_dir, "boulder", "station_list.py"), "STATIONS = ['moved']\n")
+    p = load(boulder)
+    assert p["stations"] == ["moved"] and p.layer_timings[0]["cached"] is False, p.layer_timings
+
+    # a missing module is still an ImportError naming it
+    write(boulder, "import no_such_helper\n")
+    try:
+        load(boulder)
+    except ModuleNotFoundError as e:
+        assert e.name == "no_such_helper", e
+    else:
+        raise AssertionError("no ModuleNotFoundError")
+
+    assert sys.path == sys_path, sys.path
+    leaked = {m for m in set(sys.modules) - modules
+              if m.split(".")[0] in ("site_helper", "station_list", "sitepkg")}
+    assert not leaked, leaked
+    assert not any(path.startswith(tmp_dir) for path in sys.path_importer_cache)
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
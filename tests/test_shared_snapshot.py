@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+'''
+publishSnapshot() / attachSnapshot() across processes: pool workers and independent processes read the snapshot,
+see a new version after refresh(), the previous version stays attachable, a refresh() racing more publishes reads
+the pointer again, and no worker unlinks the publisher's memory when it exits.
+'''
+import ConfigMaster as cm_module
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+
+defaultParams = """
+forecastHour = 4
+model = "GFS4"
+"""
+
+shared = None
+
+
+def attach(name):
+    global shared
+    shared = ConfigMaster.attachSnapshot(name)
+
+
+def read(keys):
+    stale = shared.isStale()
+    refreshed = shared.refresh()
+    return stale, refreshed, shared.version, {key: shared[key] for key in keys}
+
+
+def attach_version(name):
+    block = cm_module._attach_shared_memory(name)
+    block.close()
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+    p["blob"] = bytearray(b"x" * 1000)
+    name = p.publishSnapshot()
+
+    pool = multiprocessing.get_context("spawn").Pool(1, initializer=attach, initargs=(name,))
+    try:
+        stale, refreshed, version, values = pool.apply(read, (["forecastHour", "blob"],))
+        assert (stale, refreshed, version) == (False, False, 1)
+        assert values == {"forecastHour": 4, "blob": bytearray(b"x" * 1000)}, values
+
+        p["forecastHour"] = 12
+        p.publishSnapshot()
+        stale, refreshed, version, values = pool.apply(read, (["forecastHour", "model"],))
+        assert (stale, refreshed, version) == (True, True, 2)
+        assert values == {"forecastHour": 12, "model": "GFS4"}, values
+
+        # the previous version is kept, the one before is gone
+        pool.apply(attach_version, (f"{name}_1",))
+        p.publishSnapshot()
+        pool.apply(attach_version, (f"{name}_2",))
+        try:
+            pool.apply(attach_version, (f"{name}_1",))
+        except FileNotFoundError:
+            pass
+        else:
+            raise AssertionError(f"{name}_1 was not unlinked")
+        assert pool.apply(read, (["forecastHour"],))[2] == 3
+    finally:
+        pool.close()
+        pool.join()
+
+    # the worker exited: its resource tracker (the publisher's) didn't unlink anything
+    attach_version(name)
+    attach_version(f"{name}_3")
+
+    # an independent process has its own resource tracker, that must not unlink the snapshot when it exits
+    code = ("from ConfigMaster import ConfigMaster\n"
+            f"s = ConfigMaster.attachSnapshot({name!r})\n"
+            "print(s.version, s['forecastHour'])\n"
+            "s.close()\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert result.returncode == 0 and result.stdout.split() == ["3", "12"], result
+    assert "leaked" not in result.stderr, result.stderr
+    attach_version(name)
+    attach_version(f"{name}_3")
+
+    # a refresh() that read the pointer before more publishes: the version it read is gone, it reads again
+    s = ConfigMaster.attachSnapshot(name)
+    p["forecastHour"] = 24
+    for _ in range(3):
+        p.publishSnapshot()
+    pointer_versions = iter([4, 6])
+    s._pointerVersion = lambda: next(pointer_versions)
+    assert s.refresh() and s.version == 6 and s["forecastHour"] == 24
+    s.close()
+
+    p.unpublishSnapshot()
+    try:
+        ConfigMaster.attachSnapshot(name)
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError("the snapshot was not unpublished")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
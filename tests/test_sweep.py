@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+'''
+sweep(): members are resolved like resolveOverrides(), in member order, in this process or in a pool, and bad
+arguments raise when sweep() is called, not when the first member is asked for.
+'''
+from ConfigMaster import ConfigMaster
+
+import contextlib
+import io
+import os
+import tempfile
+
+defaultParams = """
+model = "GFS4"
+forecastHour = 0
+expected_size = 100
+
+_config_override["model"]["GFS5"]["expected_size"] = 200
+"""
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+    with contextlib.redirect_stdout(io.StringIO()):
+        p = ConfigMaster(defaultParams, __doc__, argv=[], add_default_logging=False)
+
+    grid = {"model": ["GFS4", "GFS5"], "forecastHour": range(0, 12, 6)}
+    members = [(m["model"], m["forecastHour"], m["expected_size"]) for m in p.sweep(grid=grid)]
+    assert members == [("GFS4", 0, 100), ("GFS4", 6, 100), ("GFS5", 0, 200), ("GFS5", 6, 200)], members
+    assert list(p.sweep(grid=grid, processes=1)) == list(p.sweep(grid=grid))
+    override_sets = [{"model": "GFS5"}, {"forecastHour": 3}]
+    assert list(p.sweep(override_sets=override_sets)) == [p.resolveOverrides(o) for o in override_sets]
+
+    # members are only expanded as they are asked for
+    sweep = p.sweep(override_sets=({"forecastHour": h} for h in range(10 ** 9)))
+    assert next(sweep)["forecastHour"] == 0 and next(sweep)["forecastHour"] == 1
+
+    # bad arguments raise right away
+    unresolved = ConfigMaster()
+    for call, error in ((lambda: p.sweep(), ValueError),
+                        (lambda: p.sweep(grid=grid, override_sets=override_sets), ValueError),
+                        (lambda: p.sweep(grid={"nosuch": [1]}), KeyError),
+                        (lambda: p.sweep(grid={"model": 5}), TypeError),
+                        (lambda: p.sweep(override_sets=5), TypeError),
+                        (lambda: p.sweep(grid=grid, processes=-1), ValueError),
+                        (lambda: unresolved.sweep(grid=grid), RuntimeError)):
+        try:
+            call()
+        except error:
+            pass
+        else:
+            raise AssertionError(f"no {error.__name__}")
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
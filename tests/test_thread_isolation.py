@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+'''
+Stress test: build thousands of ConfigMaster instances concurrently from a thread pool and check that
+every instance kept its own parameters.
+'''
+from ConfigMaster import ConfigMaster
+
+import concurrent.futures
+import os
+import tempfile
+
+defaultParams = """
+import os
+
+# Member number, set on the cmd line
+member = -1
+
+# Model name
+model = "GFS3"
+
+homeDir = os.environ.get("HOME", "/")
+
+expected_file_size = 10e+7
+
+_config_override["model"]["GFS4"]["expected_file_size"] = 15e+7
+"""
+
+NUM_INSTANCES = 4000
+NUM_THREADS = 32
+
+
+def build(i, config_files):
+    argv = ["--member", str(i)]
+    if i % 2:
+        argv += ["--model", "GFS4"]
+    if i % 3 == 0:
+        argv += ["-c", config_files[i % len(config_files)]]
+
+    p = ConfigMaster()
+    p.setDefaultParams(defaultParams)
+    p.init(__doc__, add_default_logging=False, argv=argv, resolved_cache=(i % 5 == 0))
+    return i, p
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp()
+    os.environ["CONFIGMASTER_CACHE_DIR"] = os.path.join(tmp_dir, "cache")
+
+    config_files = []
+    for n in range(5):
+        config_files.append(os.path.join(tmp_dir, f"member_config_{n}.py"))
+        with open(config_files[-1], "w") as fh:
+            fh.write(f'expected_file_size = {n}\n')
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_THREADS) as pool:
+        results = list(pool.map(lambda i: build(i, config_files), range(NUM_INSTANCES)))
+
+    seen_opts = set()
+    for i, p in results:
+        assert p["member"] == i, f"instance {i} has member {p['member']}"
+        assert p["model"] == ("GFS4" if i % 2 else "GFS3"), f"instance {i} has model {p['model']}"
+        if i % 2:
+            expected_size = 15e+7
+        elif i % 3 == 0:
+            expected_size = (i % len(config_files))
+        else:
+            expected_size = 10e+7
+        assert p["expected_file_size"] == expected_size, f"instance {i}: {p['expected_file_size']} != {expected_size}"
+        assert id(p.opt) not in seen_opts, f"instance {i} shares its opt dictionary"
+        seen_opts.add(id(p.opt))
+
+    # the environment tracking used by the resolved cache must be fully removed again
+    assert type(os.environ).__name__ == "_Environ", f"os.environ is still a {type(os.environ)}"
+
+    print(f"built {NUM_INSTANCES} ConfigMaster instances from {NUM_THREADS} threads")
+
+
+if __name__ == "__main__":
+    main()